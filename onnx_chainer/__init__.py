@@ -1,5 +1,6 @@
 import pkg_resources
 
+from onnx_chainer.abstract_trace import placeholder  # NOQA
 from onnx_chainer.export import convert_parameter  # NOQA
 from onnx_chainer.export import export  # NOQA
 
@@ -8,5 +9,11 @@ from onnx_chainer.export import MINIMUM_OPSET_VERSION  # NOQA
 
 from onnx_chainer.export_testcase import export_testcase  # NOQA
 
+from onnx_chainer.profiler import Profiler  # NOQA
+
+from onnx_chainer.quantize import export_quantized  # NOQA
+
+from onnx_chainer.update_weights import update_weights  # NOQA
+
 
 __version__ = pkg_resources.get_distribution('onnx-chainer').version
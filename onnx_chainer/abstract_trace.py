@@ -0,0 +1,313 @@
+import chainer
+from chainer.utils import conv
+import numpy as np
+
+
+def placeholder(shape, dtype=np.float32, xp=np):
+    """Make an array which only has shape and dtype.
+
+    The returned array is a read-only view of a single zero element broadcast
+    to ``shape``, so it does not allocate memory for its elements. It can be
+    given to :func:`~onnx_chainer.export` as an input, and to parameters of
+    the model when ``export_params=False``.
+
+    Args:
+        shape (tuple of ints): Shape of the array.
+        dtype (numpy.dtype): Type of the array.
+        xp (module): Array module, ``numpy`` or ``cupy``.
+
+    Returns:
+        numpy.ndarray or cupy.ndarray: The array whose strides are all 0.
+    """
+    return xp.broadcast_to(xp.zeros((), dtype=dtype), tuple(shape))
+
+
+def _like(x, shape, dtype=None):
+    xp = chainer.backend.get_array_module(x)
+    return placeholder(shape, x.dtype if dtype is None else dtype, xp=xp)
+
+
+def _reduced_shape(shape, axis, keepdims=False):
+    ndim = len(shape)
+    if axis is None:
+        axis = range(ndim)
+    elif not isinstance(axis, (list, tuple)):
+        axis = (axis,)
+    axis = {a % ndim for a in axis}
+    if keepdims:
+        return tuple(1 if i in axis else s for i, s in enumerate(shape))
+    return tuple(s for i, s in enumerate(shape) if i not in axis)
+
+
+def _broadcast_shape(*shapes):
+    return np.broadcast(*[placeholder(s, np.bool_) for s in shapes]).shape
+
+
+def _conv_outsize(sizes, ksizes, strides, pads, cover_all, dilates):
+    return tuple(
+        conv.get_conv_outsize(s, k, st, p, cover_all=cover_all, d=d)
+        for s, k, st, p, d in zip(sizes, ksizes, strides, pads, dilates))
+
+
+def _elementwise(func, inputs):
+    return _like(inputs[0], inputs[0].shape),
+
+
+def _broadcast(func, inputs):
+    shape = _broadcast_shape(*[x.shape for x in inputs])
+    return _like(inputs[0], shape),
+
+
+def _reduction(func, inputs):
+    x = inputs[0]
+    return _like(x, _reduced_shape(
+        x.shape, func.axis, getattr(func, 'keepdims', False))),
+
+
+def _arg_reduction(func, inputs):
+    x = inputs[0]
+    return _like(x, _reduced_shape(x.shape, func.axis), dtype=np.int32),
+
+
+def _convolution_2d(func, inputs):
+    x, W = inputs[:2]
+    out_size = _conv_outsize(
+        x.shape[2:], W.shape[2:], (func.sy, func.sx), (func.ph, func.pw),
+        func.cover_all, (func.dy, func.dx))
+    return _like(x, (x.shape[0], W.shape[0]) + out_size),
+
+
+def _convolution_nd(func, inputs):
+    x, W = inputs[:2]
+    out_size = _conv_outsize(
+        x.shape[2:], W.shape[2:], func.stride, func.pad, func.cover_all,
+        func.dilate)
+    return _like(x, (x.shape[0], W.shape[0]) + out_size),
+
+
+def _deconvolution_2d(func, inputs):
+    x, W = inputs[:2]
+    kh, kw = W.shape[2:]
+    # Converter reads the output size, which is decided on forward when it is
+    # not given by the user.
+    if func.outh is None:
+        func.outh = conv.get_deconv_outsize(
+            x.shape[2], kh, func.sy, func.ph, d=func.dy)
+    if func.outw is None:
+        func.outw = conv.get_deconv_outsize(
+            x.shape[3], kw, func.sx, func.pw, d=func.dx)
+    return _like(
+        x, (x.shape[0], W.shape[1] * func.groups, func.outh, func.outw)),
+
+
+def _linear(func, inputs):
+    x, W = inputs[:2]
+    return _like(x, x.shape[:-1] + (W.shape[0],)),
+
+
+def _matmul(func, inputs):
+    a, b = inputs
+    a_shape, b_shape = list(a.shape), list(b.shape)
+    if func.transa and len(a_shape) >= 2:
+        a_shape[-2:] = a_shape[-1], a_shape[-2]
+    if func.transb and len(b_shape) >= 2:
+        b_shape[-2:] = b_shape[-1], b_shape[-2]
+    shape = list(_broadcast_shape(a_shape[:-2], b_shape[:-2]))
+    if len(a_shape) >= 2:
+        shape.append(a_shape[-2])
+    if len(b_shape) >= 2:
+        shape.append(b_shape[-1])
+    return _like(a, shape),
+
+
+def _embed_id(func, inputs):
+    x, W = inputs
+    return _like(W, x.shape + (W.shape[1],)),
+
+
+def _pooling_2d(func, inputs):
+    x = inputs[0]
+    out_size = _conv_outsize(
+        x.shape[2:], (func.kh, func.kw), (func.sy, func.sx),
+        (func.ph, func.pw), func.cover_all, (1, 1))
+    return _like(x, x.shape[:2] + out_size),
+
+
+def _pooling_nd(func, inputs):
+    x = inputs[0]
+    out_size = _conv_outsize(
+        x.shape[2:], func.ksize, func.stride, func.pad, func.cover_all,
+        (1,) * len(func.ksize))
+    return _like(x, x.shape[:2] + out_size),
+
+
+def _concat(func, inputs):
+    shape = list(inputs[0].shape)
+    axis = func.axis % len(shape)
+    shape[axis] = sum(x.shape[axis] for x in inputs)
+    return _like(inputs[0], shape),
+
+
+def _tile(func, inputs):
+    x = inputs[0]
+    ndim = max(x.ndim, len(func.reps))
+    shape = (1,) * (ndim - x.ndim) + x.shape
+    reps = (1,) * (ndim - len(func.reps)) + tuple(func.reps)
+    return _like(x, [s * r for s, r in zip(shape, reps)]),
+
+
+def _pad(func, inputs):
+    x = inputs[0]
+    pad_bw = np.broadcast_to(func.pad_bw, (x.ndim, 2))
+    return _like(x, [s + b + a for s, (b, a) in zip(x.shape, pad_bw)]),
+
+
+def _cast(func, inputs):
+    x = inputs[0]
+    return _like(x, x.shape, dtype=func.type),
+
+
+def _where(func, inputs):
+    x, y = inputs
+    shape = _broadcast_shape(np.shape(func.condition), x.shape, y.shape)
+    return _like(x, shape),
+
+
+def _resize_images(func, inputs):
+    x = inputs[0]
+    return _like(x, x.shape[:2] + (func.out_H, func.out_W)),
+
+
+# Rules to compute outputs of functions from shapes and dtypes of inputs,
+# keyed by the name of ~chainer.FunctionNode as same as converters. Functions
+# only making views of inputs, like reshape and transpose, are not listed
+# because their forward computation is cheap enough on placeholders.
+shape_rules = {
+    # activation
+    'ClippedReLU': _elementwise,
+    'ELU': _elementwise,
+    'HardSigmoid': _elementwise,
+    'LeakyReLU': _elementwise,
+    'LogSoftmax': _elementwise,
+    'PReLUFunction': _elementwise,
+    'ReLU': _elementwise,
+    'Selu': _elementwise,
+    'Sigmoid': _elementwise,
+    'Softmax': _elementwise,
+    'Softplus': _elementwise,
+    'Tanh': _elementwise,
+
+    # array
+    'Cast': _cast,
+    'Concat': _concat,
+    'Copy': _elementwise,
+    'Pad': _pad,
+    'ResizeImages': _resize_images,
+    'Tile': _tile,
+    'Where': _where,
+
+    # connection
+    'Convolution2DFunction': _convolution_2d,
+    'ConvolutionND': _convolution_nd,
+    'Deconvolution2DFunction': _deconvolution_2d,
+    'EmbedIDFunction': _embed_id,
+    'LinearFunction': _linear,
+
+    # math
+    'Absolute': _elementwise,
+    'Add': _broadcast,
+    'AddConstant': _elementwise,
+    'Arccos': _elementwise,
+    'Arcsin': _elementwise,
+    'Arctan': _elementwise,
+    'ArgMax': _arg_reduction,
+    'ArgMin': _arg_reduction,
+    'Clip': _elementwise,
+    'Cos': _elementwise,
+    'Cosh': _elementwise,
+    'Div': _broadcast,
+    'DivFromConstant': _elementwise,
+    'Exp': _elementwise,
+    'LinearInterpolate': _broadcast,
+    'Log': _elementwise,
+    'LogSumExp': _reduction,
+    'MatMul': _matmul,
+    'Max': _reduction,
+    'Maximum': _broadcast,
+    'Mean': _reduction,
+    'Min': _reduction,
+    'Minimum': _broadcast,
+    'Mul': _broadcast,
+    'MulConstant': _elementwise,
+    'Neg': _elementwise,
+    'PowConstVar': _elementwise,
+    'PowVarConst': _elementwise,
+    'PowVarVar': _broadcast,
+    'Prod': _reduction,
+    'RsqrtGPU': _elementwise,
+    'Sin': _elementwise,
+    'Sinh': _elementwise,
+    'Sqrt': _elementwise,
+    'Square': _elementwise,
+    'Sub': _broadcast,
+    'SubFromConstant': _elementwise,
+    'Sum': _reduction,
+    'Tan': _elementwise,
+
+    # noise
+    'Dropout': _elementwise,
+
+    # normalization
+    'FixedBatchNormalization': _elementwise,
+    'GroupNormalization': _elementwise,
+    'LocalResponseNormalization': _elementwise,
+    'NormalizeL2': _elementwise,
+
+    # pooling
+    'AveragePooling2D': _pooling_2d,
+    'AveragePoolingND': _pooling_nd,
+    'MaxPooling2D': _pooling_2d,
+    'MaxPoolingND': _pooling_nd,
+}
+
+
+class AbstractTraceHook(chainer.FunctionHook):
+    """Replace forward computation of functions with shape inference.
+
+    While this hook is enabled, forward of functions which have a rule in
+    ``rules`` is skipped and outputs are made by :func:`placeholder` with the
+    shapes and dtypes computed by the rule. Functions without a rule run
+    their forward as usual, on placeholder inputs it is cheap for functions
+    which only make views, like reshape or transpose.
+
+    Values of outputs are meaningless, so this hook is only for making
+    computational graph.
+
+    Args:
+        rules (dict): Additional rules keyed by ~chainer.FunctionNode name.
+            A rule is called with the function node and the tuple of input
+            arrays, and returns the tuple of output arrays.
+    """
+
+    name = 'AbstractTraceHook'
+
+    def __init__(self, rules=None):
+        if rules:
+            self.rules = dict(shape_rules, **rules)
+        else:
+            self.rules = shape_rules
+
+    def forward_preprocess(self, function, in_data):
+        if isinstance(function, chainer.function.FunctionAdapter):
+            func_name = function.function.__class__.__name__
+        else:
+            func_name = function.__class__.__name__
+        rule = self.rules.get(func_name)
+        if rule is None:
+            return
+        outputs = rule(function, in_data)
+        # Shadow ``forward`` of the instance, it is removed on postprocess.
+        function.forward = lambda inputs: outputs
+
+    def forward_postprocess(self, function, in_data):
+        function.__dict__.pop('forward', None)
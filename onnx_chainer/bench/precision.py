@@ -0,0 +1,215 @@
+"""Benchmark of exported models of each precision.
+
+  $ python -m onnx_chainer.bench.precision
+  $ python -m onnx_chainer.bench.precision --model mymodule:build_model \\
+        --input-shape 8,3,32,32 --calibration-batches 16
+
+The model built by ``--model``, ``module:callable`` returning a Chain,
+(ResNet-50 with random weights by default) is exported for each precision
+and compared with the output of Chainer on the sample inputs, read from
+``--inputs`` (``.npy`` or ``.npz`` of arrays in order of arguments) or
+generated randomly by ``--input-shape``. Int8 models are calibrated by the
+sample inputs and ``--calibration-batches`` random inputs of the same
+shapes. The size of the serialized model, mean and 99th percentile latency
+of ONNX Runtime, and max and mean absolute error of outputs are reported.
+Latency and errors are skipped when ONNX Runtime is not installed.
+
+- ``chainer``: forward computation of Chainer, the reference, whose size
+  is the total bytes of parameters
+- ``fp32``: :func:`~onnx_chainer.export`
+- ``fp16``: :func:`~onnx_chainer.export` with ``precision='fp16'``
+- ``int8``: :func:`~onnx_chainer.quantize.export_quantized`
+"""
+import argparse
+import importlib
+import time
+
+import chainer
+import chainer.links as L
+import numpy as np
+
+from onnx_chainer import export
+from onnx_chainer.quantize import export_quantized
+
+try:
+    import onnxruntime as rt
+    ONNXRUNTIME_AVAILABLE = True
+except ImportError:
+    ONNXRUNTIME_AVAILABLE = False
+
+
+PRECISIONS = ('fp32', 'fp16', 'int8')
+
+
+def load_factory(spec):
+    """Returns the callable of ``module:callable``."""
+    module_name, _, attr = spec.partition(':')
+    if not attr:
+        raise ValueError(
+            'Model must be given as module:callable, but {} is given'.format(
+                spec))
+    factory = importlib.import_module(module_name)
+    for name in attr.split('.'):
+        factory = getattr(factory, name)
+    return factory
+
+
+def load_inputs(path):
+    """Returns arrays of a ``.npy`` or ``.npz`` file as a list."""
+    loaded = np.load(path)
+    if isinstance(loaded, np.ndarray):
+        return [loaded]
+    return [loaded[key] for key in loaded.files]
+
+
+def random_inputs(shapes):
+    return [np.random.rand(*shape).astype(np.float32) for shape in shapes]
+
+
+def _flatten_outputs(outputs):
+    if isinstance(outputs, dict):
+        outputs = list(outputs.values())
+    elif not isinstance(outputs, (list, tuple)):
+        outputs = [outputs]
+    return [chainer.cuda.to_cpu(chainer.as_array(o)) for o in outputs]
+
+
+def _time(func, n_trials):
+    func()
+    elapsed = []
+    for _ in range(n_trials):
+        start = time.perf_counter()
+        func()
+        elapsed.append(time.perf_counter() - start)
+    return np.mean(elapsed), np.percentile(elapsed, 99)
+
+
+def export_precision(model, xs, precision, calibration=()):
+    """Exports the model of ``precision`` on inputs ``xs``."""
+    # Export replaces arrays of the list by variables
+    if precision == 'int8':
+        return export_quantized(model, [list(xs)] + list(calibration))
+    return export(model, list(xs), precision=precision)
+
+
+def measure(onnx_model, xs, expected, n_trials):
+    """Returns size, mean and p99 latency, max and mean errors of a model.
+
+    Values other than the size are ``None`` without ONNX Runtime.
+    """
+    result = {'size': onnx_model.ByteSize(), 'mean_latency': None,
+              'p99_latency': None, 'max_error': None, 'mean_error': None}
+    if not ONNXRUNTIME_AVAILABLE:
+        return result
+    options = rt.SessionOptions()
+    # Suppress warnings of initializers in graph inputs
+    options.log_severity_level = 3
+    sess = rt.InferenceSession(
+        onnx_model.SerializeToString(), options,
+        providers=['CPUExecutionProvider'])
+    initializers = {t.name for t in onnx_model.graph.initializer}
+    input_names = [i.name for i in onnx_model.graph.input
+                   if i.name not in initializers]
+    feed = dict(zip(input_names, xs))
+    actual = sess.run(None, feed)
+    errors = np.concatenate([
+        np.abs(a.astype(np.float64) - e).ravel()
+        for a, e in zip(actual, expected)])
+    result['mean_latency'], result['p99_latency'] = _time(
+        lambda: sess.run(None, feed), n_trials)
+    result['max_error'] = errors.max()
+    result['mean_error'] = errors.mean()
+    return result
+
+
+def run(model, xs, precisions=PRECISIONS, n_trials=10, calibration=()):
+    """Measures models of ``precisions``.
+
+    Args:
+        model (~chainer.Chain): The model to export.
+        xs (list): Sample input arrays.
+        precisions (list): Precisions to export.
+        n_trials (int): Number of runs to measure latency.
+        calibration (list): Lists of input arrays to calibrate int8 models
+            in addition to ``xs``.
+
+    Returns:
+        list: Pairs of the name and the dict of results, the first one is
+        Chainer.
+    """
+    expected = _flatten_outputs(model(*xs))
+    mean, p99 = _time(lambda: model(*xs), n_trials)
+    results = [('chainer', {
+        'size': sum(p.array.nbytes for p in model.params()),
+        'mean_latency': mean, 'p99_latency': p99, 'max_error': 0.0,
+        'mean_error': 0.0})]
+    for precision in precisions:
+        onnx_model = export_precision(model, xs, precision, calibration)
+        results.append(
+            (precision, measure(onnx_model, xs, expected, n_trials)))
+    return results
+
+
+def _format(value, template, scale=1):
+    return '-' if value is None else template.format(value * scale)
+
+
+def print_results(results):
+    template = '{:<10}{:>12}{:>12}{:>12}{:>12}{:>12}'
+    print(template.format(
+        'precision', 'size[MB]', 'mean[ms]', 'p99[ms]', 'max err',
+        'mean err'))
+    for name, r in results:
+        print(template.format(
+            name, _format(r['size'], '{:.2f}', 2 ** -20),
+            _format(r['mean_latency'], '{:.2f}', 1e3),
+            _format(r['p99_latency'], '{:.2f}', 1e3),
+            _format(r['max_error'], '{:.3g}'),
+            _format(r['mean_error'], '{:.3g}')))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', '-m',
+                        help='Chain factory as module:callable, ResNet-50 '
+                        'with random weights by default')
+    parser.add_argument('--inputs', '-i',
+                        help='.npy or .npz file of sample inputs')
+    parser.add_argument('--input-shape', action='append',
+                        help='Comma separated shape of a random input, '
+                        'repeated for each argument, 1,3,224,224 by default')
+    parser.add_argument('--precisions', default=','.join(PRECISIONS),
+                        help='Comma separated precisions to export')
+    parser.add_argument('--calibration-batches', type=int, default=0,
+                        help='Number of random inputs to calibrate int8')
+    parser.add_argument('--trials', '-n', type=int, default=10)
+    args = parser.parse_args()
+
+    precisions = args.precisions.split(',')
+    for precision in precisions:
+        if precision not in PRECISIONS:
+            parser.error('Unknown precision: {}'.format(precision))
+    if args.model is None:
+        model = L.ResNet50Layers(pretrained_model=None)
+    else:
+        model = load_factory(args.model)()
+    if args.inputs is not None:
+        xs = load_inputs(args.inputs)
+    else:
+        shapes = [tuple(int(d) for d in s.split(','))
+                  for s in args.input_shape or ['1,3,224,224']]
+        xs = random_inputs(shapes)
+    calibration = [random_inputs([x.shape for x in xs])
+                   for _ in range(args.calibration_batches)]
+
+    if not ONNXRUNTIME_AVAILABLE:
+        print('NOTE: ONNX Runtime is not installed, only sizes of models '
+              'are reported')
+    with chainer.using_config('train', False), \
+            chainer.using_config('enable_backprop', False):
+        results = run(model, xs, precisions, args.trials, calibration)
+    print_results(results)
+
+
+if __name__ == '__main__':
+    main()
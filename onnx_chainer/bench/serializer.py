@@ -0,0 +1,127 @@
+"""Benchmark of writing an exported ONNX model.
+
+  $ python -m onnx_chainer.bench.serializer
+
+ResNet-50 (random weights) is exported once in memory, then the model is
+written to a temporary file by each method. Throughput and the increase of
+peak RSS while writing are reported.
+
+- ``SerializeToString``: ``f.write(model.SerializeToString())``
+- ``write_model``: streaming writer with initializers in the model
+- ``write_model (arrays)``: streaming writer given parameter arrays directly
+"""
+import argparse
+import gc
+import os
+import resource
+import tempfile
+import time
+
+import chainer
+import chainer.links as L
+import numpy as np
+import onnx
+from onnx import numpy_helper
+
+from onnx_chainer import export
+from onnx_chainer.serializer import write_model
+
+
+def _read_status_kb(key):
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(key + ':'):
+                    return int(line.split()[1])
+    except IOError:
+        pass
+    return None
+
+
+def reset_peak_rss():
+    """Reset peak RSS of this process, returns ``False`` if not supported."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except IOError:
+        return False
+
+
+def get_rss_kb():
+    rss = _read_status_kb('VmRSS')
+    if rss is None:
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss
+
+
+def get_peak_rss_kb():
+    peak = _read_status_kb('VmHWM')
+    if peak is None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak
+
+
+def measure(write_func, path):
+    gc.collect()
+    reset_peak_rss()
+    rss_before = get_rss_kb()
+    start = time.time()
+    with open(path, 'wb') as f:
+        write_func(f)
+    elapsed = time.time() - start
+    peak = get_peak_rss_kb() - rss_before
+    return os.path.getsize(path), elapsed, peak
+
+
+def run(insize, n_trials):
+    model = L.ResNet50Layers(pretrained_model=None)
+    x = np.zeros((1, 3, insize, insize), dtype=np.float32)
+    onnx_model = export(model, x)
+
+    header_model = onnx.ModelProto()
+    header_model.CopyFrom(onnx_model)
+    del header_model.graph.initializer[:]
+    arrays = [(t.name, numpy_helper.to_array(t))
+              for t in onnx_model.graph.initializer]
+
+    methods = [
+        ('SerializeToString',
+         lambda f: f.write(onnx_model.SerializeToString())),
+        ('write_model', lambda f: write_model(onnx_model, f)),
+        ('write_model (arrays)',
+         lambda f: write_model(header_model, f, initializers=arrays)),
+    ]
+
+    if not reset_peak_rss():
+        print('NOTE: peak RSS cannot be reset on this platform, the values '
+              'below are the peak of the whole process')
+
+    print('{:<24}{:>12}{:>12}{:>12}{:>16}'.format(
+        'method', 'size[MB]', 'time[s]', 'MB/s', 'peak RSS+[MB]'))
+    with tempfile.TemporaryDirectory() as dirname:
+        path = os.path.join(dirname, 'model.onnx')
+        for name, func in methods:
+            results = [measure(func, path) for _ in range(n_trials)]
+            size = results[0][0] / 2 ** 20
+            elapsed = min(r[1] for r in results)
+            peak = max(r[2] for r in results) / 2 ** 10
+            print('{:<24}{:>12.1f}{:>12.3f}{:>12.1f}{:>16.1f}'.format(
+                name, size, elapsed, size / elapsed, peak))
+            loaded = onnx.load(path)
+            assert len(loaded.graph.initializer) ==\
+                len(onnx_model.graph.initializer)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--insize', type=int, default=224)
+    parser.add_argument('--trials', '-n', type=int, default=3)
+    args = parser.parse_args()
+
+    with chainer.using_config('train', False):
+        run(args.insize, args.trials)
+
+
+if __name__ == '__main__':
+    main()
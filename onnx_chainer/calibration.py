@@ -0,0 +1,306 @@
+import json
+
+import chainer
+import numpy as np
+
+
+# Percentiles written with statistics by default
+DEFAULT_PERCENTILES = (0.1, 1, 50, 99, 99.9)
+
+
+class ActivationStatistics(object):
+    """Streaming statistics of values of an activation.
+
+    Count, min, max, mean and a histogram are updated by each array, and
+    arrays are not retained. The histogram has a fixed even number of bins
+    of the same width. When an array is out of its range, adjacent bins are
+    merged and the range is extended to the side of the array, doubling the
+    width of bins until the range covers the array. Non-finite values are
+    ignored.
+
+    Args:
+        bins (int): Number of bins of the histogram, or ``0`` to record only
+            count, min, max and mean.
+
+    Attributes:
+        count (int): Number of recorded values.
+        min (float): Min of recorded values.
+        max (float): Max of recorded values.
+        low (float): Lower bound of the histogram.
+        width (float): Width of the range of the histogram.
+        counts (numpy.ndarray): Counts of bins of the histogram.
+    """
+
+    def __init__(self, bins=256):
+        if bins % 2:
+            raise ValueError(
+                'Number of bins must be even, but {} is given'.format(bins))
+        self.bins = bins
+        self.count = 0
+        self.min = None
+        self.max = None
+        self.low = None
+        self.width = None
+        self.counts = None
+        self._sum = 0.0
+
+    @property
+    def mean(self):
+        """Mean of recorded values."""
+        return self._sum / self.count if self.count else None
+
+    def update(self, x):
+        """Adds values of an array."""
+        if isinstance(x, chainer.Variable):
+            x = x.array
+        x = chainer.cuda.to_cpu(x).ravel()
+        if x.size and not np.isfinite(x).all():
+            x = x[np.isfinite(x)]
+        if x.size == 0:
+            return
+        low, high = float(x.min()), float(x.max())
+        if self.count == 0:
+            self.min, self.max = low, high
+        else:
+            self.min, self.max = min(self.min, low), max(self.max, high)
+        self.count += x.size
+        self._sum += float(x.sum(dtype=np.float64))
+        if not self.bins:
+            return
+
+        if self.counts is None:
+            self.low = low
+            self.width = high - low if high > low else max(abs(low), 1.0)
+            self.counts = np.zeros(self.bins, dtype=np.int64)
+        while low < self.low or high > self.low + self.width:
+            merged = self.counts.reshape(-1, 2).sum(axis=1)
+            empty = np.zeros_like(merged)
+            if low < self.low:
+                self.counts = np.concatenate((empty, merged))
+                self.low -= self.width
+            else:
+                self.counts = np.concatenate((merged, empty))
+            self.width *= 2
+        self.counts += np.histogram(
+            x, self.bins, (self.low, self.low + self.width))[0]
+
+    def percentile(self, q):
+        """Returns the ``q``-th percentile interpolated in bins."""
+        if self.counts is None:
+            return None
+        cumsum = np.cumsum(self.counts)
+        target = cumsum[-1] * q / 100.0
+        i = min(int(np.searchsorted(cumsum, target)), self.bins - 1)
+        before = cumsum[i - 1] if i else 0
+        fraction = (target - before) / self.counts[i] if self.counts[i] else 0
+        value = self.low + self.width * (i + fraction) / self.bins
+        return float(np.clip(value, self.min, self.max))
+
+    def to_dict(self, percentiles=DEFAULT_PERCENTILES):
+        """Returns statistics as a dict which can be dumped to JSON."""
+        ret = {'count': self.count, 'min': self.min, 'max': self.max,
+               'mean': self.mean}
+        if self.counts is not None:
+            ret['percentiles'] = {
+                str(q): self.percentile(q) for q in percentiles}
+            ret['histogram'] = {
+                'low': self.low, 'high': self.low + self.width,
+                'counts': self.counts.tolist()}
+        return ret
+
+
+class ActivationRecorder(object):
+    """Record statistics of activations over forward computations.
+
+    While this hook is enabled, :class:`ActivationStatistics` of float
+    outputs of function nodes applied at the top level are recorded in order
+    of application, and of float inputs which are neither parameters nor
+    outputs of the recorded function nodes, like inputs of the model.
+    The first forward computation defines the order, and following ones
+    between :meth:`start_batch` and :meth:`end_batch` must apply function
+    nodes of the same types in the same order, then their values are added
+    to the statistics of the first ones. Arrays are not retained.
+
+    Set to ``record_activations`` of :func:`~onnx_chainer.export`, then the
+    first forward computation is the traced one, and statistics keyed by
+    ONNX names of values are written to ``metadata_props`` of the exported
+    model as JSON, or to ``filename``.
+
+    >>> recorder = ActivationRecorder()
+    >>> onnx_chainer.export(
+    ...     model, x, record_activations=recorder, calibration=batches)
+    >>> recorder.statistics['Convolution2DFunction_0'].percentile(99.9)
+
+    Args:
+        bins (int): Number of bins of histograms, or ``0`` to record only
+            count, min, max and mean.
+        percentiles (tuple): Percentiles written with statistics.
+        filename (str): If set, statistics are written to this file instead
+            of the model.
+        metadata_key (str): Key of ``metadata_props`` to write statistics.
+
+    Attributes:
+        functions (list): Function nodes applied in the first forward
+            computation.
+        input_statistics (list): Lists of statistics, or ``None`` for
+            inputs not recorded, of inputs of ``functions``.
+        output_statistics (list): Lists of statistics, or ``None`` for
+            non-float outputs, of outputs of ``functions``.
+        statistics (dict): Statistics keyed by ONNX names, set on export.
+    """
+
+    def __init__(self, bins=256, percentiles=DEFAULT_PERCENTILES,
+                 filename=None, metadata_key='activation_statistics'):
+        self.bins = bins
+        self.percentiles = percentiles
+        self.filename = filename
+        self.metadata_key = metadata_key
+        self.depth = 0
+        self.reset()
+
+        def hooked_apply(_self, inputs):
+            self.depth += 1
+            try:
+                ret = self.org_apply(_self, inputs)
+            finally:
+                self.depth -= 1
+            if self.depth == 0:
+                self._record(_self, inputs, ret)
+            return ret
+        self.hooked_apply = hooked_apply
+
+    def _new_statistics(self, x, is_input):
+        if isinstance(x, chainer.Variable):
+            if is_input and (isinstance(x, chainer.Parameter) or
+                             id(x.creator_node) in self._function_ids):
+                return None
+            x = x.array
+        if x is None or x.dtype.kind != 'f':
+            return None
+        return ActivationStatistics(self.bins)
+
+    def _record(self, function, inputs, outputs):
+        if self._index is None:
+            self.input_statistics.append(
+                [self._new_statistics(x, True) for x in inputs])
+            self.output_statistics.append(
+                [self._new_statistics(y, False) for y in outputs])
+            self.functions.append(function)
+            self._function_ids.add(id(function))
+            index = len(self.functions) - 1
+        else:
+            index = self._index
+            if index >= len(self.functions) or\
+                    type(self.functions[index]) is not type(function):
+                raise ValueError(
+                    'Calibration inputs must be computed by the same '
+                    'function nodes as the exported input')
+            self._index += 1
+        for xs, statistics in ((inputs, self.input_statistics[index]),
+                               (outputs, self.output_statistics[index])):
+            for x, s in zip(xs, statistics):
+                if s is not None:
+                    s.update(x)
+
+    def reset(self):
+        """Clear recorded function nodes and statistics."""
+        self.functions = []
+        self.input_statistics = []
+        self.output_statistics = []
+        self.statistics = {}
+        self._function_ids = set()
+        self._index = None
+
+    def start_batch(self):
+        """Start recording another forward computation."""
+        self._index = 0
+
+    def end_batch(self):
+        """Finish recording the forward computation started last.
+
+        Raises ``ValueError`` if fewer function nodes were applied than in
+        the first forward computation.
+        """
+        if self._index != len(self.functions):
+            raise ValueError(
+                'Calibration inputs must be computed by the same function '
+                'nodes as the exported input')
+
+    def value_statistics(self, function_io_names):
+        """Return the recorded statistics keyed by ONNX names.
+
+        Args:
+            function_io_names (dict): Pairs of lists of names of inputs and
+                outputs keyed by the ID of function nodes, which are
+                recorded by :class:`~onnx_chainer.graph.Graph` on the
+                conversion. Function nodes not in this dict are ignored.
+
+        Returns:
+            dict: :class:`ActivationStatistics` keyed by names of values.
+        """
+        value_statistics = {}
+        for function, input_statistics, output_statistics in zip(
+                self.functions, self.input_statistics,
+                self.output_statistics):
+            if id(function) not in function_io_names:
+                continue
+            input_names, output_names = function_io_names[id(function)]
+            for names, statistics in ((input_names, input_statistics),
+                                      (output_names, output_statistics)):
+                for name, s in zip(names, statistics):
+                    if s is not None and s.count:
+                        value_statistics.setdefault(name, s)
+        return value_statistics
+
+    def value_ranges(self, function_io_names):
+        """Return the recorded pairs of min and max keyed by ONNX names."""
+        return {name: (s.min, s.max) for name, s in
+                self.value_statistics(function_io_names).items()}
+
+    def write(self, onnx_model):
+        """Write :attr:`statistics` as JSON to ``filename`` or the model.
+
+        Args:
+            onnx_model (~onnx.ModelProto): The model whose
+                ``metadata_props`` is set unless ``filename`` is set.
+        """
+        content = json.dumps(
+            {name: s.to_dict(self.percentiles)
+             for name, s in self.statistics.items()}, sort_keys=True)
+        if self.filename is not None:
+            with open(self.filename, 'w') as f:
+                f.write(content)
+            return
+        for prop in onnx_model.metadata_props:
+            if prop.key == self.metadata_key:
+                prop.value = content
+                return
+        prop = onnx_model.metadata_props.add()
+        prop.key = self.metadata_key
+        prop.value = content
+
+    def __enter__(self):
+        # Hooks entered before this one are called inside
+        self.org_apply = chainer.function_node.FunctionNode.apply
+        chainer.function_node.FunctionNode.apply = self.hooked_apply
+        return self
+
+    def __exit__(self, *exc_details):
+        chainer.function_node.FunctionNode.apply = self.org_apply
+
+
+def get_activation_recorder(record_activations):
+    """Return the recorder for ``record_activations`` option of export.
+
+    Args:
+        record_activations (bool or ActivationRecorder): The option value.
+
+    Returns:
+        ActivationRecorder: ``record_activations`` itself when it is a
+        recorder, a new recorder when it is ``True``, otherwise ``None``.
+    """
+    if isinstance(record_activations, ActivationRecorder):
+        return record_activations
+    if not record_activations:
+        return None
+    return ActivationRecorder()
@@ -1,3 +1,5 @@
+import weakref
+
 import chainer
 
 import onnx
@@ -6,8 +8,18 @@ from onnx import numpy_helper
 from onnx_chainer import onnx_helper
 
 
-def _tensor_from_array_for_constant(array, name):
+# Constants equal or larger than this number of bytes are stored in
+# ``raw_data``
+CONSTANT_RAW_DATA_THRESHOLD = 1024
+
+
+def _tensor_from_array_for_constant(
+        array, name, raw_data_threshold=CONSTANT_RAW_DATA_THRESHOLD):
     tensor = numpy_helper.from_array(array, name=name)
+    if array.nbytes >= raw_data_threshold:
+        # Filling typed fields element by element is slow and memory hungry
+        # for large constants like gather indices.
+        return tensor
     # Avoid `raw_data` for better debuggability. This would be OK
     # since constants are usually small.
     field_name = onnx.mapping.STORAGE_TENSOR_TYPE_TO_FIELD.get(
@@ -29,11 +41,23 @@ class Context(object):
             ``chainer.Variable`` or ``chainer.Parameter``, instance ID of
             ``ndarray`` held by the variable is also put as key, because some
             functions like ``F.where`` internally unwrap variable.
+        release_names (bool): If ``True``, names are removed when the named
+            objects are released, because another object can have the same
+            instance ID after that. Exporter sets it when variables are not
+            retained until the end of export.
+        promote_large_constants (bool): If ``True``, constants equal or
+            larger than ``CONSTANT_RAW_DATA_THRESHOLD`` bytes are added as
+            parameters instead of Constant nodes, so they are exported as
+            initializers and can be stored in external data. Exporter sets
+            it when ``external_data`` is used.
 
     """
 
     def __init__(self, model):
         self.name_list = dict()
+        self.release_names = False
+        self._released_count = 0
+        self.promote_large_constants = False
         self.parameters = []
         self.constants = []
         self.implicit_inputs = dict()  # inputs which not connect to output
@@ -54,7 +78,8 @@ class Context(object):
         if str_id in self.name_list:
             return self.name_list[str_id][0]
         else:
-            new_name = 'v{}'.format(len(self.name_list))
+            new_name = 'v{}'.format(
+                len(self.name_list) + self._released_count)
             self.set_name(variable, new_name)
             return new_name
 
@@ -71,9 +96,30 @@ class Context(object):
         str_id = id(variable)
         assert str_id not in self.name_list or not self.name_list[str_id][1]
         self.name_list[str_id] = (name, pinned)
+        if self.release_names:
+            self._remove_name_on_release(variable)
         if isinstance(variable, (chainer.Variable, chainer.Parameter)):
             array_id = id(variable.array)
             self.name_list[array_id] = (name, pinned)
+            if self.release_names:
+                self._remove_name_on_release(variable.array)
+
+    def _remove_name_on_release(self, obj):
+        name_list = self.name_list
+        key = id(obj)
+        entry = name_list[key]
+
+        def remove():
+            # The name may be already updated by another object
+            if name_list.get(key) is entry:
+                del name_list[key]
+                # Keep generated names unique
+                self._released_count += 1
+        try:
+            weakref.finalize(obj, remove)
+        except TypeError:
+            # Not weak referable, like Python scalars
+            pass
 
     def is_pinned(self, variable):
         str_id = id(variable)
@@ -107,6 +153,9 @@ class Context(object):
         """
         assert '/' not in name
         onnx_name = '{}_const_{}'.format(onnx_helper.get_func_name(), name)
+        if self.promote_large_constants and\
+                array.nbytes >= CONSTANT_RAW_DATA_THRESHOLD:
+            return self.add_param(array, onnx_name, use_original_name=True)
         self.set_name(array, onnx_name)
         tensor = _tensor_from_array_for_constant(array, name=onnx_name)
         const_node = onnx_helper.make_node(
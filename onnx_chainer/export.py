@@ -1,6 +1,6 @@
-from __future__ import print_function
-
 from collections import OrderedDict
+import contextlib
+import os
 import warnings
 
 import chainer
@@ -8,10 +8,31 @@ import onnx
 from onnx.mapping import NP_TYPE_TO_TENSOR_TYPE
 from onnx import shape_inference
 
+from onnx_chainer.abstract_trace import AbstractTraceHook
+from onnx_chainer.calibration import ActivationRecorder
+from onnx_chainer.calibration import get_activation_recorder
 from onnx_chainer.context import Context
+from onnx_chainer.external_data import DEFAULT_SIZE_THRESHOLD
+from onnx_chainer.external_data import ExternalDataWriter
+from onnx_chainer.external_data import set_external_data
+from onnx_chainer.external_data import strip_external_initializers
 from onnx_chainer.graph import Graph
+from onnx_chainer.optimizer import get_pass_manager
+from onnx_chainer.optimizer import get_weight_quantizer
+from onnx_chainer.optimizer import OptimizationGraph
+from onnx_chainer.optimizer.float16 import convert_to_float16
+from onnx_chainer.optimizer.float16 import get_fp32_function_filter
+from onnx_chainer.optimizer.int8 import quantize_to_int8
 from onnx_chainer import mapping
 from onnx_chainer.onnx_helper import is_support_non_standard_domain
+from onnx_chainer.profiler import get_profiler
+from onnx_chainer.serializer import write_model
+from onnx_chainer.serializer import write_model_text
+from onnx_chainer.trace_cache import get_default_trace_cache
+from onnx_chainer.trace_cache import has_computed_inputs
+from onnx_chainer.trace_cache import make_cache_key
+from onnx_chainer.trace_cache import TraceCacheEntry
+from onnx_chainer.update_weights import REWRITTEN_INITIALIZERS_KEY
 
 try:
     from onnx import checker
@@ -34,7 +55,7 @@ def _check_available():
             '\t$ pip install onnx\n\n')
 
 
-def convert_parameter(parameter, context):
+def _get_parameter_array(parameter):
     if isinstance(parameter, chainer.Parameter):
         array = parameter.array
     elif isinstance(parameter, chainer.Variable):
@@ -46,11 +67,80 @@ def convert_parameter(parameter, context):
             'The type of parameter is unknown. It should be either Parameter '
             'or Variable or ndarray, but the type was {}.'.format(
                 type(parameter)))
-    array = chainer.cuda.to_cpu(array)
+    return array
+
+
+def convert_parameter(parameter, context, external_data_writer=None):
+    array = chainer.cuda.to_cpu(_get_parameter_array(parameter))
+    if external_data_writer is not None:
+        return external_data_writer.make_tensor(
+            array, context.get_name(parameter))
     tensor = numpy_helper.from_array(array, context.get_name(parameter))
     return tensor
 
 
+def _make_initializers(named_arrays, external_data_writer=None):
+    if external_data_writer is None:
+        return [numpy_helper.from_array(array, name)
+                for name, array in named_arrays]
+    with external_data_writer:
+        return [external_data_writer.make_tensor(array, name)
+                for name, array in named_arrays]
+
+
+def _make_parameter_value_info(parameter, context):
+    array = _get_parameter_array(parameter)
+    return helper.make_tensor_value_info(
+        context.get_name(parameter), NP_TYPE_TO_TENSOR_TYPE[array.dtype],
+        array.shape)
+
+
+def _make_external_data_writer(filename, external_data):
+    if not isinstance(filename, str):
+        raise ValueError(
+            '`external_data` requires `filename` to be a path of the ONNX '
+            'model, because the external data file is located relative to the '
+            'model file.')
+    if isinstance(external_data, str):
+        location = external_data
+    else:
+        location = os.path.basename(filename) + '.data'
+    return ExternalDataWriter(
+        os.path.dirname(os.path.abspath(filename)), location)
+
+
+def _save_model(model, filename, save_text, named_arrays=()):
+    # Initializers of ``named_arrays`` are written straight from the arrays,
+    # so ``TensorProto`` of them are not held while writing.
+    if filename is not None and isinstance(filename, str):
+        with open(filename, 'wb') as fp:
+            payloads = write_model(model, fp, initializers=named_arrays)
+        if save_text:
+            with open(filename + '.txt', 'w') as fp:
+                write_model_text(model, fp, initializers=named_arrays)
+        # Large payloads are not copied to the returned model, which refers
+        # to them in the written file as external data
+        location = os.path.basename(filename)
+        model.graph.initializer.extend(
+            _make_lazy_initializer(name, array, location, *payloads[name])
+            for name, array in named_arrays)
+        return
+    if hasattr(filename, 'write'):
+        write_model(model, filename, initializers=named_arrays)
+    model.graph.initializer.extend(_make_initializers(named_arrays))
+
+
+def _make_lazy_initializer(name, array, location, offset, length):
+    if array.nbytes < DEFAULT_SIZE_THRESHOLD:
+        return numpy_helper.from_array(array, name)
+    tensor = onnx.TensorProto()
+    tensor.name = name
+    tensor.data_type = NP_TYPE_TO_TENSOR_TYPE[array.dtype]
+    tensor.dims.extend(array.shape)
+    set_external_data(tensor, location, offset, length)
+    return tensor
+
+
 def rename_variable_name(
         context, variables, named_vars, new_names, prefix='Input'):
     # Update ``named_vars`` keys to ``new_names``
@@ -221,11 +311,70 @@ class RetainInputHook(chainer.LinkHook):
         super().__exit__(*exc_details)
 
 
+class OnlineConversionHook(object):
+    """Convert function nodes to ONNX nodes as soon as they are applied
+
+    Unlike ``RetainInputHook``, inputs are not retained until the end of the
+    forward computation. Each function node is converted by ``graph`` right
+    after ``FunctionNode.apply``, then outputs are unchained from it, so the
+    function node and arrays retained for backward computation are released
+    when the forward computation does not refer them anymore. Function nodes
+    applied inside forward computation of another function node are not
+    converted.
+
+    Arguments:
+        graph (~onnx_chainer.graph.Graph): The graph to append converted
+            nodes.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.depth = 0
+
+        self.org_apply = chainer.function_node.FunctionNode.apply
+
+        def hooked_apply(_self, inputs):
+            self.depth += 1
+            try:
+                ret = self.org_apply(_self, inputs)
+            finally:
+                self.depth -= 1
+            if self.depth > 0:
+                return ret
+
+            func_inodes = list(_self.inputs)
+            temp_vars = []
+            for i, inode in enumerate(func_inodes):
+                if inode.get_variable_or_none() is None:
+                    # This variable is created within function node, it is
+                    # converted as an implicit input and retained by context.
+                    temp_var = chainer.as_variable(inputs[i])
+                    func_inodes[i] = temp_var.node
+                    temp_vars.append(temp_var)
+            _self.inputs = tuple(func_inodes)
+            self.graph.convert_to_onnx_node(_self)
+            for y in ret:
+                y.unchain()
+            return ret
+        self.hooked_apply = hooked_apply
+
+    def __enter__(self):
+        chainer.function_node.FunctionNode.apply = self.hooked_apply
+        return self
+
+    def __exit__(self, *exc_details):
+        chainer.function_node.FunctionNode.apply = self.org_apply
+
+
 def export(model, args, filename=None, export_params=True,
            graph_name='Graph', save_text=False, opset_version=None,
            input_names=None, output_names=None, train=False,
            return_named_inout=False, external_converters=None,
-           external_opset_imports=None, input_shapes=None):
+           external_opset_imports=None, input_shapes=None,
+           external_data=None, abstract_trace=False, trace_cache=False,
+           profile=None, online_conversion=False, optimize=0,
+           precision='fp32', keep_fp32=None, calibration=None,
+           quantize_weights=None, record_activations=None):
     """Export function for chainer.Chain in ONNX format.
 
     This function performs a forward computation of the given
@@ -263,7 +412,12 @@ def export(model, args, filename=None, export_params=True,
         args (list or dict): The arguments which are given to the model
             directly.
         filename (str or file-like object): The filename used for saving the
-            resulting ONNX model. If None, nothing is saved to the disk.
+            resulting ONNX model. If None, nothing is saved to the disk. When
+            ``opset_version`` is a list, give a list of filenames. When a
+            path is given, parameters of 1KB or larger are written to the
+            file from their buffers, and initializers of the returned model
+            refer to their payloads in the file as external data, which are
+            loaded by :func:`onnx.load_external_data_for_model`.
         export_params (bool): If True, this function exports all the parameters
             included in the given model at the same time. If False, the
             exported ONNX model doesn't include any parameter values.
@@ -271,10 +425,14 @@ def export(model, args, filename=None, export_params=True,
             graph in the exported ONNX model.
         save_text (bool): If True, the text format of the output ONNX model is
             also saved with ``.txt`` extention.
-        opset_version (int): The operator set version of ONNX. If not specified
-            or ``None`` is given, the latest opset version of the onnx module
-            is used. If an integer is given, it will be ensured that all the
-            operator version in the exported ONNX file is less than this value.
+        opset_version (int or list): The operator set version of ONNX. If not
+            specified or ``None`` is given, the latest opset version of the
+            onnx module is used. If an integer is given, it will be ensured
+            that all the operator version in the exported ONNX file is less
+            than this value. If a list of integers is given, the model is
+            traced once and converted for each opset version, then a list of
+            ONNX models is returned. ``filename`` must be a list of the same
+            length in this case.
         input_names (str, list or dict): Customize input names of the graph.
             Number of ``input_names`` must be same as number of ``args``.
             When set dict type, keys must be same as ``args``'s keys.
@@ -292,33 +450,131 @@ def export(model, args, filename=None, export_params=True,
         input_shapes (tuple, list, dict): Input shape of output graph follows
             the customized shapes if set. When input are collection type, set
             list or dict. Tuple of tuple is not allowed.
+        external_data (bool or str): If set, parameters are written straight
+            from their buffers into a data file next to ``filename`` and the
+            ONNX model only keeps the location, offset and length of them.
+            When ``True`` is given, the data file is named ``filename`` +
+            ``'.data'``, when a string is given, it is used as the location of
+            the data file relative to ``filename``. Parameters smaller than
+            1KB are embedded in the model as usual. Constants made by
+            converters which are 1KB or larger are exported as initializers
+            to be stored in the data file too. ``filename`` must be a path to
+            use this option.
+        abstract_trace (bool): If True, forward computation of functions is
+            replaced with inference of output shapes and dtypes, so export
+            time and memory do not depend on the amount of computation and
+            the size of activations. Inputs made by
+            :func:`~onnx_chainer.placeholder` only hold shapes and dtypes.
+            Values of outputs from ``model`` are meaningless in this mode.
+        trace_cache (bool or ~onnx_chainer.trace_cache.TraceCache): If set,
+            the converted graph is cached in process keyed by the structure
+            of ``model``, shapes and dtypes of ``args`` and the other
+            options. Exporting the same architecture again reuses the graph
+            and only parameters are read from ``model``, forward computation,
+            conversion and the check of the model are skipped. When ``True``
+            is given, the default cache is used. The cache is not used with
+            ``return_named_inout``, uninitialized parameters, inputs of
+            functions computed on forward, which may depend on weights,
+            float16 and int8 ``precision`` or ``quantize_weights``.
+        profile (bool or ~onnx_chainer.Profiler): If set, wall time and
+            allocated bytes of each phase of export and each converter are
+            recorded. When ``True`` is given, the report is printed at the
+            end, when :class:`~onnx_chainer.Profiler` is given, events are
+            recorded to it, which can be printed as a table or dumped as a
+            Chrome trace.
+        online_conversion (bool): If True, each function node is converted
+            to ONNX nodes as soon as it is applied in the forward
+            computation, and then outputs are unchained from it. Function
+            nodes and intermediate variables are released on the way of the
+            forward computation, so peak memory is bounded by the live
+            activations of ``model`` instead of all of them. Nodes which do
+            not connect to the outputs are removed after the forward
+            computation. Cannot be used with a list of ``opset_version``.
+        optimize (int or ~onnx_chainer.optimizer.PassManager): Optimization
+            level of the converted graph. ``0`` does nothing, ``1`` runs safe
+            cleanups which keep the computation as is, ``2`` runs fusions
+            too, which can change results slightly. Passes are run after the
+            conversion and before the check of the model, and each pass is
+            recorded by ``profile``. When a
+            :class:`~onnx_chainer.optimizer.PassManager` is given, it is used
+            and keeps statistics of passes. Models whose initializers are
+            rewritten by passes, ``precision`` or ``quantize_weights`` are
+            marked in ``metadata_props`` and refused by
+            :func:`~onnx_chainer.update_weights`.
+        precision (str): Precision of the exported model, ``'fp32'``,
+            ``'fp16'`` or ``'int8'``. When ``'fp16'`` is given, float32
+            initializers and constants are stored in float16 and the graph
+            is computed in float16 after optimization, except numerically
+            sensitive functions, which are batch normalization, softmax,
+            log-softmax, logsumexp and softmax cross entropy, and
+            ``keep_fp32``. Inputs and outputs of the graph keep float32 and
+            Cast nodes are inserted only on boundaries of precisions.
+            When ``'int8'`` is given, weights of Conv, Gemm and MatMul are
+            stored in int8 and their inputs are quantized by QuantizeLinear
+            and DequantizeLinear with ranges recorded on the forward
+            computation of ``args`` and ``calibration``, see
+            :func:`~onnx_chainer.optimizer.int8.quantize_to_int8`. It
+            requires opset version 10 or later, and cannot be used with
+            ``online_conversion`` and ``abstract_trace``.
+        keep_fp32 (list): Links or names of :class:`~chainer.FunctionNode`
+            computed in float32 on float16 ``precision``. Functions taking
+            parameters of the links are kept float32.
+        calibration (iterable): Inputs of ``model`` in the same form as
+            ``args``, whose activations are recorded in addition to ``args``
+            on int8 ``precision`` or with ``record_activations``. They are
+            computed one by one after the conversion and not retained.
+        quantize_weights (str or ~onnx_chainer.optimizer.WeightQuantizer):
+            If ``'int8'`` or ``'uint8'`` is given, large float32
+            initializers are stored per channel in the type and dequantized
+            in the graph, while activations stay float.
+            When a :class:`~onnx_chainer.optimizer.WeightQuantizer` is given,
+            it is used and keeps the size and the max absolute error of each
+            quantized parameter. Can be used only with float32
+            ``precision``.
+        record_activations (bool or ActivationRecorder):
+            If ``True``, min, max, mean, percentiles and histograms of
+            activations are recorded over the forward computation of
+            ``args`` and ``calibration``, and written as JSON to
+            ``metadata_props`` of the exported model keyed by
+            ``'activation_statistics'``. When a
+            :class:`~onnx_chainer.calibration.ActivationRecorder` is given,
+            it is used and keeps the statistics, which are written to its
+            ``filename`` if set. Cannot be used with ``online_conversion``
+            and ``abstract_trace``.
 
     Returns:
         ~onnx.ModelProto or tuple:
             When ``return_named_inout`` is ``False``, return ModelProto as an
             ONNX model. Otherwise return the tuple of ModelProto, named inputs
             and outputs, both inputs and outputs are list of ~chainer.Variable.
+            When ``opset_version`` is a list, a list of ModelProto is returned
+            instead of ModelProto.
 
     """
 
     _check_available()
 
-    with chainer.using_config('train', train),\
-            chainer.using_config('in_recomputing', True),\
-            chainer.using_config('enable_backprop', True):
-        return _export(
+    profiler = get_profiler(profile)
+    with chainer.using_config('train', train), \
+            chainer.using_config('in_recomputing', True), \
+            chainer.using_config('enable_backprop', True), \
+            profiler.record('export'):
+        ret = _export(
             model, args, filename, export_params, graph_name, save_text,
             opset_version, input_names, output_names, return_named_inout,
-            external_converters, external_opset_imports, input_shapes)
+            external_converters, external_opset_imports, input_shapes,
+            external_data, abstract_trace, trace_cache, profiler,
+            online_conversion, optimize, precision, keep_fp32, calibration,
+            quantize_weights, record_activations)
+    if profile is True:
+        profiler.print_report()
+    return ret
 
 
-def _export(model, args, filename, export_params, graph_name, save_text,
-            opset_version, input_names, output_names, return_named_inout,
-            external_converters, external_opset_imports, input_shapes):
+def _check_opset_version(opset_version):
     if opset_version is None:
-        opset_version = min(
-            int(onnx.defs.onnx_opset_version()), MAXIMUM_OPSET_VERSION)
-    elif opset_version < MINIMUM_OPSET_VERSION or \
+        return min(int(onnx.defs.onnx_opset_version()), MAXIMUM_OPSET_VERSION)
+    if opset_version < MINIMUM_OPSET_VERSION or \
             opset_version > MAXIMUM_OPSET_VERSION:
         warnings.warn(
             'ONNX-Chainer has been tested only with opset_version {} ~ {}'
@@ -326,14 +582,124 @@ def _export(model, args, filename, export_params, graph_name, save_text,
             'may cause some problems because the converters used for the '
             'opset_version have not been tested.'.format(
                 MINIMUM_OPSET_VERSION, MAXIMUM_OPSET_VERSION, opset_version))
+    return opset_version
+
+
+def _export(model, args, filename, export_params, graph_name, save_text,
+            opset_version, input_names, output_names, return_named_inout,
+            external_converters, external_opset_imports, input_shapes,
+            external_data, abstract_trace, trace_cache, profiler,
+            online_conversion, optimize, precision, keep_fp32, calibration,
+            quantize_weights, record_activations):
+    if precision not in ('fp32', 'fp16', 'int8'):
+        raise ValueError(
+            'precision must be \'fp32\', \'fp16\' or \'int8\', but {} is '
+            'given'.format(precision))
+    if keep_fp32 is not None and precision != 'fp16':
+        raise ValueError('keep_fp32 can be used only with fp16 precision')
+    activation_recorder = get_activation_recorder(record_activations)
+    if calibration is not None and precision != 'int8' and\
+            activation_recorder is None:
+        raise ValueError(
+            'calibration can be used only with int8 precision or '
+            'record_activations')
+    weight_quantizer = get_weight_quantizer(quantize_weights)
+    if weight_quantizer is not None and precision != 'fp32':
+        raise ValueError(
+            'quantize_weights can be used only with fp32 precision')
+    if precision == 'int8' and (online_conversion or abstract_trace):
+        raise ValueError(
+            'int8 precision cannot be used with online conversion and '
+            'abstract trace')
+    if activation_recorder is not None and\
+            (online_conversion or abstract_trace):
+        raise ValueError(
+            'record_activations cannot be used with online conversion and '
+            'abstract trace')
+    multi_opset = isinstance(opset_version, (list, tuple))
+    if multi_opset and online_conversion:
+        raise ValueError(
+            'Online conversion cannot be used with multiple opset versions')
+    if multi_opset:
+        opset_versions = [_check_opset_version(v) for v in opset_version]
+        if filename is None:
+            filenames = [None] * len(opset_versions)
+        elif isinstance(filename, (list, tuple)) and\
+                len(filename) == len(opset_versions):
+            filenames = filename
+        else:
+            raise ValueError(
+                'When a list of opset versions is given, `filename` must be '
+                'a list of the same length')
+        if isinstance(external_data, str) and len(opset_versions) > 1:
+            raise ValueError(
+                'A location of external data cannot be shared with models of '
+                'multiple opset versions, use `external_data=True`')
+    else:
+        opset_versions = [_check_opset_version(opset_version)]
+        filenames = [filename]
+    if precision == 'int8' and min(opset_versions) < 10:
+        raise ValueError('int8 precision requires opset version 10 or later')
+
+    pass_manager = get_pass_manager(optimize)
+    fp32_function = None
+    if precision == 'fp16':
+        fp32_function = get_fp32_function_filter(keep_fp32)
+    # Int8 export records only ranges unless statistics are requested
+    range_recorder = activation_recorder
+    if range_recorder is None and precision == 'int8':
+        range_recorder = ActivationRecorder(bins=0)
+    if range_recorder is not None:
+        range_recorder.reset()
 
     if input_shapes is not None:
         # if input shapes are invalid, raise exception before forwarding.
         input_shapes = format_customized_shapes(args, input_shapes)
 
-    with RetainInputHook():
-        # Forward computation
+    external_data_writers = [None] * len(opset_versions)
+    if external_data and export_params:
+        external_data_writers = [
+            _make_external_data_writer(f, external_data) for f in filenames]
+
+    if trace_cache is True:
+        trace_cache = get_default_trace_cache()
+    elif trace_cache is False:
+        trace_cache = None
+    cache_keys = [None] * len(opset_versions)
+    # Parameters initialized on forward cannot be read from the cached graph,
+    # and initializers of other precisions are computed on export
+    if trace_cache is not None and not return_named_inout and\
+            precision == 'fp32' and weight_quantizer is None and\
+            activation_recorder is None and\
+            all(p.array is not None for p in model.params()):
+        cache_keys = [make_cache_key(
+            model, args, export_params=export_params, graph_name=graph_name,
+            opset_version=v, input_names=input_names,
+            output_names=output_names, train=chainer.config.train,
+            external_converters=external_converters,
+            external_opset_imports=external_opset_imports,
+            input_shapes=input_shapes, optimize=optimize,
+            abstract_trace=abstract_trace,
+            online_conversion=online_conversion)
+            for v in opset_versions]
+        entries = [trace_cache.get(key) for key in cache_keys]
+        if all(entry is not None for entry in entries):
+            onnx_models = []
+            for entry, f, writer in zip(
+                    entries, filenames, external_data_writers):
+                with profiler.record('convert_parameter'):
+                    onnx_model, named_arrays = _export_cached(
+                        entry, model, writer)
+                with profiler.record('serialize'):
+                    _save_model(onnx_model, f, save_text, named_arrays)
+                onnx_models.append(onnx_model)
+            return onnx_models if multi_opset else onnx_models[0]
+
+    with contextlib.ExitStack() as trace_hooks:
         context = Context(model)
+        # Large constants are stored in the external data with parameters
+        context.promote_large_constants = bool(external_data) and\
+            export_params
         network_inputs = OrderedDict()
         if isinstance(args, tuple):
             args = list(args)
@@ -342,20 +708,16 @@ def _export(model, args, filename, export_params, graph_name, save_text,
                 if isinstance(arg, chainer.get_array_types()):
                     args[i] = chainer.Variable(arg)
                 network_inputs[context.get_name(args[i])] = args[i]
-            outputs = model(*args)
         elif isinstance(args, dict):
             for key, arg in args.items():
                 if isinstance(arg, chainer.get_array_types()):
                     args[key] = chainer.Variable(arg)
                 network_inputs[context.get_name(args[key])] = args[key]
-            outputs = model(**args)
         elif isinstance(args, chainer.get_array_types()):
             args = chainer.Variable(args)
             network_inputs[context.get_name(args)] = args
-            outputs = model(args)
         elif isinstance(args, chainer.Variable):
             network_inputs[context.get_name(args)] = args
-            outputs = model(args)
         else:
             raise ValueError(
                 'The \'args\' argument should be a list, tuple, dict, '
@@ -363,7 +725,37 @@ def _export(model, args, filename, export_params, graph_name, save_text,
                 'given.'.format(type(args)))
         rename_variable_name(context, args, network_inputs, input_names)
 
-        initializers = []
+        if external_converters:
+            chainer.utils.experimental('external_converters')
+            converters = dict(mapping.converters, **external_converters)
+        else:
+            converters = mapping.converters
+        converters = profiler.wrap_converters(converters)
+
+        if online_conversion:
+            # Names of all the parameters are set on the context, including
+            # uninitialized ones.
+            explicit_input_names = set(network_inputs.keys()) | {
+                context.get_name(p) for p in model.params()}
+            context.release_names = True
+            online_graph = Graph(
+                context, converters, opset_versions[0], explicit_input_names,
+                OrderedDict())
+            online_graph.record_constant_values = not abstract_trace
+            online_graph.fp32_function = fp32_function
+            trace_hooks.enter_context(OnlineConversionHook(online_graph))
+        else:
+            trace_hooks.enter_context(RetainInputHook())
+        if range_recorder is not None:
+            trace_hooks.enter_context(range_recorder)
+        if abstract_trace:
+            trace_hooks.enter_context(AbstractTraceHook())
+
+        # Forward computation
+        with profiler.record('forward'):
+            outputs = _forward(model, args)
+
+        parameters = []
         input_tensors = []
         param_names = set()
         for org_name, param in model.namedparams():
@@ -374,24 +766,15 @@ def _export(model, args, filename, export_params, graph_name, save_text,
                     'The parameter \'{}\' is not initialized, skip setting to '
                     'ONNX graph'.format(org_name))
                 continue
-            name = context.get_name(param)
-            param_names.add(name)
-            tensor = convert_parameter(param, context)
-            initializers.append(tensor)
-            input_tensors.append(helper.make_tensor_value_info(
-                name, tensor.data_type, tensor.dims))
+            param_names.add(context.get_name(param))
+            parameters.append(param)
+            input_tensors.append(_make_parameter_value_info(param, context))
 
         for i, (name, var) in enumerate(network_inputs.items()):
             shape = var.shape if input_shapes is None else input_shapes[i]
             input_tensors.append(helper.make_tensor_value_info(
                 name, NP_TYPE_TO_TENSOR_TYPE[var.dtype], shape))
 
-        if external_converters:
-            chainer.utils.experimental('external_converters')
-            converters = dict(mapping.converters, **external_converters)
-        else:
-            converters = mapping.converters
-
         if isinstance(outputs, (list, tuple)):
             flat_outputs = outputs
         elif isinstance(outputs, dict):
@@ -406,28 +789,227 @@ def _export(model, args, filename, export_params, graph_name, save_text,
             raise ValueError('The all \'outputs\' must be Chainer Variable')
         network_outputs = OrderedDict(
             [(context.get_name(var), var) for var in flat_outputs])
+        converted_names = {id(v): name for name, v in network_outputs.items()}
         if output_names:
             rename_variable_name(
                 context, outputs, network_outputs, output_names)
 
-        o = Graph(context, converters, opset_version,
-                  param_names | set(network_inputs.keys()),
-                  network_outputs)
-        o.to_onnx_graph()
+        if online_conversion:
+            output_renames = {
+                converted_names[id(v)]: name
+                for name, v in network_outputs.items()}
+            with profiler.record('convert'):
+                _finalize_online_graph(
+                    online_graph, context, output_renames,
+                    param_names | set(network_inputs.keys()),
+                    network_outputs)
+            if has_computed_inputs(model, context.implicit_inputs):
+                cache_keys = [None]
+            converted = [_collect_converted_graph(
+                online_graph, context, parameters, input_tensors,
+                network_outputs)]
+        else:
+            # Converters update the context, so the traced state is restored
+            # for each opset version.
+            traced_name_list = dict(context.name_list)
+            traced_network_outputs = network_outputs
+            converted = []
+            for i, opset_version in enumerate(opset_versions):
+                context.name_list = dict(traced_name_list)
+                context.parameters = []
+                context.constants = []
+                context.implicit_inputs = dict()
+                network_outputs = OrderedDict(traced_network_outputs)
+                with profiler.record('build_computational_graph'):
+                    o = Graph(context, converters, opset_version,
+                              param_names | set(network_inputs.keys()),
+                              network_outputs)
+                o.record_constant_values = not abstract_trace
+                o.fp32_function = fp32_function
+                with profiler.record('convert'):
+                    o.to_onnx_graph()
+                if has_computed_inputs(model, context.implicit_inputs):
+                    # Values computed from weights on forward are not read
+                    # from the model on a cache hit
+                    cache_keys[i] = None
+                converted.append(_collect_converted_graph(
+                    o, context, parameters, input_tensors, network_outputs))
 
+    if range_recorder is not None and calibration is not None:
+        with profiler.record('calibrate'), range_recorder, \
+                chainer.using_config('enable_backprop', False):
+            for batch in calibration:
+                range_recorder.start_batch()
+                _forward(model, batch)
+                range_recorder.end_batch()
+
+    onnx_models = []
+    for opset_version, converted_graph, f, writer, cache_key in zip(
+            opset_versions, converted, filenames, external_data_writers,
+            cache_keys):
+        nodes, named_parameters, graph_inputs, output_tensors, traced_graph =\
+            converted_graph
+        initializers_rewritten = False
+        if pass_manager is not None or precision != 'fp32' or\
+                weight_quantizer is not None:
+            # Shapes are not static when input shapes are customized
+            graph = OptimizationGraph(
+                nodes, named_parameters, graph_inputs, output_tensors,
+                opset_version,
+                constant_values=traced_graph.constant_values,
+                value_shapes=traced_graph.value_shapes,
+                static_shapes=input_shapes is None)
+            if pass_manager is not None:
+                with profiler.record('optimize'):
+                    pass_manager.run(graph, profiler)
+            if fp32_function is not None:
+                with profiler.record('convert_to_float16'):
+                    convert_to_float16(graph, traced_graph.fp32_nodes)
+            if precision == 'int8':
+                with profiler.record('quantize'):
+                    quantize_to_int8(graph, range_recorder.value_ranges(
+                        traced_graph.function_io_names))
+            if weight_quantizer is not None:
+                with profiler.record('quantize_weights'):
+                    weight_quantizer.run(graph)
+            initializers_rewritten = _is_initializers_rewritten(
+                named_parameters, graph)
+            nodes = graph.nodes
+            named_parameters = graph.named_parameters()
+            graph_inputs = graph.inputs
+            output_tensors = graph.outputs
+            if graph.added_initializers:
+                # Values computed by passes are not read from the model
+                cache_key = None
+
+        # Initializers are written from arrays by ``_save_model`` unless
+        # they are stored in external data
+        initializers = []
+        named_arrays = []
+        if export_params:
+            with profiler.record('convert_parameter'):
+                named_arrays = [
+                    (name, chainer.cuda.to_cpu(_get_parameter_array(p)))
+                    for name, p in named_parameters]
+                if writer is not None:
+                    initializers = _make_initializers(named_arrays, writer)
+                    named_arrays = []
+
+        onnx_graph = helper.make_graph(
+            nodes, graph_name, graph_inputs, output_tensors,
+            initializer=initializers)
+
+        opset_imports = [helper.make_operatorsetid('', opset_version)]
+        if external_opset_imports:
+            chainer.utils.experimental('external_opset_imports')
+            for domain, version in external_opset_imports.items():
+                opset_imports.append(
+                    helper.make_operatorsetid(domain, version))
+        onnx_model = helper.make_model(
+            onnx_graph,
+            producer_name='Chainer',
+            producer_version=chainer.__version__,
+            opset_imports=opset_imports
+        )
+
+        onnx_model.ir_version = onnx.IR_VERSION
+        if activation_recorder is not None:
+            activation_recorder.statistics =\
+                activation_recorder.value_statistics(
+                    traced_graph.function_io_names)
+            activation_recorder.write(onnx_model)
+        if initializers_rewritten:
+            # Initializers do not correspond to parameters of the model
+            # anymore, ``update_weights`` refuses the model
+            prop = onnx_model.metadata_props.add()
+            prop.key = REWRITTEN_INITIALIZERS_KEY
+            prop.value = 'true'
+        with profiler.record('check_model'):
+            check_onnx_model(
+                onnx_model, external_converters, external_opset_imports)
+
+        if input_shapes is not None:
+            for output in onnx_model.graph.output:
+                output.type.Clear()
+            with profiler.record('infer_shapes'):
+                onnx_model = shape_inference.infer_shapes(onnx_model)
+            with profiler.record('check_model'):
+                check_onnx_model(
+                    onnx_model, external_converters, external_opset_imports)
+
+        if cache_key is not None:
+            if not export_params:
+                named_parameters = []
+            trace_cache.put(
+                cache_key,
+                TraceCacheEntry(onnx_model, model, named_parameters))
+
+        with profiler.record('serialize'):
+            _save_model(onnx_model, f, save_text, named_arrays)
+        onnx_models.append(onnx_model)
+
+    if not multi_opset:
+        onnx_models = onnx_models[0]
+    if return_named_inout:
+        chainer.utils.experimental('return_named_inout')
+        return onnx_models, network_inputs, network_outputs
+    return onnx_models
+
+
+def _forward(model, args):
+    if isinstance(args, (list, tuple)):
+        return model(*args)
+    elif isinstance(args, dict):
+        return model(**args)
+    else:
+        return model(args)
+
+
+def _finalize_online_graph(
+        graph, context, output_renames, explicit_input_names,
+        network_outputs):
+    # Output names are given after the conversion
+    for node in graph.graph:
+        for i, name in enumerate(node.input):
+            if name in output_renames:
+                node.input[i] = output_renames[name]
+        for i, name in enumerate(node.output):
+            if name in output_renames:
+                node.output[i] = output_renames[name]
+
+    # Remove nodes which do not connect to outputs, they are not traced on
+    # the offline conversion
+    used_names = set(network_outputs.keys())
+    nodes = []
+    for node in reversed(graph.graph):
+        if any(name in used_names for name in node.output):
+            nodes.append(node)
+            used_names.update(node.input)
+    graph.graph = nodes[::-1]
+
+    # Parameters initialized on the forward computation are registered as
+    # implicit inputs because they are not known before that.
+    context.implicit_inputs = {
+        name: var for name, var in context.implicit_inputs.items()
+        if name in used_names and name not in explicit_input_names}
+    context.parameters = [
+        p for p in context.parameters if context.get_name(p) in used_names]
+
+
+def _collect_converted_graph(
+        graph, context, parameters, input_tensors, network_outputs):
+    parameters = list(parameters)
+    input_tensors = list(input_tensors)
     implicit_input_names = set(context.implicit_inputs.keys())
     for name in implicit_input_names:
-        tensor = convert_parameter(context.implicit_inputs[name], context)
-        initializers.append(tensor)
-        input_tensors.append(helper.make_tensor_value_info(
-            name, tensor.data_type, tensor.dims))
+        param = context.implicit_inputs[name]
+        parameters.append(param)
+        input_tensors.append(_make_parameter_value_info(param, context))
 
     # If additional parameters are created during conversion
     for param in context.parameters:
-        tensor = convert_parameter(param, context)
-        initializers.append(tensor)
-        input_tensors.append(helper.make_tensor_value_info(
-            context.get_name(param), tensor.data_type, tensor.dims))
+        parameters.append(param)
+        input_tensors.append(_make_parameter_value_info(param, context))
 
     # Convert output tensors
     output_tensors = []
@@ -435,52 +1017,34 @@ def _export(model, args, filename, export_params, graph_name, save_text,
         output_tensors.append(helper.make_tensor_value_info(
             name, NP_TYPE_TO_TENSOR_TYPE[var.dtype], var.shape))
 
-    if not export_params:
-        initializers = []
+    # Names depend on the conversion, resolve them here
+    named_parameters = [(context.get_name(p), p) for p in parameters]
+    return graph.graph, named_parameters, input_tensors, output_tensors, graph
 
-    onnx_graph = helper.make_graph(
-        o.graph, graph_name, input_tensors, output_tensors,
-        initializer=initializers)
-
-    opset_imports = [helper.make_operatorsetid('', opset_version)]
-    if external_opset_imports:
-        chainer.utils.experimental('external_opset_imports')
-        for domain, version in external_opset_imports.items():
-            opset_imports.append(helper.make_operatorsetid(domain, version))
-    model = helper.make_model(
-        onnx_graph,
-        producer_name='Chainer',
-        producer_version=chainer.__version__,
-        opset_imports=opset_imports
-    )
-
-    model.ir_version = onnx.IR_VERSION
-    check_onnx_model(model, external_converters, external_opset_imports)
 
-    if input_shapes is not None:
-        for output in model.graph.output:
-            output.type.Clear()
-        model = shape_inference.infer_shapes(model)
-        check_onnx_model(model, external_converters, external_opset_imports)
+def _is_initializers_rewritten(named_parameters, graph):
+    """Returns whether passes added, removed or replaced initializers."""
+    org_ids = {name: id(p) for name, p in named_parameters}
+    if set(org_ids) != set(graph.initializers):
+        return True
+    return any(id(p) != org_ids[name]
+               for name, p in graph.initializers.items())
 
-    if filename is not None and isinstance(filename, str):
-        with open(filename, 'wb') as fp:
-            fp.write(model.SerializeToString())
-        if save_text:
-            with open(filename + '.txt', 'w') as fp:
-                print(model, file=fp)
-    elif hasattr(filename, 'write'):
-        filename.write(model.SerializeToString())
 
-    if return_named_inout:
-        chainer.utils.experimental('return_named_inout')
-        return model, network_inputs, network_outputs
-    return model
+def _export_cached(entry, model, external_data_writer):
+    """Returns the cached model and initializers to be written by arrays."""
+    onnx_model = entry.make_model()
+    named_arrays = list(entry.named_arrays(model))
+    if external_data_writer is None:
+        return onnx_model, named_arrays
+    onnx_model.graph.initializer.extend(_make_initializers(
+        named_arrays, external_data_writer))
+    return onnx_model, []
 
 
 def check_onnx_model(onnx_model, external_converters, external_opset_imports):
     try:
-        checker.check_model(onnx_model)
+        checker.check_model(strip_external_initializers(onnx_model))
     except onnx.checker.ValidationError as e:
         if external_converters is None:
             raise e
@@ -6,9 +6,11 @@ import chainer
 from onnx_chainer.export import export
 from onnx_chainer.onnx_helper import cleanse_param_name
 from onnx_chainer.onnx_helper import write_tensor_pb
+from onnx_chainer.profiler import get_profiler
 
 
-def export_testcase(model, args, out_dir, output_grad=False, **kwargs):
+def export_testcase(model, args, out_dir, output_grad=False, profile=None,
+                    **kwargs):
     """Export model and I/O tensors of the model in protobuf format.
 
     Similar to the `export` function, this function first performs a forward
@@ -22,28 +24,66 @@ def export_testcase(model, args, out_dir, output_grad=False, **kwargs):
         model (~chainer.Chain): The model object.
         args (list): The arguments which are given to the model
             directly. Unlike `export` function, only `list` type is accepted.
-        out_dir (str): The directory name used for saving the input and output.
+        out_dir (str or list): The directory name used for saving the input
+            and output. When ``opset_version`` in ``kwargs`` is a list, give a
+            list of directory names for each opset version.
         output_grad (bool): If True, this function will output model's
             gradient with names 'gradient_%d.pb'.
+        profile (bool or ~onnx_chainer.Profiler): If set, phases of export
+            and of writing test data are recorded. See
+            :func:`~onnx_chainer.export`.
         **kwargs (dict): keyword arguments for ``onnx_chainer.export``.
     """
-    os.makedirs(out_dir, exist_ok=True)
+    if kwargs.get('abstract_trace'):
+        raise ValueError(
+            '`abstract_trace` cannot be used with export_testcase, because '
+            'output values are not computed in the mode')
+    if output_grad and kwargs.get('online_conversion'):
+        raise ValueError(
+            '`output_grad` cannot be used with `online_conversion`, because '
+            'outputs are unchained from the computational graph')
+    multi_opset = isinstance(kwargs.get('opset_version'), (list, tuple))
+    if multi_opset:
+        out_dirs = out_dir
+        if not isinstance(out_dirs, (list, tuple)) or\
+                len(out_dirs) != len(kwargs['opset_version']):
+            raise ValueError(
+                'When a list of opset versions is given, `out_dir` must be a '
+                'list of the same length')
+        filename = [os.path.join(d, 'model.onnx') for d in out_dirs]
+    else:
+        out_dirs = [out_dir]
+        filename = os.path.join(out_dir, 'model.onnx')
+    for d in out_dirs:
+        os.makedirs(d, exist_ok=True)
+    profiler = get_profiler(profile)
+    with profiler.record('export_testcase'):
+        _export_testcase(
+            model, args, out_dirs, filename, output_grad, profiler, **kwargs)
+    if profile is True:
+        profiler.print_report()
+
+
+def _export_testcase(
+        model, args, out_dirs, filename, output_grad, profiler, **kwargs):
     model.cleargrads()
     onnx_model, inputs, outputs = export(
-        model, args, filename=os.path.join(out_dir, 'model.onnx'),
-        return_named_inout=True, **kwargs)
+        model, args, filename=filename, return_named_inout=True,
+        profile=profiler, **kwargs)
 
-    test_data_dir = os.path.join(out_dir, 'test_data_set_0')
-    os.makedirs(test_data_dir, exist_ok=True)
-    for i, (name, var) in enumerate(inputs.items()):
-        pb_name = os.path.join(test_data_dir, 'input_{}.pb'.format(i))
-        array = chainer.cuda.to_cpu(var.array)
-        write_tensor_pb(pb_name, name, array)
+    test_data_dirs = [os.path.join(d, 'test_data_set_0') for d in out_dirs]
+    with profiler.record('write_testcase'):
+        for test_data_dir in test_data_dirs:
+            os.makedirs(test_data_dir, exist_ok=True)
+            for i, (name, var) in enumerate(inputs.items()):
+                pb_name = os.path.join(test_data_dir, 'input_{}.pb'.format(i))
+                array = chainer.cuda.to_cpu(var.array)
+                write_tensor_pb(pb_name, name, array)
 
-    for i, (name, var) in enumerate(outputs.items()):
-        pb_name = os.path.join(test_data_dir, 'output_{}.pb'.format(i))
-        array = chainer.cuda.to_cpu(var.array)
-        write_tensor_pb(pb_name, name, array)
+            for i, (name, var) in enumerate(outputs.items()):
+                pb_name = os.path.join(test_data_dir, 'output_{}.pb'.format(i))
+                array = chainer.cuda.to_cpu(var.array)
+                write_tensor_pb(pb_name, name, array)
 
     if output_grad:
         # Perform backward computation
@@ -51,14 +91,18 @@ def export_testcase(model, args, out_dir, output_grad=False, **kwargs):
             outputs = chainer.functions.identity(*outputs)
         for out in outputs.values():
             out.grad = model.xp.ones_like(out.array)
-        list(outputs.values())[0].backward()
+        with profiler.record('backward'):
+            list(outputs.values())[0].backward()
 
         for i, (name, param) in enumerate(model.namedparams()):
-            pb_name = os.path.join(test_data_dir, 'gradient_{}.pb'.format(i))
             grad = chainer.cuda.to_cpu(param.grad)
             onnx_name = cleanse_param_name(name)
             if grad is None:
                 warnings.warn(
                     'Parameter `{}` does not have gradient value'.format(name))
-            else:
-                write_tensor_pb(pb_name, onnx_name, grad)
+                continue
+            with profiler.record('write_testcase'):
+                for test_data_dir in test_data_dirs:
+                    pb_name = os.path.join(
+                        test_data_dir, 'gradient_{}.pb'.format(i))
+                    write_tensor_pb(pb_name, onnx_name, grad)
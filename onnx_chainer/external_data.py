@@ -0,0 +1,156 @@
+import os
+import sys
+
+import numpy as np
+import onnx
+from onnx.mapping import NP_TYPE_TO_TENSOR_TYPE
+from onnx import numpy_helper
+
+
+DEFAULT_SIZE_THRESHOLD = 1024
+DEFAULT_ALIGNMENT = 64
+
+
+class ExternalDataWriter(object):
+    """Writer of initializer payloads into a file outside of the ONNX model.
+
+    Each array is written straight from its buffer to the end of the data
+    file, and the returned ``TensorProto`` only holds the location, offset and
+    length of the payload. Offsets are aligned to ``alignment`` bytes, so
+    runtimes can memory-map the file and use the weights in place.
+
+    Arguments:
+        dirname (str): The directory where the ONNX model is saved. Locations
+            recorded in tensors are relative to this directory.
+        location (str): The path of the data file, relative to ``dirname``.
+        size_threshold (int): Arrays smaller than this number of bytes are
+            embedded in the model as usual.
+        alignment (int): Alignment of the offset of each array in bytes.
+    """
+
+    def __init__(self, dirname, location,
+                 size_threshold=DEFAULT_SIZE_THRESHOLD,
+                 alignment=DEFAULT_ALIGNMENT):
+        if os.path.isabs(location):
+            raise ValueError(
+                'Location of external data must be a relative path from the '
+                'ONNX model, but an absolute path was given: {}'.format(
+                    location))
+        self.location = location
+        self.path = os.path.join(dirname, location)
+        self.size_threshold = size_threshold
+        self.alignment = alignment
+        self.written_bytes = 0
+        self._fp = None
+
+    def open(self):
+        self._fp = open(self.path, 'wb')
+        self.written_bytes = 0
+        return self
+
+    def close(self):
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc_details):
+        self.close()
+
+    def is_external(self, array):
+        return array.nbytes >= self.size_threshold and\
+            array.dtype.kind in 'biuf' and\
+            array.dtype in NP_TYPE_TO_TENSOR_TYPE
+
+    def make_tensor(self, array, name):
+        """Make a ``TensorProto`` and write its payload to the data file.
+
+        Arguments:
+            array (numpy.ndarray): The array to be saved.
+            name (str): The name of the tensor.
+
+        Returns:
+            ~onnx.TensorProto: A tensor whose data is stored externally, or
+            a usual tensor when the array is smaller than the threshold.
+        """
+        if not self.is_external(array):
+            return numpy_helper.from_array(array, name)
+        assert self._fp is not None, 'external data file is not opened'
+
+        offset = self._write(array)
+        tensor = onnx.TensorProto()
+        tensor.name = name
+        tensor.data_type = NP_TYPE_TO_TENSOR_TYPE[array.dtype]
+        tensor.dims.extend(array.shape)
+        set_external_data(tensor, self.location, offset, array.nbytes)
+        return tensor
+
+    def _write(self, array):
+        if array.dtype.byteorder == '>' or (
+                array.dtype.byteorder == '=' and sys.byteorder == 'big'):
+            array = array.astype(array.dtype.newbyteorder('<'))
+        array = np.ascontiguousarray(array)
+
+        padding = -self.written_bytes % self.alignment
+        if padding:
+            self._fp.write(b'\0' * padding)
+            self.written_bytes += padding
+        offset = self.written_bytes
+        self._fp.write(array.data)
+        self.written_bytes += array.nbytes
+        return offset
+
+
+def set_external_data(tensor, location, offset, length):
+    """Mark the tensor as stored in the external file.
+
+    Arguments:
+        tensor (~onnx.TensorProto): The target tensor, it must not have any
+            data field.
+        location (str): The path of the data file relative to the model.
+        offset (int): Position of the payload in the file in bytes.
+        length (int): Size of the payload in bytes.
+    """
+    tensor.data_location = onnx.TensorProto.EXTERNAL
+    del tensor.external_data[:]
+    for key, value in (
+            ('location', location), ('offset', offset), ('length', length)):
+        entry = tensor.external_data.add()
+        entry.key = key
+        entry.value = str(value)
+
+
+def get_external_data(tensor):
+    """Return external data information of the tensor as dict.
+
+    Returns ``None`` when the tensor is not stored externally.
+    """
+    if tensor.data_location != onnx.TensorProto.EXTERNAL:
+        return None
+    info = {entry.key: entry.value for entry in tensor.external_data}
+    for key in ('offset', 'length'):
+        if key in info:
+            info[key] = int(info[key])
+    return info
+
+
+def strip_external_initializers(model):
+    """Return a copy of the model without externally stored initializers.
+
+    The ONNX checker resolves locations of external data from the current
+    directory when a ``ModelProto`` is given. Names of stripped initializers
+    are still declared as graph inputs, so the rest of the graph can be
+    checked as is. The model itself is returned when it does not have
+    externally stored initializers.
+    """
+    if all(get_external_data(t) is None for t in model.graph.initializer):
+        return model
+    stripped = onnx.ModelProto()
+    stripped.CopyFrom(model)
+    initializers = [t for t in stripped.graph.initializer
+                    if get_external_data(t) is None]
+    del stripped.graph.initializer[:]
+    stripped.graph.initializer.extend(initializers)
+    return stripped
@@ -98,18 +98,20 @@ def convert_EmbedIDFunction(
 @support((1, 6, 7))
 def convert_LinearFunction(
         func, opset_version, input_names, output_names, context):
-    # When the func has bias
+    beta = 1.0
+    # When the func has no bias
     if len(func.inputs) == 2:
-        bias_dim = func.inputs[1].shape[0]
-        bias = np.zeros((bias_dim,), dtype=func.inputs[0].dtype)
-        bias_name = context.add_param(bias, 'bias')
-        input_names.append(bias_name)
+        # C of Gemm is required, pass a broadcasted zero initializer which is
+        # ignored with beta=0
+        zero = np.zeros((1,), dtype=func.inputs[0].dtype)
+        input_names.append(context.add_param(zero, 'zero'))
+        beta = 0.0
 
     if opset_version == 1 or opset_version == 6:
         return onnx_helper.make_node(
             'Gemm', input_names, output_names,
-            alpha=1.0, beta=1.0, broadcast=1, transA=0, transB=1),
+            alpha=1.0, beta=beta, broadcast=1, transA=0, transB=1),
     elif opset_version == 7:
         return onnx_helper.make_node(
             'Gemm', input_names, output_names,
-            alpha=1.0, beta=1.0, transA=0, transB=1),
+            alpha=1.0, beta=beta, transA=0, transB=1),
@@ -1,6 +1,5 @@
 import collections
 from collections import OrderedDict
-import heapq
 
 import chainer
 
@@ -22,40 +21,63 @@ class Graph(object):
         self.explicit_input_names = explicit_input_names
         self.network_outputs = network_outputs
 
+        # Values and shapes traced by Chainer, keyed by ONNX names. Values
+        # are recorded only for outputs depending on parameters and constants
+        self.record_constant_values = True
+        self.constant_names = set()
+        self.constant_values = {}
+        self.value_shapes = {}
+
+        # Function nodes for which ``fp32_function`` returns ``True`` are
+        # converted to ``fp32_nodes``, computed in float32 on float16 export
+        self.fp32_function = None
+        self.fp32_nodes = []
+        # Pairs of names of inputs and outputs keyed by the ID of converted
+        # function nodes
+        self.function_io_names = {}
+
         self.function_nodes = self._build_computational_graph(
             network_outputs.values())
 
     def _build_computational_graph(self, outputs):
-        cands = []
+        # Function nodes are visited in descending order of rank, and in
+        # order of discovery on the same rank. Inputs of a function node
+        # always have lower rank than its outputs, so candidates are bucketed
+        # by rank instead of using a priority queue.
+        buckets = collections.defaultdict(list)
+        visited = set()  # IDs of variable nodes already put as candidate
         function_nodes = OrderedDict()
-        push_count = [0]
 
         def add_cand(cand):
-            heapq.heappush(cands, (-cand.rank, push_count[0], cand))
-            push_count[0] += 1
+            if not isinstance(cand, chainer.variable.VariableNode):
+                raise NotImplementedError(
+                    'ONNX-Chainer does not support node type {}'.format(
+                        type(cand)))
+            cand_id = id(cand)
+            if cand_id in visited:
+                return
+            visited.add(cand_id)
+            buckets[cand.rank].append(cand)
 
         for o in outputs:
             if isinstance(o, chainer.Variable):
                 o = o.node
             add_cand(o)
 
-        while cands:
-            _, _, cand = heapq.heappop(cands)
-            if not isinstance(cand, chainer.variable.VariableNode):
-                raise NotImplementedError(
-                    'ONNX-Chainer does not support node type {}'.format(
-                        type(cand)))
-            creator = cand.creator_node
-            if creator is None:
-                continue
-            assert isinstance(creator, chainer.FunctionNode)
-            creator_id = id(creator)
-            if creator_id in function_nodes:
-                continue
-            function_nodes[creator_id] = creator
-
-            for input_ in creator.inputs:
-                add_cand(input_)
+        max_rank = max(buckets) if buckets else -1
+        for rank in range(max_rank, -1, -1):
+            for cand in buckets.pop(rank, ()):
+                creator = cand.creator_node
+                if creator is None:
+                    continue
+                assert isinstance(creator, chainer.FunctionNode)
+                creator_id = id(creator)
+                if creator_id in function_nodes:
+                    continue
+                function_nodes[creator_id] = creator
+
+                for input_ in creator.inputs:
+                    add_cand(input_)
 
         return reversed(function_nodes.values())
 
@@ -71,6 +93,7 @@ class Graph(object):
         return list(nodes)
 
     def convert_to_onnx_node(self, function):
+        function_id = id(function)
         if isinstance(function, chainer.function.FunctionAdapter):
             function = function.function
         func_name = getattr(
@@ -80,6 +103,7 @@ class Graph(object):
         self.func_name_counts[func_name] += 1
 
         input_names = []
+        is_constant = True
         for input_var in function.inputs:
             # 'input_var' is a VariableNode,
             # so check if it has a Variable/Parameter
@@ -94,6 +118,11 @@ class Graph(object):
                     # register input variables to check implicit inputs
                     self.context.implicit_inputs[input_name] = var
             input_names.append(input_name)
+            self.value_shapes[input_name] = input_var.shape
+            if not (isinstance(var, chainer.Parameter) or
+                    input_name in self.context.implicit_inputs or
+                    input_name in self.constant_names):
+                is_constant = False
 
         # This is to get corresponding VariableNode id from the output
         # Variable of the network
@@ -123,10 +152,23 @@ class Graph(object):
             self.outputs.add(output_name)
 
             output_names.append(output_name)
+            output_node = output_ref()
+            if output_node is not None:
+                self.value_shapes[output_name] = output_node.shape
+            if is_constant:
+                self.constant_names.add(output_name)
+                array = var.array if isinstance(var, chainer.Variable) else\
+                    getattr(output_node, 'data', None)
+                if self.record_constant_values and array is not None:
+                    self.constant_values[output_name] = array
+
+        self.function_io_names[function_id] = input_names, output_names
 
         onnx_helper.set_func_name(base_func_name)
         nodes = self.create_node(
             func_name, function, input_names, output_names)
+        if self.fp32_function is not None and self.fp32_function(function):
+            self.fp32_nodes.extend(nodes)
         # Insert constants before computation nodes.
         self.graph.extend(self.context.constants)
         self.context.constants.clear()
@@ -0,0 +1,16 @@
+from onnx_chainer.optimizer.graph import OptimizationGraph  # NOQA
+from onnx_chainer.optimizer.pass_manager import get_pass_manager  # NOQA
+from onnx_chainer.optimizer.pass_manager import get_passes  # NOQA
+from onnx_chainer.optimizer.pass_manager import PassManager  # NOQA
+from onnx_chainer.optimizer.pass_manager import register_pass  # NOQA
+from onnx_chainer.optimizer.weight_quantization import get_weight_quantizer  # NOQA
+from onnx_chainer.optimizer.weight_quantization import WeightQuantizer  # NOQA
+
+# Passes are registered on import, and run in this order
+from onnx_chainer.optimizer import constant_folding  # NOQA
+from onnx_chainer.optimizer import transpose  # NOQA
+from onnx_chainer.optimizer import shape  # NOQA
+from onnx_chainer.optimizer import fusion  # NOQA
+from onnx_chainer.optimizer import cse  # NOQA
+from onnx_chainer.optimizer import dedup  # NOQA
+from onnx_chainer.optimizer import dce  # NOQA
@@ -0,0 +1,242 @@
+import chainer
+import numpy as np
+from onnx.mapping import TENSOR_TYPE_TO_NP_TYPE
+from onnx import numpy_helper
+
+from onnx_chainer.context import CONSTANT_RAW_DATA_THRESHOLD
+from onnx_chainer.optimizer.graph import get_attribute
+from onnx_chainer.optimizer.graph import get_nbytes
+from onnx_chainer.optimizer.graph import NONDETERMINISTIC_OPS
+from onnx_chainer.optimizer.pass_manager import CLEANUP
+from onnx_chainer.optimizer.pass_manager import register_pass
+
+
+def _binary(func):
+    def evaluate(node, inputs):
+        if get_attribute(node, 'axis') is not None:
+            # Legacy broadcasting with axis
+            raise NotImplementedError
+        return func(*inputs),
+    return evaluate
+
+
+def _div(a, b):
+    if np.issubdtype(a.dtype, np.integer):
+        # Integer division of ONNX truncates toward zero
+        return np.trunc(a / b).astype(a.dtype)
+    return a / b
+
+
+def _cast(node, inputs):
+    return inputs[0].astype(TENSOR_TYPE_TO_NP_TYPE[get_attribute(node, 'to')]),
+
+
+def _concat(node, inputs):
+    return np.concatenate(inputs, axis=get_attribute(node, 'axis')),
+
+
+def _constant_of_shape(node, inputs):
+    value = get_attribute(node, 'value')
+    if value is None:
+        value = np.zeros((1,), dtype=np.float32)
+    else:
+        value = numpy_helper.to_array(value)
+    return np.full(tuple(inputs[0]), value.reshape(()), dtype=value.dtype),
+
+
+def _gather(node, inputs):
+    return np.take(inputs[0], inputs[1], axis=get_attribute(node, 'axis', 0)),
+
+
+def _reshape(node, inputs):
+    x, shape = inputs
+    # 0 means copying the dimension of the input
+    shape = [x.shape[i] if d == 0 else d for i, d in enumerate(shape)]
+    return x.reshape(shape),
+
+
+def _slice(node, inputs):
+    x = inputs[0]
+    if len(inputs) == 1:
+        starts = get_attribute(node, 'starts')
+        ends = get_attribute(node, 'ends')
+        axes = get_attribute(node, 'axes')
+        steps = None
+    else:
+        starts, ends = inputs[1], inputs[2]
+        axes = inputs[3] if len(inputs) > 3 else None
+        steps = inputs[4] if len(inputs) > 4 else None
+    if axes is None:
+        axes = range(len(starts))
+    if steps is None:
+        steps = [1] * len(starts)
+    slices = [slice(None)] * x.ndim
+    for axis, start, end, step in zip(axes, starts, ends, steps):
+        slices[axis] = slice(int(start), int(end), int(step))
+    return x[tuple(slices)],
+
+
+def _squeeze(node, inputs):
+    axes = get_attribute(node, 'axes')
+    if axes is None:
+        return np.squeeze(inputs[0]),
+    return np.squeeze(inputs[0], axis=tuple(axes)),
+
+
+def _transpose(node, inputs):
+    return np.transpose(inputs[0], get_attribute(node, 'perm')),
+
+
+def _unsqueeze(node, inputs):
+    x = inputs[0]
+    axes = get_attribute(node, 'axes')
+    ndim = x.ndim + len(axes)
+    for axis in sorted(a + ndim if a < 0 else a for a in axes):
+        x = np.expand_dims(x, axis)
+    return x,
+
+
+_evaluators = {
+    'Add': _binary(np.add),
+    'Cast': _cast,
+    'Concat': _concat,
+    'ConstantOfShape': _constant_of_shape,
+    'Div': _binary(_div),
+    'Gather': _gather,
+    'Identity': lambda node, inputs: (inputs[0],),
+    'Mul': _binary(np.multiply),
+    'Reshape': _reshape,
+    'Slice': _slice,
+    'Squeeze': _squeeze,
+    'Sub': _binary(np.subtract),
+    'Transpose': _transpose,
+    'Unsqueeze': _unsqueeze,
+}
+
+
+@register_pass(level=CLEANUP)
+def fold_constants(graph):
+    """Replace subgraphs depending only on constants with initializers.
+
+    Nodes are foldable when all the inputs are initializers, outputs of
+    Constant nodes or of other foldable nodes, and ``Shape`` is foldable when
+    the shape of the input is static. Values traced by Chainer are used as
+    is, values of intermediates made inside converters are computed with
+    NumPy for a set of operators. Folded values larger than 1KB and larger
+    than the constants they are made from, like broadcasted arrays, are not
+    folded to keep the model small.
+    """
+    producers = graph.producers()
+    constant_names = set(graph.initializers)
+    # Bytes of the largest constant which values depend on
+    source_bytes = {
+        name: get_nbytes(param) for name, param in graph.initializers.items()}
+    for node in graph.nodes:
+        if node.op_type == 'Constant':
+            constant_names.update(node.output)
+            nbytes = graph.get_constant(node.output[0], producers).nbytes
+            source_bytes[node.output[0]] = nbytes
+
+    foldable_nodes = []
+    for node in graph.nodes:
+        if node.op_type == 'Constant' or node.op_type in NONDETERMINISTIC_OPS:
+            continue
+        if node.op_type == 'Shape' and graph.static_shapes and\
+                node.input[0] in graph.value_shapes:
+            nbytes = 0
+        elif node.input and all(
+                not name or name in constant_names for name in node.input):
+            nbytes = max(source_bytes.get(name, 0) for name in node.input)
+        else:
+            continue
+        foldable_nodes.append(node)
+        constant_names.update(node.output)
+        for name in node.output:
+            source_bytes[name] = nbytes
+    if not foldable_nodes:
+        return
+
+    foldable_ids = {id(node) for node in foldable_nodes}
+    folded_names = set()
+    for node in foldable_nodes:
+        folded_names.update(node.output)
+    # Folded values used by the other nodes, in order of appearance
+    targets = []
+    target_names = set()
+    for node in graph.nodes:
+        if id(node) in foldable_ids:
+            continue
+        for name in node.input:
+            if name in folded_names and name not in target_names:
+                targets.append(name)
+                target_names.add(name)
+
+    # Values to compute with NumPy, which are not traced
+    values = {}
+
+    def get_value(name):
+        if name in values:
+            return values[name]
+        if name in graph.constant_values:
+            return chainer.cuda.to_cpu(graph.constant_values[name])
+        return graph.get_constant(name, producers)
+
+    required = set()
+    stack = list(targets)
+    while stack:
+        name = stack.pop()
+        if name in graph.constant_values or name not in folded_names:
+            continue
+        node = producers[name]
+        if id(node) in required:
+            continue
+        required.add(id(node))
+        if node.op_type != 'Shape':
+            stack.extend(node.input)
+    for node in foldable_nodes:
+        if id(node) not in required:
+            continue
+        if node.op_type == 'Shape':
+            values[node.output[0]] = np.array(
+                graph.value_shapes[node.input[0]], dtype=np.int64)
+            continue
+        evaluator = _evaluators.get(node.op_type)
+        inputs = [get_value(name) if name else None for name in node.input]
+        if evaluator is None or any(
+                v is None for v, name in zip(inputs, node.input) if name):
+            continue
+        try:
+            outputs = evaluator(node, inputs)
+        except Exception:
+            # Unsupported attributes, leave the node as is
+            continue
+        values.update(zip(node.output, outputs))
+
+    replaced = {}
+    for name in targets:
+        value = get_value(name)
+        if value is None:
+            continue
+        value = np.asarray(value)
+        if value.nbytes > max(CONSTANT_RAW_DATA_THRESHOLD, source_bytes[name]):
+            continue
+        replaced[name] = graph.add_initializer(name + '_folded', value)
+    if not replaced:
+        return
+    for node in graph.nodes:
+        if id(node) in foldable_ids:
+            continue
+        for i, name in enumerate(node.input):
+            if name in replaced:
+                node.input[i] = replaced[name]
+
+    # Remove foldable nodes and constants not used anymore
+    used = graph.output_names
+    removed = []
+    for node in reversed(graph.nodes):
+        if (id(node) in foldable_ids or node.op_type == 'Constant') and\
+                not any(name in used for name in node.output):
+            removed.append(node)
+            continue
+        used.update(node.input)
+    graph.remove_nodes(removed)
@@ -0,0 +1,73 @@
+import hashlib
+
+from onnx import numpy_helper
+
+from onnx_chainer.optimizer.graph import NONDETERMINISTIC_OPS
+from onnx_chainer.optimizer.pass_manager import CLEANUP
+from onnx_chainer.optimizer.pass_manager import register_pass
+
+
+def _constant_bytes(node):
+    return numpy_helper.to_array(node.attribute[0].t).tobytes()
+
+
+def _constant_key(node):
+    """Return a hashable key of the value of Constant node."""
+    if len(node.attribute) != 1 or node.attribute[0].name != 'value':
+        return None
+    array = numpy_helper.to_array(node.attribute[0].t)
+    digest = hashlib.sha1(array.tobytes()).digest()
+    return 'Constant', array.dtype.str, array.shape, digest
+
+
+def _node_key(node):
+    attributes = tuple(
+        attr.SerializeToString()
+        for attr in sorted(node.attribute, key=lambda a: a.name))
+    return (node.op_type, node.domain, tuple(node.input), attributes,
+            len(node.output))
+
+
+@register_pass(level=CLEANUP)
+def eliminate_common_subexpressions(graph):
+    """Merge Constant nodes of the same value and nodes of the same inputs.
+
+    Nodes whose operator, attributes and inputs are the same as an earlier
+    node are removed, and their outputs are replaced with the outputs of the
+    earlier node. Constant nodes are compared by the hash of their values, so
+    constants added by converters for each function are shared. Nodes making
+    graph outputs and nondeterministic operators are kept.
+    """
+    output_names = graph.output_names
+    seen = {}
+    # Removed outputs to the names to use instead
+    renames = {}
+    removed = []
+    for node in graph.nodes:
+        for i, name in enumerate(node.input):
+            if name in renames:
+                node.input[i] = renames[name]
+        if node.op_type in NONDETERMINISTIC_OPS:
+            continue
+        if node.op_type == 'Constant':
+            key = _constant_key(node)
+            if key is None:
+                continue
+        else:
+            key = _node_key(node)
+        first = seen.get(key)
+        if first is None:
+            seen[key] = node
+            continue
+        if node.op_type == 'Constant' and\
+                _constant_bytes(first) != _constant_bytes(node):
+            # Hash collision
+            continue
+        if any(name in output_names or (name and not first_name)
+               for name, first_name in zip(node.output, first.output)):
+            continue
+        for name, first_name in zip(node.output, first.output):
+            if name:
+                renames[name] = first_name
+        removed.append(node)
+    graph.remove_nodes(removed)
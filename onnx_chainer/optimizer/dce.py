@@ -0,0 +1,83 @@
+import chainer
+
+from onnx_chainer.optimizer.graph import get_attribute
+from onnx_chainer.optimizer.pass_manager import CLEANUP
+from onnx_chainer.optimizer.pass_manager import register_pass
+
+
+def _is_identity(node, opset_version):
+    if node.op_type == 'Identity':
+        return True
+    if node.op_type != 'Dropout' or len(node.input) > 1:
+        # Dropout of opset 12 or later takes training_mode as an input
+        return False
+    if len(node.output) > 1 and node.output[1]:
+        return False
+    if opset_version < 7:
+        return bool(get_attribute(node, 'is_test', 0))
+    # Dropout of opset 7 to 11 has no flag of the mode, it is exported for
+    # training on ``chainer.config.train``
+    return not chainer.config.train
+
+
+@register_pass(level=CLEANUP)
+def eliminate_identities(graph):
+    """Remove Identity and Dropout in inference mode.
+
+    Consumers are rewired to the input of the removed node. When the output
+    is a graph output, the node making the input outputs it directly if
+    possible. Dropout is removed only when it has no mask output and is in
+    inference mode, given by ``is_test`` below opset version 7, otherwise by
+    ``chainer.config.train`` on export.
+    """
+    producers = graph.producers()
+    consumers = graph.consumers()
+    output_names = graph.output_names
+    # Removed outputs to the names to use instead
+    renames = {}
+    removed = []
+    for node in graph.nodes:
+        for i, name in enumerate(node.input):
+            if name in renames:
+                node.input[i] = renames[name]
+        if not _is_identity(node, graph.opset_version):
+            continue
+        x_name, y_name = node.input[0], node.output[0]
+        x_consumers = [n for n in consumers.get(x_name, []) if n is not node]
+        if y_name in output_names:
+            # Let the producer output the graph output instead, the input
+            # must not be used by others
+            parent = producers.get(x_name)
+            if parent is None or x_name in output_names or x_consumers:
+                continue
+            parent.output[list(parent.output).index(x_name)] = y_name
+            producers[y_name] = parent
+        else:
+            renames[y_name] = x_name
+            consumers[x_name] = x_consumers + consumers.get(y_name, [])
+        removed.append(node)
+    graph.remove_nodes(removed)
+
+
+@register_pass(level=CLEANUP)
+def eliminate_dead_nodes(graph):
+    """Remove nodes whose outputs do not reach any graph output."""
+    used = graph.output_names
+    removed = []
+    for node in reversed(graph.nodes):
+        if not any(name in used for name in node.output):
+            removed.append(node)
+            continue
+        used.update(node.input)
+    graph.remove_nodes(removed)
+
+
+@register_pass(level=CLEANUP)
+def eliminate_unused_initializers(graph):
+    """Remove initializers which are not used by any node nor output."""
+    used = graph.output_names
+    for node in graph.nodes:
+        used.update(node.input)
+    for name in list(graph.initializers):
+        if name not in used:
+            graph.remove_initializer(name)
@@ -0,0 +1,91 @@
+import collections
+import hashlib
+
+import chainer
+import numpy as np
+
+from onnx_chainer.optimizer.pass_manager import FUSION
+from onnx_chainer.optimizer.pass_manager import register_pass
+
+
+# Bytes of arrays hashed at once, to avoid copying a whole large array to
+# host memory
+HASH_CHUNK_SIZE = 64 * 1024 * 1024
+
+
+def _get_array(param):
+    if isinstance(param, chainer.Variable):
+        param = param.array
+    return param
+
+
+def _iter_chunks(array):
+    """Yield bytes of the array in C order as memoryviews of chunks."""
+    if isinstance(array, np.ndarray):
+        # Contiguous arrays are not copied
+        buf = memoryview(np.ascontiguousarray(array)).cast('B')
+        for i in range(0, buf.nbytes, HASH_CHUNK_SIZE):
+            yield buf[i:i + HASH_CHUNK_SIZE]
+        return
+    flat = array.reshape(-1)
+    n = max(1, HASH_CHUNK_SIZE // max(1, array.itemsize))
+    for i in range(0, flat.size, n):
+        chunk = np.ascontiguousarray(chainer.cuda.to_cpu(flat[i:i + n]))
+        yield memoryview(chunk).cast('B')
+
+
+def _digest(array):
+    h = hashlib.sha1()
+    for chunk in _iter_chunks(array):
+        h.update(chunk)
+    return h.digest()
+
+
+def _equal(a, b):
+    return all(x == y for x, y in zip(_iter_chunks(a), _iter_chunks(b)))
+
+
+@register_pass(level=FUSION)
+def deduplicate_initializers(graph):
+    """Share one initializer among initializers of the same content.
+
+    Initializers are grouped by dtype and shape first, and only ones having
+    the same dtype and shape as others are hashed, in chunks of
+    :data:`HASH_CHUNK_SIZE` bytes. Inputs of nodes are renamed to one
+    initializer of the same content and the others are removed. Initializers
+    added by passes, like folded weights, are kept in preference to
+    parameters, so that a computed value does not take over the name of an
+    unrelated parameter. Merged initializers like zero biases of different
+    links can not be updated by :func:`~onnx_chainer.update_weights`
+    independently anymore, which refuses models rewritten by this pass.
+    """
+    output_names = graph.output_names
+    groups = collections.defaultdict(list)
+    for name, param in graph.initializers.items():
+        if name in output_names:
+            continue
+        array = _get_array(param)
+        groups[(array.dtype.str, array.shape)].append(name)
+
+    renames = {}
+    for names in groups.values():
+        if len(names) < 2:
+            continue
+        # Initializers added by passes come first and survive
+        names.sort(key=lambda name: name not in graph.added_initializers)
+        firsts = {}
+        for name in names:
+            array = _get_array(graph.initializers[name])
+            first = firsts.setdefault(_digest(array), name)
+            if first != name and _equal(
+                    _get_array(graph.initializers[first]), array):
+                renames[name] = first
+    if not renames:
+        return
+
+    for node in graph.nodes:
+        for i, name in enumerate(node.input):
+            if name in renames:
+                node.input[i] = renames[name]
+    for name in renames:
+        graph.remove_initializer(name)
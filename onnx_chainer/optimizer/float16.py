@@ -0,0 +1,229 @@
+import chainer
+import numpy as np
+import onnx
+from onnx import helper
+from onnx import numpy_helper
+from onnx import TensorProto
+
+from onnx_chainer.optimizer.graph import get_attribute
+from onnx_chainer.optimizer.graph import set_attribute
+
+
+# Chainer functions computed in float32 on float16 export, because they are
+# numerically sensitive
+FP32_FUNCTIONS = {
+    'BatchNormalization', 'FixedBatchNormalization', 'LogSoftmax',
+    'LogSumExp', 'Softmax', 'SoftmaxCrossEntropy',
+}
+
+# Inputs which must be float32 regardless of the data type
+_fp32_inputs = {
+    'Resize': (1,),
+    'Upsample': (1,),
+}
+
+# Attributes which decide the float type of outputs
+_dtype_attributes = {
+    'Cast': 'to',
+    'EyeLike': 'dtype',
+    'RandomNormal': 'dtype',
+    'RandomNormalLike': 'dtype',
+    'RandomUniform': 'dtype',
+    'RandomUniformLike': 'dtype',
+}
+
+FP16 = 'fp16'
+FP32 = 'fp32'
+
+
+def _infer_float_values(graph):
+    """Return names of float32 values inferred by ONNX."""
+    onnx_graph = helper.make_graph(
+        graph.nodes, 'graph', graph.inputs, graph.outputs)
+    model = helper.make_model(
+        onnx_graph,
+        opset_imports=[helper.make_operatorsetid('', graph.opset_version)])
+    inferred = onnx.shape_inference.infer_shapes(model).graph
+    names = set()
+    for value_info in list(inferred.input) + list(inferred.output) +\
+            list(inferred.value_info):
+        if value_info.type.tensor_type.elem_type == TensorProto.FLOAT:
+            names.add(value_info.name)
+    return names
+
+
+def _to_float16_node(node):
+    """Make a node computed in float32 output float16 values."""
+    name = _dtype_attributes.get(node.op_type)
+    if name is not None:
+        dtype = get_attribute(node, name)
+        if dtype == TensorProto.FLOAT or dtype is None and\
+                node.op_type in ('RandomNormal', 'RandomUniform'):
+            set_attribute(node, name, TensorProto.FLOAT16)
+    elif node.op_type == 'ConstantOfShape':
+        value = get_attribute(node, 'value')
+        if value is None:
+            # Float32 zero by default
+            value = np.zeros((1,), dtype=np.float16)
+        else:
+            value = numpy_helper.to_array(value)
+            if value.dtype != np.float32:
+                return
+            value = value.astype(np.float16)
+        set_attribute(node, 'value', numpy_helper.from_array(value))
+
+
+def convert_to_float16(graph, fp32_nodes=()):
+    """Convert float32 computation of the graph to float16.
+
+    Float32 initializers and Constant nodes used by float16 nodes are stored
+    in float16, and copied when they are used by float32 nodes too. Cast
+    nodes are inserted only on boundaries between float16 nodes and
+    float32 nodes, graph inputs and graph outputs, which keep float32.
+    Types of values are inferred by ONNX, values of unknown types are left
+    as is.
+
+    Args:
+        graph (~onnx_chainer.optimizer.OptimizationGraph): The graph
+            converted in place.
+        fp32_nodes (list): Nodes computed in float32.
+    """
+    float_names = _infer_float_values(graph)
+    fp32_ids = {id(node) for node in fp32_nodes}
+    constant_nodes = {}
+    for node in graph.nodes:
+        if node.op_type == 'Constant' and\
+                get_attribute(node, 'value') is not None:
+            constant_nodes[node.output[0]] = node
+
+    def required_precision(node, i):
+        if id(node) in fp32_ids or i in _fp32_inputs.get(node.op_type, ()):
+            return FP32
+        return FP16
+
+    # Precisions required by consumers of each float32 value
+    required = {}
+    for node in graph.nodes:
+        for i, name in enumerate(node.input):
+            if name in float_names:
+                required.setdefault(name, set()).add(
+                    required_precision(node, i))
+    for name in graph.output_names:
+        if name in float_names:
+            required.setdefault(name, set()).add(FP32)
+
+    # Constants are stored in the required precision
+    fp16_values = set()
+    fp16_copies = {}
+    for name, precisions in required.items():
+        if FP16 not in precisions:
+            continue
+        if name in graph.initializers:
+            array = graph.get_initializer(name).astype(np.float16)
+            if FP32 in precisions:
+                fp16_copies[name] = graph.add_initializer(
+                    name + '_fp16', array)
+                continue
+            graph.remove_initializer(name)
+            graph.initializers[name] = array
+            graph.inputs.append(helper.make_tensor_value_info(
+                name, TensorProto.FLOAT16, array.shape))
+            graph.added_initializers.add(name)
+            fp16_values.add(name)
+        elif name in constant_nodes:
+            node = constant_nodes[name]
+            array = numpy_helper.to_array(
+                get_attribute(node, 'value')).astype(np.float16)
+            if FP32 in precisions:
+                new_name = graph.unique_name(name + '_fp16')
+                graph.nodes.insert(
+                    graph.nodes.index(node) + 1, helper.make_node(
+                        'Constant', [], [new_name],
+                        value=numpy_helper.from_array(array, new_name)))
+                fp16_copies[name] = new_name
+                continue
+            set_attribute(node, 'value', numpy_helper.from_array(array, name))
+            fp16_values.add(name)
+
+    # Float values made by float16 nodes are float16
+    for node in graph.nodes:
+        if node.op_type == 'Constant' or id(node) in fp32_ids:
+            continue
+        _to_float16_node(node)
+        fp16_values.update(
+            name for name in node.output if name in float_names)
+
+    output_names = graph.output_names
+    casts = {}  # Casted names keyed by pairs of the value and the precision
+    output_renames = {}
+    new_nodes = []
+
+    def cast(name, precision):
+        key = name, precision
+        if key not in casts:
+            if precision == FP16:
+                casts[key] = graph.unique_name(name + '_fp16')
+                to = TensorProto.FLOAT16
+            else:
+                casts[key] = graph.unique_name(name + '_fp32')
+                to = TensorProto.FLOAT
+            new_nodes.append(helper.make_node(
+                'Cast', [name], [casts[key]], to=to))
+        return casts[key]
+
+    # Graph inputs are casted at first
+    for name in sorted(graph.input_names):
+        if FP16 in required.get(name, ()):
+            cast(name, FP16)
+    for node in graph.nodes:
+        for i, name in enumerate(node.input):
+            if name in output_renames:
+                name = node.input[i] = output_renames[name]
+            if name not in float_names:
+                continue
+            precision = required_precision(node, i)
+            if precision == FP16 and name in fp16_copies:
+                node.input[i] = fp16_copies[name]
+            elif (name in fp16_values) != (precision == FP16):
+                node.input[i] = cast(name, precision)
+        new_nodes.append(node)
+        for j, name in enumerate(node.output):
+            if name in output_names and name in fp16_values:
+                # Keep the name and the type of the graph output
+                new_name = graph.unique_name(name + '_fp16')
+                node.output[j] = new_name
+                output_renames[name] = new_name
+                float_names.add(new_name)
+                fp16_values.add(new_name)
+                new_nodes.append(helper.make_node(
+                    'Cast', [new_name], [name], to=TensorProto.FLOAT))
+    graph.nodes[:] = new_nodes
+
+
+def get_fp32_function_filter(keep_fp32):
+    """Return a function telling whether a function node is kept float32.
+
+    Args:
+        keep_fp32 (list): Links or names of Chainer functions. Functions
+            taking parameters of the links are kept float32.
+    """
+    param_ids = set()
+    names = set(FP32_FUNCTIONS)
+    for item in keep_fp32 or ():
+        if isinstance(item, str):
+            names.add(item)
+        elif isinstance(item, chainer.Link):
+            param_ids.update(id(p) for p in item.params())
+        else:
+            raise TypeError(
+                'keep_fp32 must be a list of links or function names, but {} '
+                'is given'.format(type(item)))
+
+    def is_fp32(function):
+        name = getattr(function, 'custom_function_node_name',
+                       function.__class__.__name__)
+        if name in names:
+            return True
+        return any(id(v.get_variable_or_none()) in param_ids
+                   for v in function.inputs)
+    return is_fp32
@@ -0,0 +1,271 @@
+import numpy as np
+from onnx import helper
+
+from onnx_chainer.optimizer.graph import get_attribute
+from onnx_chainer.optimizer.graph import set_attribute
+from onnx_chainer.optimizer.pass_manager import FUSION
+from onnx_chainer.optimizer.pass_manager import register_pass
+
+
+def _scale_weight(node, w, scale):
+    """Multiply output channels of the weight by ``scale``."""
+    if node.op_type == 'Conv':
+        return w * scale.reshape((-1,) + (1,) * (w.ndim - 1))
+    if node.op_type == 'ConvTranspose':
+        # (C_in, C_out / group, ...), output channels are grouped
+        group = get_attribute(node, 'group', 1)
+        in_channels, out_channels_per_group = w.shape[:2]
+        grouped = w.reshape(
+            (group, in_channels // group, out_channels_per_group) +
+            w.shape[2:])
+        scale = scale.reshape(
+            (group, 1, out_channels_per_group) + (1,) * (w.ndim - 2))
+        return (grouped * scale).reshape(w.shape)
+    # Gemm
+    if get_attribute(node, 'transB', 0):
+        return w * scale[:, None]
+    return w * scale[None, :]
+
+
+def _has_bias(node):
+    if len(node.input) < 3 or not node.input[2]:
+        return False
+    # C of Gemm is required until opset 11, zero beta means no bias
+    return node.op_type != 'Gemm' or get_attribute(node, 'beta', 1.0) != 0
+
+
+def _get_bias(graph, node, producers, n_channels, dtype):
+    if not _has_bias(node):
+        return np.zeros((n_channels,), dtype=dtype)
+    b = graph.get_constant(node.input[2], producers)
+    if b is None:
+        return None
+    if node.op_type == 'Gemm':
+        # Only bias broadcasted along the batch axis can be folded
+        if b.size != n_channels or b.shape[-1] != n_channels:
+            return None
+        b = b.reshape(n_channels) * get_attribute(node, 'beta', 1.0)
+    return b
+
+
+@register_pass(level=FUSION)
+def fold_batch_normalization(graph):
+    """Fold BatchNormalization into preceding Conv, ConvTranspose and Gemm.
+
+    Scale, bias, mean and variance of the BatchNormalization are merged into
+    the weight and the bias of the preceding node when all of them are
+    constants and the output of the preceding node is used only by the
+    BatchNormalization, then the BatchNormalization is removed. Folded
+    weights and biases are added as new initializers.
+    """
+    producers = graph.producers()
+    consumers = graph.consumers()
+    output_names = graph.output_names
+    removed = []
+    for bn in graph.nodes:
+        if bn.op_type != 'BatchNormalization':
+            continue
+        if not get_attribute(bn, 'is_test', 1) or\
+                not get_attribute(bn, 'spatial', 1):
+            continue
+        if any(name in consumers or name in output_names
+               for name in bn.output[1:]):
+            continue
+        x_name = bn.input[0]
+        node = producers.get(x_name)
+        if node is None or\
+                node.op_type not in ('Conv', 'ConvTranspose', 'Gemm'):
+            continue
+        if x_name in output_names or len(consumers.get(x_name, ())) != 1:
+            continue
+
+        bn_values = [graph.get_constant(name, producers)
+                     for name in bn.input[1:5]]
+        w = graph.get_constant(node.input[1], producers)
+        if w is None or any(v is None for v in bn_values):
+            continue
+        gamma, beta, mean, var = [v.astype(np.float64) for v in bn_values]
+        b = _get_bias(graph, node, producers, len(mean), w.dtype)
+        if b is None:
+            continue
+
+        scale = gamma / np.sqrt(var + get_attribute(bn, 'epsilon', 1e-5))
+        new_w = _scale_weight(node, w.astype(np.float64), scale)
+        new_b = (b.astype(np.float64) - mean) * scale + beta
+
+        w_name = graph.add_initializer(
+            node.input[1] + '_folded', new_w.astype(w.dtype))
+        b_base_name = node.input[2] if _has_bias(node) else bn.input[2]
+        b_name = graph.add_initializer(
+            b_base_name + '_folded', new_b.astype(w.dtype))
+        node.input[1] = w_name
+        if len(node.input) > 2:
+            node.input[2] = b_name
+        else:
+            node.input.append(b_name)
+        if node.op_type == 'Gemm':
+            set_attribute(node, 'beta', 1.0)
+        node.output[0] = bn.output[0]
+        producers[bn.output[0]] = node
+        removed.append(bn)
+    graph.remove_nodes(removed)
+
+
+def _get_pads(node):
+    """Return ``pads`` of Pad node, or ``None`` if it is not constant."""
+    if len(node.input) > 1:
+        # Pad of opset 11 or later takes pads as an input
+        return None
+    pads = get_attribute(node, 'pads')
+    if pads is None:
+        # Pad-1
+        pads = get_attribute(node, 'paddings')
+    return None if pads is None else list(pads)
+
+
+@register_pass(level=FUSION)
+def fuse_pad(graph):
+    """Fuse constant Pad into pads of the following Conv or pooling.
+
+    Zero padding is merged into Conv and AveragePool counting pads in the
+    average, and padding with ``-inf``, or zero padding of outputs of Relu,
+    is merged into MaxPool. Only padding of spatial dimensions can be
+    merged, and pads of pooling must be smaller than the kernel.
+    """
+    producers = graph.producers()
+    consumers = graph.consumers()
+    output_names = graph.output_names
+    removed = []
+    for node in graph.nodes:
+        if node.op_type not in ('Conv', 'AveragePool', 'MaxPool'):
+            continue
+        if get_attribute(node, 'auto_pad', b'NOTSET') != b'NOTSET':
+            continue
+        if node.op_type == 'MaxPool' and len(node.output) > 1 and\
+                node.output[1]:
+            # Indices depend on padding
+            continue
+        if node.op_type == 'AveragePool' and\
+                not get_attribute(node, 'count_include_pad', 0):
+            continue
+        pad = producers.get(node.input[0])
+        if pad is None or pad.op_type != 'Pad' or\
+                pad.output[0] in output_names or\
+                len(consumers.get(pad.output[0], ())) != 1:
+            continue
+        if get_attribute(pad, 'mode', b'constant') != b'constant':
+            continue
+        pads = _get_pads(pad)
+        if pads is None:
+            continue
+        value = get_attribute(pad, 'value', 0.0)
+        if node.op_type == 'MaxPool':
+            # Zero padding of non-negative values works as -inf too
+            x = producers.get(pad.input[0])
+            if value != -np.inf and not (
+                    value == 0.0 and x is not None and x.op_type == 'Relu'):
+                continue
+        elif value != 0.0:
+            continue
+        ndim = len(pads) // 2
+        begins, ends = pads[:ndim], pads[ndim:]
+        # Batch and channel dimensions must not be padded
+        if any(begins[:2]) or any(ends[:2]):
+            continue
+        n_spatial = ndim - 2
+        node_pads = get_attribute(node, 'pads', [0] * (n_spatial * 2))
+        new_pads = [p + q for p, q in zip(
+            node_pads, begins[2:] + ends[2:])]
+        if node.op_type != 'Conv':
+            # Pads larger than the kernel are not allowed on pooling
+            kernel_shape = get_attribute(node, 'kernel_shape')
+            if any(p >= k for p, k in zip(
+                    new_pads, list(kernel_shape) * 2)):
+                continue
+        set_attribute(node, 'pads', new_pads)
+        node.input[0] = pad.input[0]
+        removed.append(pad)
+    graph.remove_nodes(removed)
+
+
+def _get_rank(graph, name, producers):
+    """Return the rank of the value, or ``None`` if it is unknown."""
+    shape = graph.value_shapes.get(name)
+    if shape is not None:
+        return len(shape)
+    param = graph.initializers.get(name)
+    if param is not None:
+        return len(param.shape)
+    node = producers.get(name)
+    if node is not None and node.op_type == 'Transpose':
+        return _get_rank(graph, node.input[0], producers)
+    return None
+
+
+@register_pass(level=FUSION)
+def fuse_matmul_add(graph):
+    """Fuse MatMul of 2D tensors and the following Add of a bias into Gemm.
+
+    The bias must be a floating point constant, or Expand of it, which is
+    broadcastable to the output as C of Gemm. 2D Transposes of the inputs
+    of MatMul used only by it are merged into ``transA`` and ``transB``.
+    """
+    producers = graph.producers()
+    consumers = graph.consumers()
+    output_names = graph.output_names
+    removed = []
+    for index, add in enumerate(graph.nodes):
+        if add.op_type != 'Add' or get_attribute(add, 'broadcast'):
+            continue
+        y_shape = graph.value_shapes.get(add.output[0])
+        if y_shape is None or len(y_shape) != 2:
+            continue
+        for i, name in enumerate(add.input):
+            matmul = producers.get(name)
+            if matmul is not None and matmul.op_type == 'MatMul' and\
+                    name not in output_names and\
+                    len(consumers.get(name, ())) == 1:
+                c_name = add.input[1 - i]
+                break
+        else:
+            continue
+        if any(_get_rank(graph, n, producers) != 2 for n in matmul.input):
+            continue
+
+        c = graph.get_constant(c_name, producers)
+        c_node = producers.get(c_name)
+        if c is None and c_node is not None and\
+                c_node.op_type == 'Expand':
+            # Broadcasting is done by Gemm
+            c_name = c_node.input[0]
+            c = graph.get_constant(c_name, producers)
+        if c is None or c.dtype.kind != 'f' or c.ndim > 2:
+            continue
+        # C must be unidirectional broadcastable to the output
+        if c.ndim >= 1 and c.shape[-1] not in (1, y_shape[-1]):
+            continue
+        if c.ndim == 2 and c.shape[0] != 1 and (
+                not graph.static_shapes or c.shape[0] != y_shape[0]):
+            continue
+        if c.ndim == 0:
+            c_name = graph.add_initializer(c_name + '_reshaped', c.reshape(1))
+
+        inputs = list(matmul.input)
+        trans = [0, 0]
+        for j, name in enumerate(inputs):
+            t = producers.get(name)
+            if t is not None and t.op_type == 'Transpose' and\
+                    get_attribute(t, 'perm', [1, 0]) == [1, 0] and\
+                    name not in output_names and\
+                    len(consumers.get(name, ())) == 1:
+                inputs[j] = t.input[0]
+                trans[j] = 1
+                removed.append(t)
+        # Gemm replaces Add, C may be computed after MatMul
+        gemm = helper.make_node(
+            'Gemm', inputs + [c_name], [add.output[0]], name=matmul.name,
+            alpha=1.0, beta=1.0, transA=trans[0], transB=trans[1])
+        graph.nodes[index] = gemm
+        producers[add.output[0]] = gemm
+        removed.append(matmul)
+    graph.remove_nodes(removed)
@@ -0,0 +1,194 @@
+from collections import OrderedDict
+
+import chainer
+from onnx import helper
+from onnx.mapping import NP_TYPE_TO_TENSOR_TYPE
+from onnx import numpy_helper
+
+
+# Operators whose outputs are not determined by inputs
+NONDETERMINISTIC_OPS = {
+    'RandomNormal', 'RandomNormalLike', 'RandomUniform', 'RandomUniformLike',
+    'Multinomial',
+}
+
+
+def get_attribute(node, name, default=None):
+    for attr in node.attribute:
+        if attr.name == name:
+            return helper.get_attribute_value(attr)
+    return default
+
+
+def set_attribute(node, name, value):
+    for i, attr in enumerate(node.attribute):
+        if attr.name == name:
+            del node.attribute[i]
+            break
+    node.attribute.extend([helper.make_attribute(name, value)])
+
+
+def get_nbytes(param):
+    """Return the size of a parameter or an array in bytes."""
+    if isinstance(param, chainer.Variable):
+        param = param.array
+    return param.nbytes
+
+
+class OptimizationGraph(object):
+    """ONNX nodes and initializers under optimization.
+
+    Passes rewrite ``nodes`` in place and add or remove initializers through
+    this class, then the exporter makes the ONNX graph from them. Values of
+    initializers are kept as given by the exporter, like
+    :class:`~chainer.Parameter`, until a pass reads them.
+
+    Args:
+        nodes (list): ONNX nodes sorted topologically.
+        named_parameters (list): Pairs of the initializer name and the
+            parameter, which is :class:`~chainer.Variable` or an array.
+        inputs (list): Value infos of the graph inputs, including
+            initializers.
+        outputs (list): Value infos of the graph outputs.
+        opset_version (int): The target opset version.
+        constant_values (dict): Values computed by Chainer on tracing keyed
+            by names, for values which depend only on parameters and
+            constants.
+        value_shapes (dict): Shapes traced by Chainer keyed by names.
+        static_shapes (bool): If ``True``, ``value_shapes`` are fixed on
+            runtime, otherwise only ranks of them are.
+
+    Attributes:
+        initializers (~collections.OrderedDict): Parameters keyed by the
+            initializer name.
+        added_initializers (set): Names of initializers added by passes, they
+            are computed from values on export.
+    """
+
+    def __init__(self, nodes, named_parameters, inputs, outputs,
+                 opset_version, constant_values=None, value_shapes=None,
+                 static_shapes=True):
+        self.nodes = nodes
+        self.initializers = OrderedDict(named_parameters)
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.opset_version = opset_version
+        self.constant_values = constant_values or {}
+        self.value_shapes = value_shapes or {}
+        self.static_shapes = static_shapes
+        self.added_initializers = set()
+        self._names = None
+
+    @property
+    def output_names(self):
+        return {o.name for o in self.outputs}
+
+    @property
+    def input_names(self):
+        """Names of graph inputs which are not initializers."""
+        return {i.name for i in self.inputs
+                if i.name not in self.initializers}
+
+    @property
+    def initializers_nbytes(self):
+        """Total size of initializers in bytes."""
+        return sum(get_nbytes(param) for param in self.initializers.values())
+
+    def named_parameters(self):
+        return list(self.initializers.items())
+
+    def producers(self):
+        """Return a dict of nodes keyed by their output names."""
+        producers = {}
+        for node in self.nodes:
+            for name in node.output:
+                producers[name] = node
+        return producers
+
+    def consumers(self):
+        """Return a dict of lists of nodes keyed by their input names."""
+        consumers = {}
+        for node in self.nodes:
+            for name in node.input:
+                consumers.setdefault(name, []).append(node)
+        return consumers
+
+    def get_initializer(self, name):
+        """Return the value of the initializer as NumPy array.
+
+        Returns:
+            numpy.ndarray: The value, or ``None`` when ``name`` is not an
+            initializer.
+        """
+        param = self.initializers.get(name)
+        if param is None:
+            return None
+        if isinstance(param, chainer.Variable):
+            param = param.array
+        return chainer.cuda.to_cpu(param)
+
+    def get_constant(self, name, producers=None):
+        """Return the value of an initializer or an output of Constant node.
+
+        Returns:
+            numpy.ndarray: The value, or ``None`` when ``name`` is not a
+            constant.
+        """
+        array = self.get_initializer(name)
+        if array is not None:
+            return array
+        if producers is None:
+            producers = self.producers()
+        node = producers.get(name)
+        if node is None or node.op_type != 'Constant':
+            return None
+        for attr in node.attribute:
+            if attr.name == 'value':
+                return numpy_helper.to_array(attr.t)
+        return None
+
+    def unique_name(self, base):
+        """Return a name which is not used in the graph yet."""
+        if self._names is None:
+            self._names = set(self.initializers.keys())
+            self._names.update(i.name for i in self.inputs)
+            for node in self.nodes:
+                self._names.update(node.input)
+                self._names.update(node.output)
+        name = base
+        i = 0
+        while name in self._names:
+            i += 1
+            name = '{}_{}'.format(base, i)
+        self._names.add(name)
+        return name
+
+    def add_initializer(self, name, array):
+        """Add an initializer with a new name based on ``name``.
+
+        Returns:
+            str: The registered name.
+        """
+        name = self.unique_name(name)
+        self.initializers[name] = array
+        self.inputs.append(helper.make_tensor_value_info(
+            name, NP_TYPE_TO_TENSOR_TYPE[array.dtype], array.shape))
+        self.added_initializers.add(name)
+        return name
+
+    def remove_initializer(self, name):
+        del self.initializers[name]
+        self.inputs = [i for i in self.inputs if i.name != name]
+        self.added_initializers.discard(name)
+
+    def remove_nodes(self, nodes):
+        removed = {id(node) for node in nodes}
+        self.nodes[:] = [n for n in self.nodes if id(n) not in removed]
+
+    def replace_input(self, old_name, new_name):
+        """Replace inputs of all nodes named ``old_name`` with ``new_name``.
+        """
+        for node in self.nodes:
+            for i, name in enumerate(node.input):
+                if name == old_name:
+                    node.input[i] = new_name
@@ -0,0 +1,176 @@
+import numpy as np
+from onnx import helper
+
+
+# Operators whose inputs are quantized, keyed by op type. Values are indices
+# of inputs which are activations or weights, and ones which must be weights
+QUANTIZED_OPS = {
+    'Conv': ((0,), (1,)),
+    'Gemm': ((0,), (1,)),
+    'MatMul': ((0, 1), ()),
+}
+
+# Operators which do not change the range of the first input
+_range_preserving_ops = {
+    'Flatten', 'Identity', 'Reshape', 'Squeeze', 'Transpose', 'Unsqueeze',
+}
+
+
+def get_activation_params(value_range):
+    """Return the scale and the zero point of an uint8 activation."""
+    low = min(value_range[0], 0.0)
+    high = max(value_range[1], 0.0)
+    scale = (high - low) / 255.0
+    if scale == 0:
+        scale = 1.0
+    zero_point = int(np.clip(np.round(-low / scale), 0, 255))
+    return (np.array(scale, dtype=np.float32),
+            np.array(zero_point, dtype=np.uint8))
+
+
+def quantize_weight(array):
+    """Quantize a float array to int8 symmetrically by a scale.
+
+    Returns:
+        tuple: The int8 array and the scale.
+    """
+    scale = float(np.abs(array).max()) / 127.0 if array.size else 0.0
+    if scale == 0:
+        scale = 1.0
+    scale = np.array(scale, dtype=np.float32)
+    quantized = np.clip(np.round(array / scale), -127, 127).astype(np.int8)
+    return quantized, scale
+
+
+class _Quantizer(object):
+
+    def __init__(self, graph, value_ranges):
+        self.graph = graph
+        self.value_ranges = value_ranges
+        self.producers = graph.producers()
+        # Dequantized names keyed by the original names
+        self.dequantized = {}
+        # Scales keyed by dequantized names
+        self.scales = {}
+        self.new_nodes = []
+
+    def find_range(self, name):
+        """Return the range of ``name``, looking through reshapes."""
+        while name not in self.value_ranges:
+            node = self.producers.get(name)
+            if node is None or node.op_type not in _range_preserving_ops:
+                return None
+            name = node.input[0]
+        return self.value_ranges[name]
+
+    def _add_qdq(self, name, quantized_name, scale, zero_point):
+        graph = self.graph
+        scale_name = graph.add_initializer(name + '_scale', scale)
+        zero_point_name = graph.add_initializer(
+            name + '_zero_point', zero_point)
+        dequantized_name = graph.unique_name(name + '_dequantized')
+        self.scales[dequantized_name] = float(scale)
+        self.new_nodes.append(helper.make_node(
+            'DequantizeLinear', [quantized_name, scale_name, zero_point_name],
+            [dequantized_name]))
+        return dequantized_name, scale_name, zero_point_name
+
+    def quantize_activation(self, name):
+        if name not in self.dequantized:
+            scale, zero_point = get_activation_params(self.find_range(name))
+            quantized_name = self.graph.unique_name(name + '_quantized')
+            dequantized_name, scale_name, zero_point_name = self._add_qdq(
+                name, quantized_name, scale, zero_point)
+            self.new_nodes.insert(-1, helper.make_node(
+                'QuantizeLinear', [name, scale_name, zero_point_name],
+                [quantized_name]))
+            self.dequantized[name] = dequantized_name
+        return self.dequantized[name]
+
+    def quantize_weight(self, name):
+        if name not in self.dequantized:
+            graph = self.graph
+            quantized, scale = quantize_weight(graph.get_initializer(name))
+            quantized_name = graph.add_initializer(
+                name + '_quantized', quantized)
+            self.dequantized[name] = self._add_qdq(
+                name, quantized_name, scale,
+                np.array(0, dtype=np.int8))[0]
+        return self.dequantized[name]
+
+    def quantize_bias(self, name, scale):
+        """Quantize a bias to int32 by the product of scales of inputs."""
+        key = name, scale
+        if key not in self.dequantized:
+            graph = self.graph
+            array = graph.get_initializer(name)
+            quantized = np.round(array / np.float32(scale)).astype(np.int32)
+            quantized_name = graph.add_initializer(
+                name + '_quantized', quantized)
+            self.dequantized[key] = self._add_qdq(
+                name, quantized_name, np.array(scale, dtype=np.float32),
+                np.array(0, dtype=np.int32))[0]
+        return self.dequantized[key]
+
+    def can_quantize(self, node):
+        if node.op_type not in QUANTIZED_OPS or node.domain:
+            return False
+        activations, weights = QUANTIZED_OPS[node.op_type]
+        for i in activations + weights:
+            array = self.graph.get_initializer(node.input[i])
+            if array is None:
+                if i in weights or self.find_range(node.input[i]) is None:
+                    return False
+            elif array.dtype != np.float32:
+                return False
+        return True
+
+    def run(self):
+        for node in self.graph.nodes:
+            if self.can_quantize(node):
+                activations, weights = QUANTIZED_OPS[node.op_type]
+                for i in activations + weights:
+                    name = node.input[i]
+                    if name in self.graph.initializers:
+                        node.input[i] = self.quantize_weight(name)
+                    else:
+                        node.input[i] = self.quantize_activation(name)
+                if node.op_type != 'MatMul' and len(node.input) > 2:
+                    # Runtimes expect int32 biases of fused operators
+                    bias = self.graph.get_initializer(node.input[2])
+                    if bias is not None and bias.dtype == np.float32:
+                        scale = self.scales[node.input[0]] *\
+                            self.scales[node.input[1]]
+                        node.input[2] = self.quantize_bias(
+                            node.input[2], scale)
+            self.new_nodes.append(node)
+        self.graph.nodes[:] = self.new_nodes
+
+        # Float weights are removed unless others use them
+        used_names = set(self.graph.output_names)
+        for node in self.graph.nodes:
+            used_names.update(node.input)
+        for key in self.dequantized:
+            name = key[0] if isinstance(key, tuple) else key
+            if name in self.graph.initializers and name not in used_names:
+                self.graph.remove_initializer(name)
+
+
+def quantize_to_int8(graph, value_ranges):
+    """Insert QuantizeLinear and DequantizeLinear around Conv, Gemm and MatMul.
+
+    Float32 weights of the operators are stored in int8 with a scale, and
+    dequantized by DequantizeLinear. Activation inputs are quantized to
+    uint8 by QuantizeLinear with the scale and the zero point given by their
+    ranges, and dequantized right after it, so runtimes can fuse them into
+    quantized operators. Float32 biases of Conv and Gemm are stored in int32
+    by the product of scales of the other inputs. Operators whose inputs
+    have no range are not quantized. Scales and zero points are per tensor
+    as QuantizeLinear and DequantizeLinear of opset 10 require.
+
+    Args:
+        graph (~onnx_chainer.optimizer.OptimizationGraph): The graph
+            converted in place.
+        value_ranges (dict): Pairs of min and max keyed by value names.
+    """
+    _Quantizer(graph, value_ranges).run()
@@ -0,0 +1,162 @@
+import sys
+import time
+
+from onnx_chainer.profiler import Profiler
+
+
+# Optimization levels
+NONE = 0
+CLEANUP = 1  # Safe cleanups which keep computation as is
+FUSION = 2  # Fusions of nodes and parameters, results can differ slightly
+
+_passes = []
+
+
+def register_pass(name=None, level=CLEANUP):
+    """Decorator to register a pass run by :class:`PassManager`.
+
+    Passes are functions which take
+    :class:`~onnx_chainer.optimizer.OptimizationGraph` and rewrite it in
+    place. They are run in registered order.
+
+    >>> @register_pass(level=2)
+    >>> def fuse_something(graph):
+    >>>     ...
+
+    Args:
+        name (str): Name of the pass, the function name is used by default.
+        level (int): Minimum optimization level to run the pass.
+    """
+    def decorator(func):
+        _passes.append((name or func.__name__, level, func))
+        return func
+    return decorator
+
+
+def get_passes(level):
+    """Return registered passes run on the optimization level.
+
+    Returns:
+        list: Pairs of the name and the function of passes.
+    """
+    return [(name, func) for name, pass_level, func in _passes
+            if pass_level <= level]
+
+
+class PassManager(object):
+    """Runs optimization passes and records statistics of them.
+
+    Args:
+        level (int): Optimization level, ``0`` runs nothing, ``1`` runs
+            safe cleanups, ``2`` runs fusions too.
+        passes (list): Passes to run instead of registered ones, names of
+            registered passes, functions or pairs of the name and the
+            function.
+
+    Attributes:
+        stats (list): Statistics of the last run, dicts of ``name``,
+            ``elapsed_time``, ``nodes_before``, ``nodes_after``,
+            ``initializers_before``, ``initializers_after``, ``bytes_before``
+            and ``bytes_after``. Bytes are the total size of initializers.
+    """
+
+    def __init__(self, level=CLEANUP, passes=None):
+        self.level = level
+        if passes is None:
+            self.passes = get_passes(level)
+        else:
+            registered = {name: func for name, _, func in _passes}
+            self.passes = []
+            for p in passes:
+                if isinstance(p, str):
+                    if p not in registered:
+                        raise ValueError('Unknown pass: {}'.format(p))
+                    p = (p, registered[p])
+                elif callable(p):
+                    p = (p.__name__, p)
+                self.passes.append(p)
+        self.stats = []
+
+    def run(self, graph, profiler=None):
+        """Run passes on the graph in place.
+
+        Args:
+            graph (~onnx_chainer.optimizer.OptimizationGraph): The graph.
+            profiler (~onnx_chainer.Profiler): If given, each pass is
+                recorded as an event of ``'pass'`` category.
+
+        Returns:
+            ~onnx_chainer.optimizer.OptimizationGraph: The graph.
+        """
+        if profiler is None:
+            profiler = Profiler(enabled=False)
+        self.stats = []
+        for name, func in self.passes:
+            nodes_before = len(graph.nodes)
+            initializers_before = len(graph.initializers)
+            bytes_before = graph.initializers_nbytes
+            start = time.perf_counter()
+            with profiler.record(name, category='pass'):
+                func(graph)
+            self.stats.append({
+                'name': name,
+                'elapsed_time': time.perf_counter() - start,
+                'nodes_before': nodes_before,
+                'nodes_after': len(graph.nodes),
+                'initializers_before': initializers_before,
+                'initializers_after': len(graph.initializers),
+                'bytes_before': bytes_before,
+                'bytes_after': graph.initializers_nbytes})
+        return graph
+
+    def print_report(self, file=None):
+        """Prints statistics of the last run as a table.
+
+        Args:
+            file (file-like object): Output, ``sys.stdout`` by default.
+        """
+        if file is None:
+            file = sys.stdout
+        entries = [('Pass', 'ElapsedTime', 'Nodes', 'Initializers', 'Bytes')]
+        for s in self.stats:
+            entries.append((
+                s['name'], '%.2fms' % (s['elapsed_time'] * 1e3),
+                '{} -> {}'.format(s['nodes_before'], s['nodes_after']),
+                '{} -> {}'.format(
+                    s['initializers_before'], s['initializers_after']),
+                '{} -> {}'.format(s['bytes_before'], s['bytes_after'])))
+        total_nodes = sum(s['nodes_before'] - s['nodes_after']
+                          for s in self.stats)
+        total_bytes = sum(s['bytes_before'] - s['bytes_after']
+                          for s in self.stats)
+        widths = [max(len(e[i]) for e in entries) for i in range(5)]
+        template = '{:<%d}  {:>%d}  {:>%d}  {:>%d}  {:>%d}' % tuple(widths)
+        for entry in entries:
+            file.write(template.format(*entry))
+            file.write('\n')
+        file.write('Removed {} nodes and {} bytes of initializers\n'.format(
+            total_nodes, total_bytes))
+        if hasattr(file, 'flush'):
+            file.flush()
+
+
+def get_pass_manager(optimize):
+    """Return the pass manager for ``optimize`` option of export.
+
+    Args:
+        optimize (int or PassManager): The option value.
+
+    Returns:
+        PassManager: ``optimize`` itself when it is a pass manager, a new
+        pass manager of the level when it is a positive integer, otherwise
+        ``None``.
+    """
+    if isinstance(optimize, PassManager):
+        return optimize
+    if not optimize:
+        return None
+    if optimize not in (CLEANUP, FUSION):
+        raise ValueError(
+            'Optimization level must be 0, 1 or 2, but {} is given'.format(
+                optimize))
+    return PassManager(level=optimize)
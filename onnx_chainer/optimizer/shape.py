@@ -0,0 +1,307 @@
+import numpy as np
+from onnx import helper
+
+from onnx_chainer.optimizer.graph import get_attribute
+from onnx_chainer.optimizer.pass_manager import CLEANUP
+from onnx_chainer.optimizer.pass_manager import register_pass
+
+
+# Operators which change only the shape of the first input
+_reshape_ops = {'Flatten', 'Reshape', 'Squeeze', 'Unsqueeze'}
+
+
+def _normalize_axes(axes, ndim):
+    return sorted(a + ndim if a < 0 else a for a in axes)
+
+
+class _ShapeSimplifier(object):
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.output_names = graph.output_names
+        self.producers = graph.producers()
+        self.consumers = graph.consumers()
+        self.shapes = {}
+        if graph.static_shapes:
+            self.shapes.update(graph.value_shapes)
+        for name, param in graph.initializers.items():
+            self.shapes[name] = tuple(param.shape)
+        # Removed outputs to the names to use instead
+        self.renames = {}
+        self.removed = set()
+        self.new_nodes = []
+
+    def _get_shape_input(self, node):
+        if len(node.input) < 2:
+            return get_attribute(node, 'shape')
+        shape = self.graph.get_constant(node.input[1], self.producers)
+        return None if shape is None else shape.tolist()
+
+    def infer_shape(self, node):
+        """Record static shapes of outputs of shape manipulations."""
+        if node.op_type not in _reshape_ops and node.op_type != 'Split' or\
+                node.output[0] in self.shapes:
+            return
+        x_shape = self.shapes.get(node.input[0])
+        if x_shape is None:
+            return
+        ndim = len(x_shape)
+        if node.op_type == 'Reshape':
+            shape = self._get_shape_input(node)
+            if shape is None:
+                return
+            shape = [x_shape[i] if d == 0 else d for i, d in enumerate(shape)]
+            if -1 in shape:
+                known = -int(np.prod(shape))
+                shape[shape.index(-1)] = int(np.prod(x_shape)) // known
+            self.shapes[node.output[0]] = tuple(shape)
+        elif node.op_type == 'Squeeze':
+            axes = get_attribute(node, 'axes')
+            if axes is None:
+                axes = [i for i, d in enumerate(x_shape) if d == 1]
+            axes = _normalize_axes(axes, ndim)
+            self.shapes[node.output[0]] = tuple(
+                d for i, d in enumerate(x_shape) if i not in axes)
+        elif node.op_type == 'Unsqueeze':
+            axes = get_attribute(node, 'axes')
+            shape = list(x_shape)
+            for axis in _normalize_axes(axes, ndim + len(axes)):
+                shape.insert(axis, 1)
+            self.shapes[node.output[0]] = tuple(shape)
+        elif node.op_type == 'Flatten':
+            axis = get_attribute(node, 'axis', 1)
+            if axis < 0:
+                axis += ndim
+            self.shapes[node.output[0]] = (
+                int(np.prod(x_shape[:axis])), int(np.prod(x_shape[axis:])))
+        elif node.op_type == 'Split':
+            axis = get_attribute(node, 'axis', 0)
+            if axis < 0:
+                axis += ndim
+            split = get_attribute(node, 'split')
+            if split is None:
+                split = [x_shape[axis] // len(node.output)] * len(node.output)
+            for name, size in zip(node.output, split):
+                shape = list(x_shape)
+                shape[axis] = size
+                self.shapes[name] = tuple(shape)
+
+    def _single_consumer(self, name):
+        consumers = self.consumers.get(name, [])
+        if len(consumers) != 1 or name in self.output_names:
+            return None
+        return consumers[0]
+
+    def _producer_to_merge(self, node, op_types):
+        """Return the producer of the first input used only by ``node``."""
+        parent = self.producers.get(node.input[0])
+        if parent is None or id(parent) in self.removed or\
+                parent.op_type not in op_types or\
+                self._single_consumer(node.input[0]) is not node:
+            return None
+        return parent
+
+    def _rewire(self, node, i, name):
+        """Replace ``i``-th input of ``node`` with ``name``."""
+        old_name = node.input[i]
+        node.input[i] = name
+        self.consumers[old_name] = [
+            n for n in self.consumers.get(old_name, []) if n is not node]
+        self.consumers.setdefault(name, []).append(node)
+
+    def _remove(self, node):
+        self.removed.add(id(node))
+        for name in node.input:
+            self.consumers[name] = [
+                n for n in self.consumers.get(name, []) if n is not node]
+
+    def _bypass(self, node, name):
+        """Remove ``node`` letting its consumers use ``name`` instead."""
+        if node.output[0] in self.output_names:
+            # Graph outputs are kept, Identity is removed by another pass
+            for n in node.input:
+                self.consumers[n] = [
+                    c for c in self.consumers.get(n, []) if c is not node]
+            del node.input[:]
+            del node.attribute[:]
+            node.op_type = 'Identity'
+            node.input.append(name)
+            self.consumers.setdefault(name, []).append(node)
+            return
+        self.renames[node.output[0]] = name
+        users = self.consumers.pop(node.output[0], [])
+        self._remove(node)
+        self.consumers.setdefault(name, []).extend(users)
+
+    def _make_reshape(self, node, x_name, shape):
+        """Rewrite ``node`` to Reshape of ``x_name`` to ``shape``."""
+        shape_name = self.graph.add_initializer(
+            node.output[0] + '_shape', np.array(shape, dtype=np.int64))
+        for name in node.input:
+            self.consumers[name] = [
+                n for n in self.consumers.get(name, []) if n is not node]
+        del node.input[:]
+        del node.attribute[:]
+        node.op_type = 'Reshape'
+        node.input.extend([x_name, shape_name])
+        for name in node.input:
+            self.consumers.setdefault(name, []).append(node)
+
+    def merge_reshapes(self, node):
+        """Merge a chain of shape manipulations into one Reshape."""
+        if node.op_type not in _reshape_ops:
+            return False
+        x_shape = self.shapes.get(node.input[0])
+        y_shape = self.shapes.get(node.output[0])
+        if x_shape is not None and x_shape == y_shape:
+            self._bypass(node, node.input[0])
+            return True
+        parent = self._producer_to_merge(node, _reshape_ops)
+        if parent is None:
+            return False
+        x_name = parent.input[0]
+        if y_shape is not None and y_shape == self.shapes.get(x_name):
+            self._bypass(node, x_name)
+            self._remove(parent)
+            return True
+        if node.op_type == 'Reshape' and self.graph.opset_version >= 5:
+            # Reshape to a fixed shape does not depend on the input shape
+            shape = self._get_shape_input(node)
+            if shape is not None and 0 not in shape:
+                self._rewire(node, 0, x_name)
+                self._remove(parent)
+                return True
+        if {node.op_type, parent.op_type} == {'Squeeze', 'Unsqueeze'}:
+            # Squeeze and Unsqueeze of the same axes cancel each other
+            axes = get_attribute(node, 'axes')
+            parent_axes = get_attribute(parent, 'axes')
+            if axes is not None and parent_axes is not None and\
+                    sorted(axes) == sorted(parent_axes) and\
+                    all(a >= 0 for a in axes):
+                self._bypass(node, x_name)
+                self._remove(parent)
+                return True
+        if y_shape is not None and self.graph.opset_version >= 5:
+            self._make_reshape(node, x_name, y_shape)
+            self._remove(parent)
+            return True
+        return False
+
+    def merge_concats(self, node):
+        """Flatten Concat of Concat and cancel Split followed by Concat."""
+        if node.op_type != 'Concat':
+            return False
+        if len(node.input) == 1:
+            self._bypass(node, node.input[0])
+            return True
+        axis = get_attribute(node, 'axis')
+        split = self.producers.get(node.input[0])
+        if split is not None and split.op_type == 'Split' and\
+                id(split) not in self.removed and\
+                list(node.input) == list(split.output) and\
+                get_attribute(split, 'axis', 0) == axis and\
+                all(self._single_consumer(name) is node
+                    for name in split.output):
+            self._bypass(node, split.input[0])
+            self._remove(split)
+            return True
+
+        changed = False
+        i = 0
+        while i < len(node.input):
+            name = node.input[i]
+            parent = self.producers.get(name)
+            if parent is None or parent.op_type != 'Concat' or\
+                    id(parent) in self.removed or\
+                    get_attribute(parent, 'axis') != axis or\
+                    self._single_consumer(name) is not node:
+                i += 1
+                continue
+            inputs = list(node.input)
+            inputs[i:i + 1] = parent.input
+            del node.input[:]
+            node.input.extend(inputs)
+            self._remove(parent)
+            for n in parent.input:
+                self.consumers.setdefault(n, []).append(node)
+            changed = True
+        return changed
+
+    def merge_stack(self, node):
+        """Rewrite Concat of Unsqueezes to Concat and one Reshape."""
+        if node.op_type != 'Concat' or id(node) in self.removed or\
+                self.graph.opset_version < 5:
+            return False
+        y_shape = self.shapes.get(node.output[0])
+        axis = get_attribute(node, 'axis')
+        if y_shape is None or len(node.input) < 2:
+            return False
+        if axis < 0:
+            axis += len(y_shape)
+        unsqueezes = []
+        for name in node.input:
+            parent = self.producers.get(name)
+            if parent is None or parent.op_type != 'Unsqueeze' or\
+                    id(parent) in self.removed or\
+                    self._single_consumer(name) is not node or\
+                    list(node.input).count(name) != 1:
+                return False
+            x_shape = self.shapes.get(parent.input[0])
+            # Stacking along the last axis is not a Concat of the inputs
+            if x_shape is None or axis >= len(x_shape) or _normalize_axes(
+                    get_attribute(parent, 'axes'), len(x_shape) + 1) !=\
+                    [axis]:
+                return False
+            unsqueezes.append(parent)
+        for i, parent in enumerate(unsqueezes):
+            self._rewire(node, i, parent.input[0])
+            self._remove(parent)
+        output_name = node.output[0]
+        node.output[0] = self.graph.unique_name(output_name + '_concat')
+        self.producers[node.output[0]] = node
+        shape_name = self.graph.add_initializer(
+            output_name + '_shape', np.array(y_shape, dtype=np.int64))
+        reshape = helper.make_node(
+            'Reshape', [node.output[0], shape_name], [output_name],
+            name=self.graph.unique_name(node.name + '_reshape'))
+        self.producers[output_name] = reshape
+        self.consumers[node.output[0]] = [reshape]
+        self.new_nodes.append(reshape)
+        return True
+
+    def run(self):
+        nodes = list(self.graph.nodes)
+        for node in nodes:
+            if id(node) in self.removed:
+                continue
+            # Consumers of renamed names are already moved
+            for i, name in enumerate(node.input):
+                if name in self.renames:
+                    node.input[i] = self.renames[name]
+            self.infer_shape(node)
+            self.new_nodes.append(node)
+            if node.op_type in _reshape_ops:
+                # Merge with producers as long as they can be merged
+                while id(node) not in self.removed and\
+                        self.merge_reshapes(node):
+                    pass
+            else:
+                self.merge_concats(node)
+                self.merge_stack(node)
+        self.graph.nodes[:] = [
+            n for n in self.new_nodes if id(n) not in self.removed]
+
+
+@register_pass(level=CLEANUP)
+def simplify_shape_ops(graph):
+    """Collapse chains of shape manipulations.
+
+    Chains of Reshape, Squeeze, Unsqueeze and Flatten are merged into one
+    Reshape, and removed when the shape is not changed. Concat of Concat
+    along the same axis is flattened, Concat of all outputs of a Split is
+    replaced with the input of the Split, and Concat of Unsqueezes, which
+    stacks tensors, is rewritten to a Concat and a Reshape. Shapes traced by
+    Chainer are used only if they are static, otherwise only the rewrites
+    independent of input shapes are done.
+    """
+    _ShapeSimplifier(graph).run()
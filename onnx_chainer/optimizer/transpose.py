@@ -0,0 +1,211 @@
+from onnx import helper
+
+from onnx_chainer.optimizer.graph import get_attribute
+from onnx_chainer.optimizer.graph import set_attribute
+from onnx_chainer.optimizer.pass_manager import CLEANUP
+from onnx_chainer.optimizer.pass_manager import register_pass
+
+
+# Elementwise operators which Transpose can be moved through, the first input
+# is the tensor and the others must be scalar if any
+_unary_ops = {
+    'Abs', 'Acos', 'Asin', 'Atan', 'Cast', 'Ceil', 'Clip', 'Cos', 'Elu',
+    'Erf', 'Exp', 'Floor', 'HardSigmoid', 'Identity', 'IsNaN', 'LeakyRelu',
+    'Log', 'Neg', 'Not', 'Reciprocal', 'Relu', 'Selu', 'Sigmoid', 'Sign',
+    'Sin', 'Softplus', 'Softsign', 'Sqrt', 'Tan', 'Tanh',
+}
+_binary_ops = {
+    'Add', 'And', 'Div', 'Equal', 'Greater', 'Less', 'Max', 'Min', 'Mul',
+    'Or', 'Pow', 'Sub', 'Xor',
+}
+
+
+def _get_perm(node, ndim=None):
+    perm = get_attribute(node, 'perm')
+    if perm is None:
+        # Reverses the dimensions by default
+        if ndim is None:
+            return None
+        perm = list(reversed(range(ndim)))
+    return list(perm)
+
+
+def _is_identity(perm):
+    return perm is not None and perm == list(range(len(perm)))
+
+
+class _TransposeOptimizer(object):
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.output_names = graph.output_names
+        self.producers = graph.producers()
+        self.consumers = graph.consumers()
+
+    def _is_scalar(self, name, ndim):
+        if not name:
+            return True
+        value = self.graph.get_constant(name, self.producers)
+        return value is not None and value.size == 1 and value.ndim <= ndim
+
+    def _ndim(self, name):
+        """Return the number of dimensions of ``name`` or ``None``."""
+        if name in self.graph.value_shapes:
+            return len(self.graph.value_shapes[name])
+        for value_info in self.graph.inputs:
+            if value_info.name == name and\
+                    value_info.type.tensor_type.HasField('shape'):
+                return len(value_info.type.tensor_type.shape.dim)
+        value = self.graph.get_constant(name, self.producers)
+        return None if value is None else value.ndim
+
+    def _single_consumer(self, name):
+        consumers = self.consumers.get(name, [])
+        if len(consumers) != 1 or name in self.output_names:
+            return None
+        return consumers[0]
+
+    def compose(self, node):
+        """Compose Transpose of Transpose into one."""
+        parent = self.producers.get(node.input[0])
+        if parent is None or parent.op_type != 'Transpose':
+            return False
+        perm1 = _get_perm(parent)
+        perm2 = _get_perm(node, None if perm1 is None else len(perm1))
+        if perm1 is None:
+            if perm2 is None:
+                return False
+            perm1 = list(reversed(range(len(perm2))))
+        node.input[0] = parent.input[0]
+        set_attribute(node, 'perm', [perm1[p] for p in perm2])
+        return True
+
+    def remove_identity(self, node):
+        if not _is_identity(_get_perm(node)) or\
+                node.output[0] in self.output_names:
+            return False
+        self.graph.replace_input(node.output[0], node.input[0])
+        self.graph.remove_nodes([node])
+        return True
+
+    def sink(self, node):
+        """Move Transpose after the following elementwise operator."""
+        perm = _get_perm(node)
+        op = self._single_consumer(node.output[0])
+        if perm is None or op is None or len(op.output) != 1:
+            return False
+        if op.op_type in _unary_ops:
+            if op.input[0] != node.output[0] or\
+                    not all(self._is_scalar(name, len(perm))
+                            for name in op.input[1:]):
+                return False
+            transposes = [node]
+        elif op.op_type in _binary_ops:
+            transposes = []
+            for name in op.input:
+                parent = self.producers.get(name)
+                if parent is not None and parent.op_type == 'Transpose' and\
+                        _get_perm(parent) == perm and\
+                        self._single_consumer(name) is op:
+                    transposes.append(parent)
+                elif not self._is_scalar(name, len(perm)):
+                    return False
+        else:
+            return False
+
+        for t in transposes:
+            for i, name in enumerate(op.input):
+                if name == t.output[0]:
+                    op.input[i] = t.input[0]
+        output_name = op.output[0]
+        op.output[0] = self.graph.unique_name(output_name + '_transposed')
+        self.graph.remove_nodes(transposes)
+        new_node = helper.make_node(
+            'Transpose', [op.output[0]], [output_name], name=node.name,
+            perm=perm)
+        self.graph.nodes.insert(self.graph.nodes.index(op) + 1, new_node)
+        return True
+
+    def absorb(self, node):
+        """Absorb 2D Transpose into flags of the following Gemm or MatMul."""
+        perm = _get_perm(node)
+        if perm is None:
+            # Transpose without perm is 2D only if its input is
+            if self._ndim(node.input[0]) != 2:
+                return False
+        elif perm != [1, 0]:
+            return False
+        changed = False
+        for op in list(self.consumers.get(node.output[0], [])):
+            if op.op_type == 'MatMul' and self.graph.opset_version >= 11:
+                # MatMul of 2D tensors is Gemm without C
+                others = [name for name in op.input if name != node.output[0]]
+                if any(len(self.graph.value_shapes.get(name, ())) != 2
+                       for name in others):
+                    continue
+                op.op_type = 'Gemm'
+            elif op.op_type != 'Gemm':
+                continue
+            for i, flag in enumerate(('transA', 'transB')):
+                if op.input[i] == node.output[0]:
+                    op.input[i] = node.input[0]
+                    set_attribute(
+                        op, flag, 1 - get_attribute(op, flag, 0))
+                    changed = True
+        return changed
+
+    def remove_unused(self):
+        removed = [node for node in self.graph.nodes
+                   if node.op_type == 'Transpose' and
+                   node.output[0] not in self.consumers and
+                   node.output[0] not in self.output_names]
+        self.graph.remove_nodes(removed)
+        return bool(removed)
+
+    def _neighbor_names(self, node):
+        names = set(node.input) | set(node.output)
+        for name in node.input:
+            parent = self.producers.get(name)
+            if parent is not None:
+                names.update(parent.input)
+        for name in node.output:
+            for op in self.consumers.get(name, []):
+                names.update(op.input)
+                names.update(op.output)
+        return names
+
+    def run_once(self):
+        """Rewrite Transposes not overlapping with each other.
+
+        Returns:
+            bool: ``True`` if the graph is changed.
+        """
+        touched = set()
+        for node in list(self.graph.nodes):
+            if node.op_type != 'Transpose':
+                continue
+            names = self._neighbor_names(node)
+            if names & touched:
+                continue
+            if self.compose(node) or self.remove_identity(node) or\
+                    self.sink(node) or self.absorb(node):
+                touched |= names
+        if touched:
+            return True
+        return self.remove_unused()
+
+
+@register_pass(level=CLEANUP)
+def optimize_transposes(graph):
+    """Cancel, merge and sink Transpose nodes.
+
+    Adjacent Transposes are composed into one permutation, identity ones are
+    removed, and Transposes are moved after elementwise operators so that
+    they meet and cancel the following Transposes. Binary operators whose
+    inputs are transposed in the same way are computed before one
+    Transpose. 2D Transposes are absorbed into ``transA``/``transB`` of Gemm,
+    and of MatMul of 2D tensors converted to Gemm on opset 11 or later.
+    """
+    while True:
+        if not _TransposeOptimizer(graph).run_once():
+            break
@@ -0,0 +1,225 @@
+import sys
+
+import chainer
+import numpy as np
+from onnx import helper
+from onnx import TensorProto
+
+
+# Initializers smaller than this number of bytes are not quantized
+WEIGHT_QUANTIZATION_THRESHOLD = 1024
+
+# Bytes of float weights quantized at once, to bound temporary memory for
+# large weights
+QUANTIZATION_CHUNK_SIZE = 64 * 1024 * 1024
+
+_dtypes = {'int8': np.int8, 'uint8': np.uint8}
+
+
+def _get_array(param):
+    if isinstance(param, chainer.Variable):
+        param = param.array
+    return param
+
+
+def quantize_per_channel(array, dtype=np.int8):
+    """Quantize a float array per channel along the first axis.
+
+    Int8 is quantized symmetrically and zero points are zero, uint8 is
+    quantized by min and max of each channel. The array is read in chunks of
+    :data:`QUANTIZATION_CHUNK_SIZE` bytes, each of which is quantized by
+    vectorized NumPy operations, so temporary memory does not depend on the
+    size of the array.
+
+    Args:
+        array (numpy.ndarray or cupy.ndarray): The float array whose number
+            of dimensions is at least one.
+        dtype (numpy.dtype): ``numpy.int8`` or ``numpy.uint8``.
+
+    Returns:
+        tuple: The quantized array, scales and zero points of channels, and
+        the max absolute error of the dequantized array.
+    """
+    dtype = np.dtype(dtype)
+    n_channels = array.shape[0]
+    quantized = np.empty(array.shape, dtype=dtype)
+    scale = np.empty(n_channels, dtype=np.float32)
+    zero_point = np.zeros(n_channels, dtype=dtype)
+    max_error = 0.0
+    channel_bytes = max(1, array.nbytes // max(1, n_channels))
+    step = max(1, QUANTIZATION_CHUNK_SIZE // channel_bytes)
+    flat_quantized = quantized.reshape(n_channels, -1)
+    for i in range(0, n_channels, step):
+        chunk = chainer.cuda.to_cpu(array[i:i + step]).reshape(
+            min(step, n_channels - i), -1)
+        if dtype == np.int8:
+            s = np.abs(chunk).max(axis=1) / 127.0
+            s[s == 0] = 1
+            z = np.zeros_like(s)
+            low, high = -127, 127
+        else:
+            low_value = np.minimum(chunk.min(axis=1), 0)
+            s = (np.maximum(chunk.max(axis=1), 0) - low_value) / 255.0
+            s[s == 0] = 1
+            z = np.clip(np.round(-low_value / s), 0, 255)
+            low, high = 0, 255
+        s = s.astype(np.float32)[:, None]
+        z = z[:, None]
+        q = np.clip(np.round(chunk / s) + z, low, high)
+        if chunk.size:
+            max_error = max(max_error, float(
+                np.abs((q - z) * s - chunk).max()))
+        flat_quantized[i:i + step] = q
+        scale[i:i + step] = s[:, 0]
+        zero_point[i:i + step] = z[:, 0]
+    return quantized, scale, zero_point, max_error
+
+
+class WeightQuantizer(object):
+    """Stores large weights in int8 or uint8 and records statistics of them.
+
+    Float32 initializers of at least two dimensions and ``threshold`` bytes
+    are quantized per channel along the first axis by
+    :func:`quantize_per_channel`, and dequantized in the graph, while
+    activations stay float. DequantizeLinear of opset version 13 or later
+    dequantizes per channel by itself. On earlier versions, which do not
+    have DequantizeLinear or dequantize only per tensor, quantized weights
+    are cast to float and followed by Sub of zero points for uint8 and Mul
+    of scales.
+
+    Args:
+        dtype (str): ``'int8'`` or ``'uint8'``.
+        threshold (int): Initializers smaller than this number of bytes are
+            not quantized.
+
+    Attributes:
+        stats (list): Statistics of the last run, dicts of ``name``,
+            ``shape``, ``bytes_before``, ``bytes_after`` and ``max_error``.
+            Bytes after the quantization include scales and zero points.
+    """
+
+    def __init__(self, dtype='int8', threshold=WEIGHT_QUANTIZATION_THRESHOLD):
+        if dtype not in _dtypes:
+            raise ValueError(
+                'dtype must be \'int8\' or \'uint8\', but {} is given'.format(
+                    dtype))
+        self.dtype = np.dtype(_dtypes[dtype])
+        self.threshold = threshold
+        self.stats = []
+
+    def _dequantize(self, graph, name, quantized, scale, zero_point):
+        """Return nodes dequantizing the array and the output name."""
+        shape = (-1,) + (1,) * (quantized.ndim - 1)
+        quantized_name = graph.add_initializer(
+            name + '_quantized', quantized)
+        dequantized_name = graph.unique_name(name + '_dequantized')
+        if graph.opset_version >= 13:
+            scale_name = graph.add_initializer(name + '_scale', scale)
+            zero_point_name = graph.add_initializer(
+                name + '_zero_point', zero_point)
+            return [helper.make_node(
+                'DequantizeLinear',
+                [quantized_name, scale_name, zero_point_name],
+                [dequantized_name], axis=0)], dequantized_name
+
+        scale_name = graph.add_initializer(
+            name + '_scale', scale.reshape(shape))
+        casted_name = graph.unique_name(name + '_casted')
+        nodes = [helper.make_node(
+            'Cast', [quantized_name], [casted_name],
+            to=TensorProto.FLOAT)]
+        if self.dtype == np.uint8:
+            zero_point_name = graph.add_initializer(
+                name + '_zero_point',
+                zero_point.astype(np.float32).reshape(shape))
+            shifted_name = graph.unique_name(name + '_shifted')
+            nodes.append(helper.make_node(
+                'Sub', [casted_name, zero_point_name], [shifted_name]))
+            casted_name = shifted_name
+        nodes.append(helper.make_node(
+            'Mul', [casted_name, scale_name], [dequantized_name]))
+        return nodes, dequantized_name
+
+    def run(self, graph):
+        """Quantize initializers of the graph in place.
+
+        Args:
+            graph (~onnx_chainer.optimizer.OptimizationGraph): The graph.
+
+        Returns:
+            ~onnx_chainer.optimizer.OptimizationGraph: The graph.
+        """
+        self.stats = []
+        output_names = graph.output_names
+        renames = {}
+        new_nodes = []
+        for name, param in list(graph.initializers.items()):
+            array = _get_array(param)
+            if array.dtype != np.float32 or array.ndim < 2 or\
+                    array.nbytes < self.threshold or name in output_names:
+                continue
+            quantized, scale, zero_point, max_error = quantize_per_channel(
+                array, self.dtype)
+            graph.remove_initializer(name)
+            n_initializers = len(graph.initializers)
+            nodes, renames[name] = self._dequantize(
+                graph, name, quantized, scale, zero_point)
+            new_nodes.extend(nodes)
+            # Initializers are added at the end
+            added = list(graph.initializers.values())[n_initializers:]
+            self.stats.append({
+                'name': name,
+                'shape': array.shape,
+                'bytes_before': array.nbytes,
+                'bytes_after': sum(a.nbytes for a in added),
+                'max_error': max_error})
+        for node in graph.nodes:
+            for i, name in enumerate(node.input):
+                if name in renames:
+                    node.input[i] = renames[name]
+        graph.nodes[:0] = new_nodes
+        return graph
+
+    def print_report(self, file=None):
+        """Prints statistics of the last run as a table.
+
+        Args:
+            file (file-like object): Output, ``sys.stdout`` by default.
+        """
+        if file is None:
+            file = sys.stdout
+        entries = [('Parameter', 'Shape', 'Bytes', 'MaxError')]
+        for s in self.stats:
+            entries.append((
+                s['name'], 'x'.join(str(d) for d in s['shape']),
+                '{} -> {}'.format(s['bytes_before'], s['bytes_after']),
+                '%.3g' % s['max_error']))
+        total_before = sum(s['bytes_before'] for s in self.stats)
+        total_after = sum(s['bytes_after'] for s in self.stats)
+        widths = [max(len(e[i]) for e in entries) for i in range(4)]
+        template = '{:<%d}  {:>%d}  {:>%d}  {:>%d}' % tuple(widths)
+        for entry in entries:
+            file.write(template.format(*entry))
+            file.write('\n')
+        file.write('Quantized {} bytes of initializers to {} bytes\n'.format(
+            total_before, total_after))
+        if hasattr(file, 'flush'):
+            file.flush()
+
+
+def get_weight_quantizer(quantize_weights):
+    """Return the weight quantizer for ``quantize_weights`` option of export.
+
+    Args:
+        quantize_weights (str or WeightQuantizer): The option value.
+
+    Returns:
+        WeightQuantizer: ``quantize_weights`` itself when it is a weight
+        quantizer, a new weight quantizer of the dtype when it is a string,
+        otherwise ``None``.
+    """
+    if isinstance(quantize_weights, WeightQuantizer):
+        return quantize_weights
+    if not quantize_weights:
+        return None
+    return WeightQuantizer(quantize_weights)
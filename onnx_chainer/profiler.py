@@ -0,0 +1,170 @@
+from collections import OrderedDict
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+
+class Profiler(object):
+    """Profiler of export.
+
+    Records wall time and allocated bytes of each phase of export, like the
+    forward computation, building the computational graph, conversion,
+    checking and serialization, and of each converter keyed by the function
+    name. Allocated bytes are the growth of memory traced by
+    :mod:`tracemalloc` during the event, which includes buffers of NumPy
+    arrays but not memory allocated inside the C++ implementation of
+    protobuf.
+
+    >>> profiler = onnx_chainer.Profiler()
+    >>> onnx_chainer.export(model, x, profile=profiler)
+    >>> profiler.print_report()
+    >>> profiler.dump_chrome_trace('export_trace.json')
+
+    Args:
+        enabled (bool): If ``False``, nothing is recorded.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.events = []
+        self._origin = time.perf_counter()
+
+    @contextlib.contextmanager
+    def record(self, name, category='phase'):
+        """Record an event while the context.
+
+        Args:
+            name (str): Name of the event.
+            category (str): Category of the event, ``'phase'`` or
+                ``'converter'`` is used by ONNX-Chainer.
+        """
+        if not self.enabled:
+            yield
+            return
+
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        start_memory = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            alloc_bytes = tracemalloc.get_traced_memory()[0] - start_memory
+            if started_tracing:
+                tracemalloc.stop()
+            self.events.append({
+                'name': name, 'category': category,
+                'start': start - self._origin, 'elapsed_time': end - start,
+                'alloc_bytes': alloc_bytes, 'tid': threading.get_ident()})
+
+    def wrap_converters(self, converters):
+        """Return converters which record events on each call."""
+        if not self.enabled:
+            return converters
+
+        def wrap(name, converter):
+            def profiled_converter(params):
+                with self.record(name, category='converter'):
+                    return converter(params)
+            return profiled_converter
+        return {name: wrap(name, converter)
+                for name, converter in converters.items()}
+
+    def summary(self):
+        """Returns a summary of events.
+
+        Returns:
+            A summarized dictionary keyed by a tuple of category and name of
+            events, values are dictionaries of ``elapsed_time``,
+            ``alloc_bytes`` and ``occurrence``.
+        """
+        summary = OrderedDict()
+        for event in self.events:
+            key = event['category'], event['name']
+            if key not in summary:
+                summary[key] = {
+                    'elapsed_time': 0, 'alloc_bytes': 0, 'occurrence': 0}
+            record = summary[key]
+            record['elapsed_time'] += event['elapsed_time']
+            record['alloc_bytes'] += event['alloc_bytes']
+            record['occurrence'] += 1
+        return summary
+
+    def print_report(self, file=None):
+        """Prints a summary report of events as a table.
+
+        Phases are listed in recorded order followed by converters sorted by
+        elapsed time.
+
+        Args:
+            file (file-like object): Output, ``sys.stdout`` by default.
+        """
+        if file is None:
+            file = sys.stdout
+        summary = self.summary()
+        phases = [(k, v) for k, v in summary.items() if k[0] != 'converter']
+        converters = sorted(
+            [(k, v) for k, v in summary.items() if k[0] == 'converter'],
+            key=lambda kv: -kv[1]['elapsed_time'])
+        entries = [('Category', 'Name', 'ElapsedTime', 'AllocBytes',
+                    'Occurrence')]
+        for (category, name), record in phases + converters:
+            entries.append((
+                category, name, '%.2fms' % (record['elapsed_time'] * 1e3),
+                str(record['alloc_bytes']), str(record['occurrence'])))
+        widths = [max(len(e[i]) for e in entries) for i in range(5)]
+        template = '{:<%d}  {:<%d}  {:>%d}  {:>%d}  {:>%d}' % tuple(widths)
+        for entry in entries:
+            file.write(template.format(*entry))
+            file.write('\n')
+        if hasattr(file, 'flush'):
+            file.flush()
+
+    def to_chrome_trace(self):
+        """Return events in the Chrome trace event format as dict.
+
+        The result can be loaded by ``chrome://tracing`` or Perfetto after
+        dumped as JSON.
+        """
+        pid = os.getpid()
+        trace_events = []
+        for event in self.events:
+            trace_events.append({
+                'name': event['name'], 'cat': event['category'], 'ph': 'X',
+                'ts': event['start'] * 1e6, 'dur': event['elapsed_time'] * 1e6,
+                'pid': pid, 'tid': event['tid'],
+                'args': {'alloc_bytes': event['alloc_bytes']}})
+        return {'traceEvents': trace_events, 'displayTimeUnit': 'ms'}
+
+    def dump_chrome_trace(self, f):
+        """Dump events in the Chrome trace event format.
+
+        Args:
+            f (str or file-like object): Path or file to write JSON.
+        """
+        if isinstance(f, str):
+            with open(f, 'w') as fp:
+                json.dump(self.to_chrome_trace(), fp)
+        else:
+            json.dump(self.to_chrome_trace(), f)
+
+
+def get_profiler(profile):
+    """Return the profiler for ``profile`` option of export.
+
+    Args:
+        profile (bool or Profiler): The option value.
+
+    Returns:
+        Profiler: ``profile`` itself when it is a profiler, otherwise a new
+        profiler which is enabled when ``profile`` is true.
+    """
+    if isinstance(profile, Profiler):
+        return profile
+    return Profiler(enabled=bool(profile))
@@ -0,0 +1,46 @@
+import itertools
+
+from onnx_chainer.export import export
+
+
+def export_quantized(model, calib_iter, filename=None, converter=None,
+                     max_batches=None, **kwargs):
+    """Export a model quantized to int8 after calibration by sample inputs.
+
+    The model is exported by :func:`~onnx_chainer.export` with ``'int8'``
+    ``precision``. The first input of ``calib_iter`` is traced as ``args``,
+    and ranges of activations are recorded over it and the following inputs,
+    which are computed one by one without retaining them.
+
+    >>> it = chainer.iterators.SerialIterator(dataset, 32, repeat=False)
+    >>> export_quantized(
+    >>>     model, it, 'model.onnx',
+    >>>     converter=lambda batch: concat_examples(batch)[0])
+
+    Args:
+        model (~chainer.Chain): The model to export.
+        calib_iter (iterable): Inputs of ``model`` in the same form as
+            ``args`` of :func:`~onnx_chainer.export`, or batches converted
+            to them by ``converter``.
+        filename (str or file-like object): The filename used for saving the
+            resulting ONNX model.
+        converter (callable): If set, it is applied to each batch of
+            ``calib_iter``, like :func:`~chainer.dataset.concat_examples`.
+        max_batches (int): If set, at most this number of batches are used,
+            for infinite iterators.
+        **kwargs: Other arguments of :func:`~onnx_chainer.export`.
+
+    Returns:
+        The return value of :func:`~onnx_chainer.export`.
+    """
+    batches = iter(calib_iter)
+    if max_batches is not None:
+        batches = itertools.islice(batches, max_batches)
+    if converter is not None:
+        batches = map(converter, batches)
+    try:
+        args = next(batches)
+    except StopIteration:
+        raise ValueError('calib_iter must have at least one input')
+    return export(model, args, filename, precision='int8',
+                  calibration=batches, **kwargs)
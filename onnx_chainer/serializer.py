@@ -0,0 +1,237 @@
+import itertools
+import sys
+
+from google.protobuf import text_format
+import numpy as np
+import onnx
+from onnx.mapping import NP_TYPE_TO_TENSOR_TYPE
+from onnx import numpy_helper
+
+
+_WIRETYPE_LENGTH_DELIMITED = 2
+
+
+def _encode_varint(value):
+    out = bytearray()
+    while True:
+        bits = value & 0x7f
+        value >>= 7
+        if value:
+            out.append(0x80 | bits)
+        else:
+            out.append(bits)
+            return bytes(out)
+
+
+def _encode_tag(field_number):
+    return _encode_varint((field_number << 3) | _WIRETYPE_LENGTH_DELIMITED)
+
+
+def _length_delimited_size(field_number, size):
+    return len(_encode_tag(field_number)) + len(_encode_varint(size)) + size
+
+
+def _is_repeated(field):
+    # ``FieldDescriptor.label`` is replaced with ``is_repeated`` on recent
+    # protobuf.
+    if hasattr(field, 'is_repeated'):
+        return field.is_repeated
+    return field.label == field.LABEL_REPEATED
+
+
+def _set_field(message, field, value):
+    if _is_repeated(field):
+        getattr(message, field.name).extend(value)
+    elif field.type == field.TYPE_MESSAGE:
+        getattr(message, field.name).CopyFrom(value)
+    else:
+        setattr(message, field.name, value)
+
+
+def _copy_without(message, field_names):
+    copied = type(message)()
+    for field, value in message.ListFields():
+        if field.name not in field_names:
+            _set_field(copied, field, value)
+    return copied
+
+
+def _to_little_endian(array):
+    if array.dtype.byteorder == '>' or (
+            array.dtype.byteorder == '=' and sys.byteorder == 'big'):
+        array = array.astype(array.dtype.newbyteorder('<'))
+    return np.ascontiguousarray(array)
+
+
+class _ArrayInitializer(object):
+    """Initializer written from the buffer of an array as ``raw_data``."""
+
+    def __init__(self, name, array):
+        header = onnx.TensorProto()
+        header.name = name
+        header.data_type = NP_TYPE_TO_TENSOR_TYPE[array.dtype]
+        header.dims.extend(array.shape)
+        self.name = name
+        self.header = header.SerializeToString()
+        # NOTE: ``np.ascontiguousarray`` may return 1-dim array for 0-dim
+        # input, so dims are taken from the original array.
+        self.array = _to_little_endian(array)
+
+    def byte_size(self):
+        return len(self.header) + _length_delimited_size(
+            onnx.TensorProto.RAW_DATA_FIELD_NUMBER, self.array.nbytes)
+
+    def write(self, f):
+        """Write the tensor and return the offset of the payload in it."""
+        f.write(self.header)
+        tag = _encode_tag(onnx.TensorProto.RAW_DATA_FIELD_NUMBER)
+        size = _encode_varint(self.array.nbytes)
+        f.write(tag)
+        f.write(size)
+        f.write(self.array.data)
+        return len(self.header) + len(tag) + len(size)
+
+
+class _MessageInitializer(object):
+
+    def __init__(self, tensor):
+        self.tensor = tensor
+
+    def byte_size(self):
+        return self.tensor.ByteSize()
+
+    def write(self, f):
+        f.write(self.tensor.SerializeToString())
+        return None
+
+
+def _as_initializer(initializer):
+    if isinstance(initializer, onnx.TensorProto):
+        return _MessageInitializer(initializer)
+    name, array = initializer
+    return _ArrayInitializer(name, array)
+
+
+def write_model(model, f, initializers=()):
+    """Write an ONNX model in protobuf binary format field by field.
+
+    Unlike ``f.write(model.SerializeToString())``, the whole model is never
+    built as one bytes object. The graph is emitted node by node and
+    initializer by initializer, so the extra memory needed for writing is
+    about the size of the largest node or tensor.
+
+    Initializers which are not included in ``model`` can be given by
+    ``initializers``. Arrays given as ``(name, array)`` pairs are written
+    straight from their buffers without being converted to ``TensorProto``.
+    The output is a valid ``ModelProto`` binary, only order of the fields
+    would be different from ``SerializeToString``.
+
+    Args:
+        model (~onnx.ModelProto): The model to be written.
+        f (file-like object): The output file opened in binary mode.
+        initializers (list): Additional initializers of the graph, each
+            element is ``TensorProto`` or a tuple of name and
+            :class:`numpy.ndarray`.
+
+    Returns:
+        dict: Pairs of the offset from the beginning of the output and the
+        length in bytes of payloads of initializers given as arrays, keyed by
+        their names.
+    """
+    graph = model.graph
+    graph_field_names = ('node', 'initializer')
+    model_header = _copy_without(model, ('graph',))
+    graph_header = _copy_without(graph, graph_field_names)
+    initializers = [_MessageInitializer(t) for t in graph.initializer] +\
+        [_as_initializer(t) for t in initializers]
+
+    node_field = onnx.GraphProto.NODE_FIELD_NUMBER
+    initializer_field = onnx.GraphProto.INITIALIZER_FIELD_NUMBER
+    graph_size = graph_header.ByteSize()
+    graph_size += sum(
+        _length_delimited_size(node_field, node.ByteSize())
+        for node in graph.node)
+    graph_size += sum(
+        _length_delimited_size(initializer_field, initializer.byte_size())
+        for initializer in initializers)
+
+    # Bytes are counted instead of ``f.tell()``, which is not supported by
+    # some file-like objects
+    written = [0]
+
+    def write(data):
+        f.write(data)
+        written[0] += len(data)
+
+    write(model_header.SerializeToString())
+    write(_encode_tag(onnx.ModelProto.GRAPH_FIELD_NUMBER))
+    write(_encode_varint(graph_size))
+    write(graph_header.SerializeToString())
+    for node in graph.node:
+        write(_encode_tag(node_field))
+        write(_encode_varint(node.ByteSize()))
+        write(node.SerializeToString())
+    payloads = {}
+    for initializer in initializers:
+        size = initializer.byte_size()
+        write(_encode_tag(initializer_field))
+        write(_encode_varint(size))
+        offset = initializer.write(f)
+        if offset is not None:
+            payloads[initializer.name] = (
+                written[0] + offset, initializer.array.nbytes)
+        written[0] += size
+    return payloads
+
+
+def _write_text(message, f, indent, expanded_field_names, initializers=()):
+    fields = message.ListFields()
+    if initializers and isinstance(message, onnx.GraphProto) and\
+            not message.initializer:
+        # Written at the position of the field as ``ListFields`` sorts fields
+        # by their numbers
+        fields.append((message.DESCRIPTOR.fields_by_name['initializer'], []))
+        fields.sort(key=lambda item: item[0].number)
+    for field, value in fields:
+        if field.name not in expanded_field_names:
+            single = type(message)()
+            _set_field(single, field, value)
+            f.write(text_format.MessageToString(single, indent=indent))
+            continue
+        values = value if _is_repeated(field) else [value]
+        if field.name == 'initializer':
+            values = itertools.chain(values, initializers)
+        for v in values:
+            f.write('{}{} {{\n'.format(' ' * indent, field.name))
+            if field.name == 'graph':
+                _write_text(v, f, indent + 2, ('node', 'initializer'),
+                            initializers)
+            else:
+                f.write(text_format.MessageToString(v, indent=indent + 2))
+            f.write('{}}}\n'.format(' ' * indent))
+
+
+def _as_tensor(initializer):
+    if isinstance(initializer, onnx.TensorProto):
+        return initializer
+    name, array = initializer
+    return numpy_helper.from_array(array, name)
+
+
+def write_model_text(model, f, initializers=()):
+    """Write an ONNX model in protobuf text format field by field.
+
+    The output is same as ``text_format.MessageToString(model)``, which is
+    what ``print(model)`` emits, but nodes and initializers are formatted one
+    by one instead of formatting the whole model as one string.
+
+    Args:
+        model (~onnx.ModelProto): The model to be written.
+        f (file-like object): The output file opened in text mode.
+        initializers (list): Additional initializers of the graph in the
+            same form as :func:`write_model`, each of them is converted to
+            ``TensorProto`` only while it is formatted.
+    """
+    _write_text(model, f, 0, ('graph',),
+                (_as_tensor(t) for t in initializers))
+    f.write('\n')
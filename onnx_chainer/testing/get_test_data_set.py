@@ -6,10 +6,16 @@ import onnx_chainer
 TEST_OUT_DIR = 'out'
 
 
-def gen_test_data_set(model, args, name, opset_version, **kwargs):
+def gen_test_data_set(model, args, name, opset_version,
+                      out_dir=TEST_OUT_DIR, **kwargs):
     model.xp.random.seed(42)
-    test_path = os.path.join(
-        TEST_OUT_DIR, 'opset{}'.format(opset_version), name)
+    if isinstance(opset_version, (list, tuple)):
+        # Trace once and convert for each opset version
+        test_path = [os.path.join(out_dir, 'opset{}'.format(v), name)
+                     for v in opset_version]
+    else:
+        test_path = os.path.join(
+            out_dir, 'opset{}'.format(opset_version), name)
     onnx_chainer.export_testcase(
         model, args, test_path, opset_version=opset_version, **kwargs)
     return test_path
@@ -0,0 +1,215 @@
+from collections import OrderedDict
+
+import chainer
+import onnx
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _array_signature(array):
+    if array is None:
+        return None
+    return tuple(array.shape), array.dtype.str
+
+
+def _args_signature(args):
+    if isinstance(args, (list, tuple)):
+        return tuple(_args_signature(arg) for arg in args)
+    if isinstance(args, dict):
+        return tuple((k, _args_signature(v)) for k, v in args.items())
+    if isinstance(args, chainer.Variable):
+        return _array_signature(args.array)
+    if isinstance(args, chainer.get_array_types()):
+        return _array_signature(args)
+    # Other types are given to the model as is, they are used as a part of
+    # the key only when hashable.
+    try:
+        hash(args)
+    except TypeError:
+        return type(args), id(args)
+    return type(args), args
+
+
+def _namedpersistents(model):
+    for path, link in model.namedlinks():
+        for attr in sorted(getattr(link, '_persistent', ())):
+            yield path, attr, getattr(link, attr)
+
+
+def _model_signature(model):
+    links = tuple(
+        (path, type(link).__module__, type(link).__name__)
+        for path, link in model.namedlinks())
+    params = tuple(
+        (path, _array_signature(param.array))
+        for path, param in model.namedparams())
+    persistents = tuple(
+        (path, attr, _array_signature(value)
+         if isinstance(value, chainer.get_array_types()) else type(value))
+        for path, attr, value in _namedpersistents(model))
+    return links, params, persistents
+
+
+def make_cache_key(model, args, **options):
+    """Make a key of the trace cache.
+
+    The key consists of the structure of ``model``, which is paths and types
+    of links, and paths, shapes and dtypes of parameters and persistent
+    values, shapes and dtypes of ``args``, and other options of export.
+    Values of arrays are not included.
+
+    Returns:
+        tuple: The hashable key.
+    """
+    options = tuple(sorted((k, _freeze(v)) for k, v in options.items()))
+    return _model_signature(model), _args_signature(args), options
+
+
+def has_computed_inputs(model, implicit_inputs):
+    """Return whether implicit inputs have values computed on forward.
+
+    Implicit inputs which are neither parameters nor persistent arrays of
+    ``model``, like ``chainer.Variable(self.l.W.array * 2)``, can depend on
+    weights, and they would be replayed with the old values from the cache.
+
+    Args:
+        model (~chainer.Chain): The exported model.
+        implicit_inputs (dict): Variables keyed by names, which are
+            :attr:`~onnx_chainer.context.Context.implicit_inputs`.
+
+    Returns:
+        bool: ``True`` if the graph must not be cached.
+    """
+    param_ids = {id(p) for p in model.params()}
+    persistent_ids = {
+        id(value) for _, _, value in _namedpersistents(model)}
+    for var in implicit_inputs.values():
+        if id(var) in param_ids:
+            continue
+        if isinstance(var, chainer.Variable):
+            var = var.array
+        if id(var) not in persistent_ids:
+            return True
+    return False
+
+
+class TraceCacheEntry(object):
+    """Converted ONNX model without initializers and sources of them.
+
+    Args:
+        onnx_model (~onnx.ModelProto): The converted model, its initializers
+            are not kept.
+        model (~chainer.Chain): The exported model.
+        named_parameters (list): Pairs of the initializer name and the
+            parameter, which is :class:`~chainer.Variable` or an array.
+    """
+
+    def __init__(self, onnx_model, model, named_parameters):
+        template = onnx.ModelProto()
+        template.CopyFrom(onnx_model)
+        del template.graph.initializer[:]
+        self.template = template
+
+        param_paths = {id(p): path for path, p in model.namedparams()}
+        persistent_paths = {
+            id(value): (path, attr)
+            for path, attr, value in _namedpersistents(model)}
+        self.sources = []
+        for name, param in named_parameters:
+            if id(param) in param_paths:
+                source = ('param', param_paths[id(param)])
+            else:
+                if isinstance(param, chainer.Variable):
+                    param = param.array
+                if id(param) in persistent_paths:
+                    source = ('persistent',) + persistent_paths[id(param)]
+                else:
+                    # Arrays made on conversion, keep the values as is.
+                    source = ('array', chainer.cuda.to_cpu(param).copy())
+            self.sources.append((name, source))
+
+    def named_arrays(self, model):
+        """Yield pairs of the initializer name and the current array.
+
+        Parameters and persistent arrays are read from ``model``, so new
+        weights of the model are reflected.
+        """
+        params = dict(model.namedparams())
+        links = dict(model.namedlinks())
+        for name, source in self.sources:
+            if source[0] == 'param':
+                array = params[source[1]].array
+            elif source[0] == 'persistent':
+                array = getattr(links[source[1]], source[2])
+            else:
+                array = source[1]
+            yield name, chainer.cuda.to_cpu(array)
+
+    def make_model(self):
+        """Return a copy of the converted model without initializers."""
+        onnx_model = onnx.ModelProto()
+        onnx_model.CopyFrom(self.template)
+        return onnx_model
+
+
+class TraceCache(object):
+    """In-process cache of converted graphs.
+
+    Exporting a model whose structure and inputs are same as a cached one
+    reuses the converted graph, only parameters are read from the model
+    again. Forward computation, conversion and checking of the model are
+    skipped, so re-exporting a model with new weights costs about writing
+    the weights.
+
+    The cache assumes that the computational graph is decided by the
+    structure of the model and shapes and dtypes of inputs. Models which
+    change the graph by other attributes or by values of inputs must not be
+    exported with the cache.
+
+    Args:
+        max_size (int): The maximum number of cached graphs, the least
+            recently used one is removed when exceeded.
+    """
+
+    def __init__(self, max_size=8):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+_default_trace_cache = TraceCache()
+
+
+def get_default_trace_cache():
+    """Return the trace cache used by ``export(..., trace_cache=True)``."""
+    return _default_trace_cache
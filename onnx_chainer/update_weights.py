@@ -0,0 +1,127 @@
+import os
+
+import chainer
+import onnx
+from onnx.mapping import NP_TYPE_TO_TENSOR_TYPE
+from onnx import numpy_helper
+
+from onnx_chainer.external_data import get_external_data
+from onnx_chainer.onnx_helper import cleanse_param_name
+from onnx_chainer.serializer import write_model
+
+
+# Key of ``metadata_props`` set by export when initializers are rewritten by
+# optimization or quantization
+REWRITTEN_INITIALIZERS_KEY = 'rewritten_initializers'
+
+
+def _named_arrays(model):
+    arrays = {}
+    for path, param in model.namedparams():
+        if param.array is not None:
+            arrays[cleanse_param_name(path)] = param.array
+    # Persistent values are exported with names as same as parameters, like
+    # "param_bn_avg_mean"
+    for path, link in model.namedlinks():
+        for attr in getattr(link, '_persistent', ()):
+            value = getattr(link, attr)
+            if isinstance(value, chainer.get_array_types()):
+                name = cleanse_param_name(
+                    '{}/{}'.format(path.rstrip('/'), attr))
+                arrays[name] = value
+    return arrays
+
+
+def update_weights(onnx_path, model):
+    """Overwrite weights of an exported ONNX model with ones of ``model``.
+
+    Initializers of the ONNX model are matched with parameters and persistent
+    arrays of ``model`` by names made by
+    :func:`~onnx_chainer.onnx_helper.cleanse_param_name`, and only their
+    payloads are replaced. Neither forward computation nor conversion is
+    run, so ``model`` must have the same architecture as the exported one.
+
+    Payloads stored in external data files are overwritten in place at their
+    offsets, the ONNX file itself is rewritten only when some of the updated
+    initializers are embedded in it. Initializers without corresponding
+    arrays, like ones made by converters, are left as is.
+
+    All the initialized parameters and persistent arrays of ``model`` must
+    have initializers of the same shapes and dtypes. Models whose
+    initializers are rewritten on export, by folding, deduplication,
+    ``precision`` or ``quantize_weights``, are refused because their
+    initializers are not copies of parameters anymore. Nothing is written
+    when the model is refused.
+
+    Args:
+        onnx_path (str): Path of the exported ONNX model.
+        model (~chainer.Chain): The model which has new weights.
+
+    Returns:
+        list: Names of updated initializers.
+    """
+    onnx_model = onnx.load_model(onnx_path, load_external_data=False)
+    if any(prop.key == REWRITTEN_INITIALIZERS_KEY
+           for prop in onnx_model.metadata_props):
+        raise ValueError(
+            'Initializers of the ONNX model are rewritten by optimization or '
+            'quantization on export, export the model again instead')
+    arrays = _named_arrays(model)
+    missing = sorted(set(arrays) - {
+        tensor.name for tensor in onnx_model.graph.initializer})
+    if missing:
+        raise ValueError(
+            'The ONNX model does not have initializers of parameters {}, '
+            'the model must have the same architecture as the exported '
+            'one'.format(', '.join(missing)))
+
+    # Check all the initializers before writing anything
+    updates = []
+    for tensor in onnx_model.graph.initializer:
+        array = arrays.get(tensor.name)
+        if array is None:
+            continue
+        array = chainer.cuda.to_cpu(array)
+        if tuple(tensor.dims) != array.shape or\
+                tensor.data_type != NP_TYPE_TO_TENSOR_TYPE[array.dtype]:
+            raise ValueError(
+                'Initializer \'{}\' does not match with the model, expected '
+                'shape {} and type {}, but the array has shape {} and dtype '
+                '{}'.format(
+                    tensor.name, tuple(tensor.dims),
+                    onnx.TensorProto.DataType.Name(tensor.data_type),
+                    array.shape, array.dtype))
+        info = get_external_data(tensor)
+        if info is not None and info.get('length', array.nbytes) !=\
+                array.nbytes:
+            raise ValueError(
+                'Length of the external data of initializer \'{}\' is {}, '
+                'but the array has {} bytes'.format(
+                    tensor.name, info['length'], array.nbytes))
+        updates.append((tensor, info, array))
+
+    dirname = os.path.dirname(os.path.abspath(onnx_path))
+    data_files = {}
+    rewrite_model = False
+    try:
+        for tensor, info, array in updates:
+            new_tensor = numpy_helper.from_array(array, tensor.name)
+            if info is None:
+                tensor.CopyFrom(new_tensor)
+                rewrite_model = True
+                continue
+            location = info['location']
+            if location not in data_files:
+                data_files[location] = open(
+                    os.path.join(dirname, location), 'r+b')
+            f = data_files[location]
+            f.seek(info.get('offset', 0))
+            f.write(new_tensor.raw_data)
+    finally:
+        for f in data_files.values():
+            f.close()
+
+    if rewrite_model:
+        with open(onnx_path, 'wb') as f:
+            write_model(onnx_model, f)
+    return [tensor.name for tensor, _, _ in updates]
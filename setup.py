@@ -61,7 +61,9 @@ setup(
     name='onnx-chainer',
     packages=[
         'onnx_chainer',
+        'onnx_chainer.bench',
         'onnx_chainer.functions',
+        'onnx_chainer.optimizer',
         'onnx_chainer.testing',
     ],
     version='1.5.1a2',
@@ -24,7 +24,8 @@ class ONNXModelChecker(object):
     """Base class to check outputs.
 
     Some configurations are set by fixture, for example, target opset versions,
-    output directory name, and so on.
+    output directory name, and so on. Test cases are written to a temporary
+    directory of each test.
 
     Example:
 
@@ -53,10 +54,11 @@ class ONNXModelChecker(object):
         self.target_opsets = target_opsets
 
     @pytest.fixture(autouse=True, scope='function')
-    def set_name(self, request, check_model_expect):
+    def set_name(self, request, check_model_expect, tmpdir):
         cls_name = request.cls.__name__
         self.default_name = cls_name[len('Test'):].lower()
         self.check_out_values = check_model_expect
+        self.out_dir = str(tmpdir)
 
     def expect(self, model, args, name=None, skip_opset_version=None,
                skip_outvalue_version=None, custom_model_test_func=None,
@@ -84,15 +86,25 @@ class ONNXModelChecker(object):
         if test_name is None:
             test_name = self.default_name
 
-        for opset_version in self.target_opsets:
-            if skip_opset_version is not None and\
-                    opset_version in skip_opset_version:
-                continue
-
-            dir_name = 'test_' + test_name
-            test_path = gen_test_data_set(
-                model, args, dir_name, opset_version, **kwargs)
-
+        opset_versions = [
+            v for v in self.target_opsets
+            if skip_opset_version is None or v not in skip_opset_version]
+        if not opset_versions:
+            return
+
+        dir_name = 'test_' + test_name
+        # The latest version is exported alone as users usually do, and the
+        # others are converted from one trace
+        test_paths = []
+        if len(opset_versions) > 1:
+            test_paths = gen_test_data_set(
+                model, args, dir_name, opset_versions[:-1],
+                out_dir=self.out_dir, **kwargs)
+        test_paths.append(gen_test_data_set(
+            model, args, dir_name, opset_versions[-1], out_dir=self.out_dir,
+            **kwargs))
+
+        for opset_version, test_path in zip(opset_versions, test_paths):
             onnx_model_path = os.path.join(test_path, 'model.onnx')
             assert os.path.isfile(onnx_model_path)
             with open(onnx_model_path, 'rb') as f:
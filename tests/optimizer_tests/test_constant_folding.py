@@ -0,0 +1,90 @@
+import chainer
+import chainer.functions as F
+import chainer.links as L
+import numpy as np
+from onnx import helper
+from onnx import TensorProto
+import pytest
+
+from onnx_chainer import export
+from onnx_chainer.optimizer import OptimizationGraph
+from onnx_chainer.optimizer.constant_folding import fold_constants
+from onnx_chainer.testing import input_generator
+from tests.helper import ONNXModelTest
+
+
+class TransposedLinear(chainer.Chain):
+
+    def __init__(self):
+        super(TransposedLinear, self).__init__()
+        with self.init_scope():
+            self.W = chainer.Parameter(
+                np.random.rand(6, 4).astype(np.float32))
+            self.b = chainer.Parameter(np.random.rand(4).astype(np.float32))
+
+    def forward(self, x):
+        # Weight transform and broadcast of the bias depend only on
+        # parameters
+        W = F.transpose(F.reshape(self.W * 2, (4, 6)))
+        b = F.broadcast_to(self.b, (x.shape[0], 4))
+        return F.matmul(x, W) + b
+
+
+class TestFoldParameters(ONNXModelTest):
+
+    def test_output(self):
+        def check_folded(onnx_model):
+            op_types = [n.op_type for n in onnx_model.graph.node]
+            assert op_types == ['MatMul', 'Add']
+            names = {t.name for t in onnx_model.graph.initializer}
+            assert len(names) == 2
+            assert all(name.endswith('_folded') for name in names)
+
+        x = input_generator.increasing(3, 6)
+        self.expect(TransposedLinear(), x, name='fold_parameters',
+                    custom_model_test_func=check_folded, optimize=1,
+                    skip_opset_version=[7])
+
+
+class TestFoldStaticShapes(ONNXModelTest):
+
+    def test_output(self):
+        def check_folded(onnx_model):
+            op_types = [n.op_type for n in onnx_model.graph.node]
+            assert 'Shape' not in op_types
+            assert 'Concat' not in op_types
+
+        model = L.GroupNormalization(2, 4)
+        x = input_generator.increasing(2, 4, 3, 3)
+        self.expect(model, x, name='fold_static_shapes',
+                    custom_model_test_func=check_folded, optimize=1,
+                    skip_opset_version=[7, 8, 9])
+
+
+@pytest.mark.parametrize('static_shapes', [False, True])
+def test_fold_shape(static_shapes):
+    nodes = [helper.make_node('Shape', ['x'], ['s']),
+             helper.make_node('Reshape', ['y', 's'], ['z'])]
+    inputs = [helper.make_tensor_value_info(name, TensorProto.FLOAT, (2, 6))
+              for name in ('x', 'y')]
+    outputs = [helper.make_tensor_value_info('z', TensorProto.FLOAT, (2, 6))]
+    graph = OptimizationGraph(
+        nodes, [], inputs, outputs, 11, value_shapes={'x': (2, 6)},
+        static_shapes=static_shapes)
+    fold_constants(graph)
+    if not static_shapes:
+        assert len(graph.nodes) == 2
+    else:
+        assert [n.op_type for n in graph.nodes] == ['Reshape']
+        assert graph.nodes[0].input[1] == 's_folded'
+        np.testing.assert_array_equal(
+            graph.get_initializer('s_folded'), [2, 6])
+
+
+def test_large_broadcast_not_folded():
+    b = chainer.Parameter(np.ones((16,), dtype=np.float32))
+    model = chainer.Sequential(lambda x: x + F.broadcast_to(b, (64, 16)))
+    x = np.zeros((64, 16), dtype=np.float32)
+    onnx_model = export(model, x, optimize=1)
+    op_types = [n.op_type for n in onnx_model.graph.node]
+    assert 'Expand' in op_types
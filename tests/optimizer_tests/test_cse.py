@@ -0,0 +1,58 @@
+import chainer
+import chainer.functions as F
+from onnx import helper
+from onnx import TensorProto
+
+from onnx_chainer.optimizer import OptimizationGraph
+from onnx_chainer.optimizer import PassManager
+from onnx_chainer.testing import input_generator
+from tests.helper import ONNXModelTest
+
+
+class TestEliminateCommonSubexpressions(ONNXModelTest):
+
+    def test_output(self):
+        def check_eliminated(onnx_model):
+            op_types = [n.op_type for n in onnx_model.graph.node]
+            assert op_types.count('Exp') == 1
+            # The scalar 2 and the shape of Reshape
+            assert op_types.count('Constant') == 2
+
+        def f(x):
+            h = F.reshape(x, (-1,)) + F.reshape(x * 2, (-1,))
+            return F.exp(x) + F.exp(x), h
+
+        x = input_generator.increasing(2, 3)
+        self.expect(chainer.Sequential(f), x, name='cse',
+                    custom_model_test_func=check_eliminated, optimize=1)
+
+
+def _make_constant(name, value, data_type=TensorProto.FLOAT):
+    return helper.make_node('Constant', [], [name], value=helper.make_tensor(
+        name, data_type, (len(value),), value))
+
+
+def test_eliminate_constants():
+    nodes = [
+        _make_constant('c1', [1.0, 2.0]),
+        _make_constant('c2', [1.0, 2.0]),
+        _make_constant('c3', [1.0, 3.0]),
+        _make_constant('c4', [1, 2], TensorProto.INT64),
+        helper.make_node('Add', ['x', 'c1'], ['h1']),
+        helper.make_node('Add', ['x', 'c2'], ['h2']),
+        helper.make_node('Add', ['x', 'c3'], ['h3']),
+        helper.make_node('Reshape', ['h3', 'c4'], ['h4']),
+        helper.make_node('Sum', ['h1', 'h2', 'h4'], ['y']),
+        # Graph outputs are kept
+        helper.make_node('Add', ['x', 'c2'], ['z']),
+    ]
+    graph = OptimizationGraph(
+        nodes, [],
+        [helper.make_tensor_value_info('x', TensorProto.FLOAT, (2,))],
+        [helper.make_tensor_value_info(name, TensorProto.FLOAT, None)
+         for name in ('y', 'z')], 10)
+    PassManager(passes=['eliminate_common_subexpressions']).run(graph)
+    assert [n.output[0] for n in graph.nodes] ==\
+        ['c1', 'c3', 'c4', 'h1', 'h3', 'h4', 'y', 'z']
+    assert list(graph.nodes[-2].input) == ['h1', 'h1', 'h4']
+    assert list(graph.nodes[-1].input) == ['x', 'c1']
@@ -0,0 +1,106 @@
+import chainer
+import chainer.functions as F
+import chainer.links as L
+import numpy as np
+from onnx import helper
+from onnx import TensorProto
+import pytest
+
+from onnx_chainer import export
+from onnx_chainer.optimizer import OptimizationGraph
+from onnx_chainer.optimizer import PassManager
+from onnx_chainer.testing import input_generator
+from tests.helper import ONNXModelTest
+
+
+class TestEliminateIdentities(ONNXModelTest):
+
+    def test_output(self):
+        def check_eliminated(onnx_model):
+            op_types = [n.op_type for n in onnx_model.graph.node]
+            # Dropout exported for training is kept
+            assert op_types == ['Gemm', 'Dropout', 'Relu']
+
+        model = chainer.Sequential(
+            L.Linear(5, 4), lambda h: F.copy(h, -1), F.dropout, F.relu,
+            F.identity)
+        x = input_generator.increasing(2, 5)
+        # Dropout is traced only on training, outputs are random
+        self.expect(model, x, name='eliminate_identities',
+                    custom_model_test_func=check_eliminated,
+                    skip_outvalue_version=self.target_opsets,
+                    optimize=1, train=True)
+
+
+def _make_graph(nodes, outputs, opset_version=11):
+    return OptimizationGraph(
+        nodes, [('w', np.ones((2, 3), dtype=np.float32))],
+        [helper.make_tensor_value_info('x', TensorProto.FLOAT, (2, 3)),
+         helper.make_tensor_value_info('w', TensorProto.FLOAT, (2, 3))],
+        [helper.make_tensor_value_info(name, TensorProto.FLOAT, None)
+         for name in outputs], opset_version)
+
+
+def test_eliminate_identity_output():
+    graph = _make_graph([
+        helper.make_node('Add', ['x', 'w'], ['h']),
+        helper.make_node('Identity', ['h'], ['h2']),
+        helper.make_node('Identity', ['h2'], ['y']),
+        helper.make_node('Identity', ['x'], ['z']),
+    ], ['y', 'z'])
+    PassManager(passes=['eliminate_identities']).run(graph)
+    assert [(n.op_type, list(n.output)) for n in graph.nodes] ==\
+        [('Add', ['y']), ('Identity', ['z'])]
+
+
+@pytest.mark.parametrize('opset_version,is_test,train,mask,eliminated', [
+    (6, 0, False, False, False),
+    (6, 1, False, False, True),
+    (7, None, False, False, True),
+    (7, None, True, False, False),
+    (7, None, False, True, False),
+])
+def test_eliminate_dropout(opset_version, is_test, train, mask, eliminated):
+    kwargs = {} if is_test is None else {'is_test': is_test}
+    outputs = ['h', 'mask'] if mask else ['h']
+    graph = _make_graph([
+        helper.make_node('Dropout', ['x'], outputs, **kwargs),
+        helper.make_node('Add', ['h', 'w'], ['y']),
+    ], ['y'], opset_version)
+    with chainer.using_config('train', train):
+        PassManager(passes=['eliminate_identities']).run(graph)
+    op_types = [n.op_type for n in graph.nodes]
+    assert ('Dropout' not in op_types) == eliminated
+    if eliminated:
+        assert list(graph.nodes[0].input) == ['x', 'w']
+
+
+def test_eliminate_dead_nodes():
+    graph = _make_graph([
+        helper.make_node('Constant', [], ['c'], value=helper.make_tensor(
+            'c', TensorProto.FLOAT, (1,), [1.0])),
+        helper.make_node('Mul', ['w', 'c'], ['unused']),
+        helper.make_node('Relu', ['unused'], ['unused2']),
+        helper.make_node('Relu', ['x'], ['y']),
+    ], ['y'])
+    pass_manager = PassManager(level=1)
+    pass_manager.run(graph)
+    assert [n.op_type for n in graph.nodes] == ['Relu']
+    assert not graph.initializers
+    assert [i.name for i in graph.inputs] == ['x']
+    stats = {s['name']: s for s in pass_manager.stats}
+    assert stats['eliminate_dead_nodes']['nodes_before'] == 4
+    assert stats['eliminate_dead_nodes']['nodes_after'] == 1
+    assert stats['eliminate_unused_initializers']['bytes_before'] == 24
+    assert stats['eliminate_unused_initializers']['bytes_after'] == 0
+
+
+def test_eliminate_dead_branch():
+    def f(x):
+        # The retained branch is not used by the output
+        F.exp(x)
+        return F.relu(x)
+
+    x = input_generator.increasing(2, 3)
+    onnx_model = export(chainer.Sequential(f), x, optimize=1)
+    assert [n.op_type for n in onnx_model.graph.node] == ['Relu']
@@ -0,0 +1,72 @@
+import chainer
+import chainer.links as L
+import numpy as np
+from onnx import helper
+from onnx import TensorProto
+import pytest
+
+from onnx_chainer.optimizer import dedup
+from onnx_chainer.optimizer import OptimizationGraph
+from onnx_chainer.optimizer import PassManager
+from onnx_chainer.testing import input_generator
+from tests.helper import ONNXModelTest
+
+
+class TestDeduplicateInitializers(ONNXModelTest):
+
+    def test_output(self):
+        def check_deduplicated(onnx_model):
+            names = [t.name for t in onnx_model.graph.initializer]
+            # Zero biases are shared
+            assert len(names) == 3
+
+        model = chainer.Sequential(L.Linear(3, 3), L.Linear(3, 3))
+        x = input_generator.increasing(2, 3)
+        self.expect(model, x, name='deduplicate_initializers',
+                    custom_model_test_func=check_deduplicated, optimize=2)
+
+
+@pytest.mark.parametrize('chunk_size', [4, 1024])
+def test_deduplicate_initializers(monkeypatch, chunk_size):
+    monkeypatch.setattr(dedup, 'HASH_CHUNK_SIZE', chunk_size)
+    a = np.arange(12, dtype=np.float32).reshape(3, 4)
+    params = [
+        ('a', chainer.Parameter(a)),
+        ('b', a.copy()),
+        ('c', a.astype(np.float64)),
+        ('d', a.reshape(4, 3).copy()),
+        ('e', a + 1),
+        ('f', chainer.Parameter(a.copy())),
+        # Not C-contiguous
+        ('g', np.asfortranarray(a)),
+    ]
+    nodes = [helper.make_node('Sum', [name for name, _ in params], ['y'])]
+    inputs = [helper.make_tensor_value_info(name, TensorProto.FLOAT, None)
+              for name, _ in params]
+    graph = OptimizationGraph(
+        nodes, params, inputs,
+        [helper.make_tensor_value_info('y', TensorProto.FLOAT, None)], 10)
+    pass_manager = PassManager(passes=['deduplicate_initializers'])
+    pass_manager.run(graph)
+
+    assert list(graph.initializers) == ['a', 'c', 'd', 'e']
+    assert [i.name for i in graph.inputs] == ['a', 'c', 'd', 'e']
+    assert list(graph.nodes[0].input) ==\
+        ['a', 'a', 'c', 'd', 'e', 'a', 'a']
+    stats = pass_manager.stats[0]
+    assert stats['bytes_before'] - stats['bytes_after'] == a.nbytes * 3
+
+
+def test_deduplicate_initializers_prefer_added():
+    beta = np.arange(4, dtype=np.float32)
+    nodes = [helper.make_node('Sum', ['beta'], ['y'])]
+    graph = OptimizationGraph(
+        nodes, [('beta', chainer.Parameter(beta))],
+        [helper.make_tensor_value_info('beta', TensorProto.FLOAT, (4,))],
+        [helper.make_tensor_value_info('y', TensorProto.FLOAT, None)], 10)
+    nodes[0].input.append(graph.add_initializer('b_folded', beta.copy()))
+    PassManager(passes=['deduplicate_initializers']).run(graph)
+
+    # The computed value does not take over the name of the parameter
+    assert list(graph.initializers) == ['b_folded']
+    assert list(graph.nodes[0].input) == ['b_folded', 'b_folded']
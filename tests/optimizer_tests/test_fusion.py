@@ -0,0 +1,190 @@
+import chainer
+import chainer.functions as F
+import chainer.links as L
+from chainer import testing
+import numpy as np
+import onnx
+from onnx import helper
+from onnx import numpy_helper
+from onnx import TensorProto
+
+from onnx_chainer import export
+from onnx_chainer.optimizer import OptimizationGraph
+from onnx_chainer.optimizer import PassManager
+from onnx_chainer.optimizer.graph import get_attribute
+from onnx_chainer.testing import input_generator
+from tests.helper import ONNXModelTest
+
+
+def _randomize_batch_normalization(bn):
+    bn.gamma.array[...] = np.random.uniform(0.5, 1.5, bn.gamma.shape)
+    bn.beta.array[...] = np.random.uniform(-1, 1, bn.beta.shape)
+    bn.avg_mean[...] = np.random.uniform(-1, 1, bn.avg_mean.shape)
+    bn.avg_var[...] = np.random.uniform(0.5, 1.5, bn.avg_var.shape)
+
+
+@testing.parameterize(
+    {'name': 'conv', 'nobias': False, 'groups': 1},
+    {'name': 'conv_nobias', 'nobias': True, 'groups': 1},
+    {'name': 'conv_group', 'nobias': False, 'groups': 2},
+    {'name': 'deconv', 'nobias': False, 'groups': 1},
+    {'name': 'deconv_group', 'nobias': True, 'groups': 2},
+    {'name': 'linear', 'nobias': False, 'groups': 1},
+    {'name': 'linear_nobias', 'nobias': True, 'groups': 1},
+)
+class TestFoldBatchNormalization(ONNXModelTest):
+
+    def setUp(self):
+        if self.name.startswith('conv'):
+            layer = L.Convolution2D(
+                4, 6, 3, 1, 1, nobias=self.nobias, groups=self.groups)
+        elif self.name.startswith('deconv'):
+            layer = L.Deconvolution2D(
+                4, 6, 3, 1, 1, nobias=self.nobias, groups=self.groups)
+        else:
+            layer = L.Linear(4 * 5 * 5, 6, nobias=self.nobias)
+        bn = L.BatchNormalization(6)
+        _randomize_batch_normalization(bn)
+        self.model = chainer.Sequential(layer, bn, F.relu)
+        self.x = input_generator.increasing(2, 4, 5, 5)
+
+    def test_output(self):
+        def check_folded(onnx_model):
+            op_types = [n.op_type for n in onnx_model.graph.node]
+            assert 'BatchNormalization' not in op_types
+            names = [t.name for t in onnx_model.graph.initializer]
+            assert len(names) == 2
+            assert all(name.endswith('_folded') for name in names)
+
+        self.expect(self.model, self.x, name='fold_bn_' + self.name,
+                    custom_model_test_func=check_folded, optimize=2)
+
+
+def test_fold_batch_normalization_shared_output():
+    conv = L.Convolution2D(3, 4, 3, 1, 1)
+    bn = L.BatchNormalization(4)
+    model = chainer.Sequential(lambda x: conv(x), lambda h: bn(h) + h)
+    x = input_generator.increasing(1, 3, 5, 5)
+    onnx_model = export(model, x, optimize=2)
+    op_types = [n.op_type for n in onnx_model.graph.node]
+    assert 'BatchNormalization' in op_types
+
+
+def test_fold_batch_normalization_level_1():
+    model = chainer.Sequential(
+        L.Convolution2D(3, 4, 3, 1, 1), L.BatchNormalization(4))
+    x = input_generator.increasing(1, 3, 5, 5)
+    onnx_model = export(model, x, optimize=1)
+    op_types = [n.op_type for n in onnx_model.graph.node]
+    assert op_types == ['Conv', 'BatchNormalization']
+
+
+@testing.parameterize(
+    {'name': 'conv', 'value': 0, 'fused': True},
+    {'name': 'average_pooling', 'value': 0, 'fused': True},
+    {'name': 'max_pooling', 'value': -np.inf, 'fused': True},
+    {'name': 'max_pooling_relu', 'value': 0, 'fused': True},
+    {'name': 'conv_nonzero', 'value': 1, 'fused': False},
+)
+class TestFusePad(ONNXModelTest):
+
+    def setUp(self):
+        pad_width = ((0, 0), (0, 0), (1, 2), (2, 1))
+        conv = L.Convolution2D(3, 4, 3, 1, 1)
+        if self.name == 'average_pooling':
+            func = lambda h: F.average_pooling_2d(h, 3, 1, 0)  # NOQA
+        elif self.name.startswith('max_pooling'):
+            func = lambda h: F.max_pooling_2d(  # NOQA
+                h, 3, 1, 0, cover_all=False)
+        else:
+            func = conv
+        pre = F.relu if self.name == 'max_pooling_relu' else F.identity
+        self.model = chainer.Sequential(
+            pre,
+            lambda h: F.pad(h, pad_width, 'constant',
+                            constant_values=[self.value]),
+            func)
+        self.x = input_generator.increasing(1, 3, 5, 5)
+
+    def test_output(self):
+        def check_fused(onnx_model):
+            op_types = [n.op_type for n in onnx_model.graph.node]
+            assert ('Pad' not in op_types) == self.fused
+
+        self.expect(self.model, self.x, name='fuse_pad_' + self.name,
+                    custom_model_test_func=check_fused, optimize=2)
+
+
+def test_fuse_pad_of_channels():
+    model = chainer.Sequential(
+        lambda x: F.pad(x, ((0, 0), (1, 0), (1, 1), (1, 1)), 'constant'),
+        L.Convolution2D(4, 2, 3))
+    x = input_generator.increasing(1, 3, 5, 5)
+    onnx_model = export(model, x, optimize=2)
+    op_types = [n.op_type for n in onnx_model.graph.node]
+    assert op_types == ['Pad', 'Conv']
+
+
+@testing.parameterize(
+    {'name': 'bias'},
+    {'name': 'broadcast_bias'},
+    {'name': 'transposed'},
+)
+class TestFuseMatMulAdd(ONNXModelTest):
+
+    def setUp(self):
+        w = np.random.rand(4, 5).astype(np.float32)
+        b = np.random.rand(5).astype(np.float32)
+        if self.name == 'bias':
+            b = np.broadcast_to(b, (3, 5)).copy()
+            self.model = chainer.Sequential(lambda x: b + F.matmul(x, w))
+            self.x = input_generator.increasing(3, 4)
+        elif self.name == 'broadcast_bias':
+            self.model = chainer.Sequential(
+                lambda x: F.matmul(x, w) + F.broadcast_to(b, (3, 5)))
+            self.x = input_generator.increasing(3, 4)
+        else:
+            self.model = chainer.Sequential(
+                lambda x: F.matmul(x, w.T.copy(), transa=True, transb=True) +
+                F.broadcast_to(b, (3, 5)))
+            self.x = input_generator.increasing(4, 3)
+
+    def test_output(self):
+        def check_fused(onnx_model):
+            op_types = [n.op_type for n in onnx_model.graph.node]
+            assert op_types == ['Gemm']
+            if self.name == 'transposed':
+                # Transpose of the constant is folded
+                gemm = onnx_model.graph.node[0]
+                assert get_attribute(gemm, 'transA') == 1
+                assert get_attribute(gemm, 'transB') == 0
+
+        self.expect(self.model, self.x, name='fuse_matmul_add_' + self.name,
+                    custom_model_test_func=check_fused, optimize=2,
+                    skip_opset_version=[7])
+
+
+def test_fuse_matmul_add_constant_after_matmul():
+    c = np.arange(5, dtype=np.float32)
+    nodes = [
+        helper.make_node('MatMul', ['x', 'w'], ['h']),
+        helper.make_node('Constant', [], ['c'],
+                         value=numpy_helper.from_array(c, 'c')),
+        helper.make_node('Add', ['h', 'c'], ['y']),
+    ]
+    graph = OptimizationGraph(
+        nodes, [('w', np.ones((4, 5), dtype=np.float32))],
+        [helper.make_tensor_value_info('x', TensorProto.FLOAT, (3, 4)),
+         helper.make_tensor_value_info('w', TensorProto.FLOAT, (4, 5))],
+        [helper.make_tensor_value_info('y', TensorProto.FLOAT, (3, 5))], 10,
+        value_shapes={'x': (3, 4), 'h': (3, 5), 'y': (3, 5)})
+    PassManager(passes=['fuse_matmul_add']).run(graph)
+
+    # Gemm is placed after the definition of C
+    assert [n.op_type for n in graph.nodes] == ['Constant', 'Gemm']
+    assert list(graph.nodes[1].input) == ['x', 'w', 'c']
+    onnx_graph = helper.make_graph(
+        graph.nodes, 'graph', graph.inputs, graph.outputs,
+        [numpy_helper.from_array(np.ones((4, 5), dtype=np.float32), 'w')])
+    onnx.checker.check_model(helper.make_model(
+        onnx_graph, opset_imports=[helper.make_operatorsetid('', 10)]))
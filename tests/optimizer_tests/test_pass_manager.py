@@ -0,0 +1,116 @@
+import io
+
+import chainer
+import chainer.functions as F
+import chainer.links as L
+import numpy as np
+import onnx
+from onnx import helper
+from onnx import TensorProto
+import pytest
+
+from onnx_chainer import export
+from onnx_chainer import optimizer
+from onnx_chainer.optimizer import OptimizationGraph
+from onnx_chainer.optimizer import PassManager
+from onnx_chainer import Profiler
+from onnx_chainer.trace_cache import TraceCache
+
+
+@pytest.fixture(scope='function')
+def model():
+    return chainer.Sequential(
+        L.Convolution2D(3, 4, 3, 1, 1),
+        F.relu,
+        lambda h: F.copy(h, -1),
+        L.Linear(4 * 8 * 8, 10),
+    )
+
+
+@pytest.fixture(scope='function')
+def x():
+    return np.random.rand(2, 3, 8, 8).astype(np.float32)
+
+
+def remove_identity(graph):
+    for node in list(graph.nodes):
+        if node.op_type == 'Identity' and\
+                node.output[0] not in graph.output_names:
+            graph.replace_input(node.output[0], node.input[0])
+            graph.remove_nodes([node])
+
+
+def test_optimize_level_0(model, x):
+    assert export(model, x, optimize=0) == export(model, x)
+
+
+def test_pass_manager(model, x):
+    pass_manager = PassManager(
+        passes=[remove_identity, 'eliminate_unused_initializers'])
+    profiler = Profiler()
+    onnx_model = export(model, x, optimize=pass_manager, profile=profiler)
+    onnx.checker.check_model(onnx_model)
+    assert 'Identity' not in [n.op_type for n in onnx_model.graph.node]
+
+    stats = pass_manager.stats
+    assert [s['name'] for s in stats] ==\
+        ['remove_identity', 'eliminate_unused_initializers']
+    assert stats[0]['nodes_before'] == stats[0]['nodes_after'] + 1
+    summary = profiler.summary()
+    assert ('phase', 'optimize') in summary
+    assert ('pass', 'remove_identity') in summary
+
+    f = io.StringIO()
+    pass_manager.print_report(file=f)
+    lines = f.getvalue().splitlines()
+    assert lines[0].split() ==\
+        ['Pass', 'ElapsedTime', 'Nodes', 'Initializers', 'Bytes']
+    assert len(lines) == 4
+    assert lines[-1].startswith('Removed 1 nodes')
+
+
+def test_registered_passes():
+    assert optimizer.get_passes(0) == []
+    names = [name for name, _ in optimizer.get_passes(1)]
+    assert 'eliminate_unused_initializers' in names
+    assert len(optimizer.get_passes(2)) >= len(names)
+
+
+@pytest.mark.parametrize('optimize', [3, -1])
+def test_invalid_level(model, x, optimize):
+    with pytest.raises(ValueError):
+        export(model, x, optimize=optimize)
+
+
+def test_unknown_pass():
+    with pytest.raises(ValueError):
+        PassManager(passes=['unknown_pass'])
+
+
+def test_eliminate_unused_initializers():
+    used = np.ones((2, 3), dtype=np.float32)
+    unused = np.zeros((3,), dtype=np.float32)
+    nodes = [helper.make_node('Relu', ['W'], ['y'])]
+    inputs = [helper.make_tensor_value_info(
+        name, TensorProto.FLOAT, v.shape)
+        for name, v in (('W', used), ('b', unused))]
+    outputs = [helper.make_tensor_value_info('y', TensorProto.FLOAT, (2, 3))]
+    graph = OptimizationGraph(
+        nodes, [('W', used), ('b', unused)], inputs, outputs, 11)
+    PassManager(level=1).run(graph)
+    assert list(graph.initializers) == ['W']
+    assert [i.name for i in graph.inputs] == ['W']
+
+
+def test_added_initializer_not_cached(model, x):
+    def add_initializer(graph):
+        name = graph.add_initializer('param_0_W', np.zeros((1,), np.float32))
+        assert name == 'param_0_W_1'
+        graph.nodes.append(helper.make_node('Identity', [name], ['unused']))
+
+    cache = TraceCache()
+    export(model, x, trace_cache=cache,
+           optimize=PassManager(passes=[add_initializer]))
+    assert len(cache) == 0
+    export(model, x, trace_cache=cache, optimize=1)
+    assert len(cache) == 1
@@ -0,0 +1,98 @@
+import chainer
+import chainer.functions as F
+from onnx import helper
+from onnx import TensorProto
+
+from onnx_chainer.optimizer import OptimizationGraph
+from onnx_chainer.optimizer import PassManager
+from onnx_chainer.testing import input_generator
+from tests.helper import ONNXModelTest
+
+
+@chainer.testing.parameterize(
+    {'name': 'reshape_chain', 'input_shapes': None,
+     'op_types': ['Constant', 'Reshape']},
+    {'name': 'reshape_chain_dynamic', 'input_shapes': [('N', 3, 4)],
+     'op_types': ['Constant', 'Reshape']},
+)
+class TestMergeReshapes(ONNXModelTest):
+
+    def test_output(self):
+        def f(x):
+            h = F.squeeze(F.reshape(x, (2, 1, 12)), 1)
+            return F.reshape(F.expand_dims(h, 0), (-1, 8))
+
+        def check_merged(onnx_model):
+            op_types = [n.op_type for n in onnx_model.graph.node]
+            assert op_types == self.op_types
+
+        x = input_generator.increasing(2, 3, 4)
+        self.expect(chainer.Sequential(f), x, name='merge_' + self.name,
+                    custom_model_test_func=check_merged, optimize=1,
+                    input_shapes=self.input_shapes)
+
+
+@chainer.testing.parameterize(
+    {'name': 'static', 'input_shapes': None},
+    {'name': 'dynamic', 'input_shapes': [('N', 3, 4)]},
+)
+class TestCancelSeparateAndStack(ONNXModelTest):
+
+    def test_output(self):
+        def check_cancelled(onnx_model):
+            op_types = [n.op_type for n in onnx_model.graph.node]
+            assert op_types == ['Identity']
+
+        model = chainer.Sequential(lambda x: F.stack(F.separate(x, 1), 1))
+        x = input_generator.increasing(2, 3, 4)
+        self.expect(model, x, name='cancel_separate_' + self.name,
+                    custom_model_test_func=check_cancelled, optimize=1,
+                    input_shapes=self.input_shapes)
+
+
+class TestMergeStack(ONNXModelTest):
+
+    def test_output(self):
+        def check_merged(onnx_model):
+            op_types = [n.op_type for n in onnx_model.graph.node]
+            assert 'Unsqueeze' not in op_types
+            assert op_types.count('Concat') == 1
+            assert op_types[-1] == 'Reshape'
+
+        model = chainer.Sequential(lambda x: F.stack([x, x * 2, x * 3], 1))
+        x = input_generator.increasing(2, 3, 4)
+        self.expect(model, x, name='merge_stack',
+                    custom_model_test_func=check_merged, optimize=1)
+
+
+class TestMergeConcats(ONNXModelTest):
+
+    def test_output(self):
+        def check_merged(onnx_model):
+            op_types = [n.op_type for n in onnx_model.graph.node]
+            assert op_types.count('Concat') == 1
+            assert len(onnx_model.graph.node[-1].input) == 3
+
+        model = chainer.Sequential(
+            lambda x: F.concat([F.concat([x, x * 2], 1), x * 3], 1))
+        x = input_generator.increasing(2, 3, 4)
+        self.expect(model, x, name='merge_concats',
+                    custom_model_test_func=check_merged, optimize=1)
+
+
+def test_shared_reshape_is_kept():
+    nodes = [
+        helper.make_node('Unsqueeze', ['x'], ['h'], axes=[0]),
+        helper.make_node('Squeeze', ['h'], ['y'], axes=[0]),
+        helper.make_node('Relu', ['h'], ['z']),
+    ]
+    graph = OptimizationGraph(
+        nodes, [],
+        [helper.make_tensor_value_info('x', TensorProto.FLOAT, (2, 3))],
+        [helper.make_tensor_value_info(name, TensorProto.FLOAT, None)
+         for name in ('y', 'z')], 10,
+        value_shapes={'x': (2, 3), 'h': (1, 2, 3), 'y': (2, 3)})
+    PassManager(passes=['simplify_shape_ops']).run(graph)
+    # The intermediate used by Relu is not merged
+    assert [n.op_type for n in graph.nodes] == ['Unsqueeze', 'Squeeze', 'Relu']
+    assert not graph.initializers
@@ -0,0 +1,122 @@
+import chainer
+import chainer.functions as F
+import numpy as np
+from onnx import helper
+from onnx import TensorProto
+import pytest
+
+from onnx_chainer.optimizer import OptimizationGraph
+from onnx_chainer.optimizer.graph import get_attribute
+from onnx_chainer.optimizer.transpose import optimize_transposes
+from onnx_chainer.testing import input_generator
+from tests.helper import ONNXModelTest
+
+
+class TestCancelTransposes(ONNXModelTest):
+
+    def test_output(self):
+        def check_cancelled(onnx_model):
+            op_types = [n.op_type for n in onnx_model.graph.node]
+            assert op_types == ['Relu', 'Tanh']
+
+        def f(x):
+            h = F.relu(F.transpose(x, (0, 2, 3, 1)))
+            return F.tanh(F.transpose(h, (0, 3, 1, 2)))
+
+        x = input_generator.increasing(2, 3, 4, 5)
+        self.expect(chainer.Sequential(f), x, name='cancel_transposes',
+                    custom_model_test_func=check_cancelled, optimize=1)
+
+
+class TestSinkTransposes(ONNXModelTest):
+
+    def test_output(self):
+        def check_sunk(onnx_model):
+            op_types = [n.op_type for n in onnx_model.graph.node]
+            assert op_types == ['Add', 'Constant', 'Mul', 'Transpose']
+
+        def f(x, y):
+            h = F.transpose(x, (1, 0, 2)) + F.transpose(y, (1, 0, 2))
+            return h * 2
+
+        x = input_generator.increasing(2, 3, 4)
+        y = input_generator.nonzero_increasing(2, 3, 4)
+        self.expect(chainer.Sequential(f), (x, y), name='sink_transposes',
+                    custom_model_test_func=check_sunk, optimize=1)
+
+
+class TestAbsorbTranspose(ONNXModelTest):
+
+    def test_output(self):
+        def check_absorbed(onnx_model):
+            op_types = [n.op_type for n in onnx_model.graph.node]
+            if onnx_model.opset_import[0].version >= 11:
+                assert op_types == ['Gemm']
+                assert get_attribute(onnx_model.graph.node[0], 'transB') == 1
+            else:
+                assert op_types == ['Transpose', 'MatMul']
+
+        def f(x, w):
+            return F.matmul(x, F.transpose(w))
+
+        x = input_generator.increasing(3, 4)
+        w = input_generator.increasing(5, 4)
+        self.expect(chainer.Sequential(f), (x, w), name='absorb_transpose',
+                    custom_model_test_func=check_absorbed, optimize=1)
+
+
+@pytest.mark.parametrize('perms,expected', [
+    ([[0, 2, 1], [0, 2, 1]], []),
+    ([[1, 2, 0], [1, 2, 0]], [[2, 0, 1]]),
+    ([[2, 0, 1], None], [[1, 0, 2]]),
+])
+def test_compose_transposes(perms, expected):
+    nodes = []
+    name = 'x'
+    for i, perm in enumerate(perms):
+        kwargs = {} if perm is None else {'perm': perm}
+        nodes.append(helper.make_node(
+            'Transpose', [name], ['t{}'.format(i)], **kwargs))
+        name = 't{}'.format(i)
+    nodes.append(helper.make_node('Softmax', [name], ['y']))
+    graph = OptimizationGraph(
+        nodes, [],
+        [helper.make_tensor_value_info('x', TensorProto.FLOAT, (2, 3, 4))],
+        [helper.make_tensor_value_info('y', TensorProto.FLOAT, None)], 11)
+    optimize_transposes(graph)
+
+    transposes = [n for n in graph.nodes if n.op_type == 'Transpose']
+    assert [get_attribute(n, 'perm') for n in transposes] == expected
+    assert graph.nodes[-1].op_type == 'Softmax'
+    # The composed permutation transposes as the original ones
+    x = np.random.rand(2, 3, 4)
+    y = x
+    for perm in perms:
+        y = y.transpose(perm)
+    for perm in expected:
+        x = x.transpose(perm)
+    np.testing.assert_array_equal(x, y)
+
+
+@pytest.mark.parametrize('x_shape,absorbed', [
+    ((4, 2), True),
+    ((4, 3, 2), False),
+])
+def test_absorb_transpose_without_perm(x_shape, absorbed):
+    # Transpose without perm reverses all the dimensions
+    nodes = [helper.make_node('Transpose', ['x'], ['t']),
+             helper.make_node('MatMul', ['t', 'w'], ['y'])]
+    graph = OptimizationGraph(
+        nodes, [],
+        [helper.make_tensor_value_info('x', TensorProto.FLOAT, x_shape),
+         helper.make_tensor_value_info('w', TensorProto.FLOAT, (4, 5))],
+        [helper.make_tensor_value_info('y', TensorProto.FLOAT, None)], 11,
+        value_shapes={'w': (4, 5)})
+    optimize_transposes(graph)
+
+    op_types = [n.op_type for n in graph.nodes]
+    if absorbed:
+        assert op_types == ['Gemm']
+        assert get_attribute(graph.nodes[0], 'transA') == 1
+    else:
+        assert op_types == ['Transpose', 'MatMul']
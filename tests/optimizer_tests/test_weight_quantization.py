@@ -0,0 +1,97 @@
+import io
+import warnings
+
+import chainer
+import chainer.functions as F
+import chainer.links as L
+import numpy as np
+import pytest
+
+from onnx_chainer import export
+from onnx_chainer.optimizer import weight_quantization
+from onnx_chainer.optimizer import WeightQuantizer
+from onnx_chainer.testing import input_generator
+
+
+def _run(onnx_model, x):
+    ort = pytest.importorskip('onnxruntime')
+    sess = ort.InferenceSession(onnx_model.SerializeToString())
+    initializers = {t.name for t in onnx_model.graph.initializer}
+    input_name = [i.name for i in onnx_model.graph.input
+                  if i.name not in initializers][0]
+    return sess.run(None, {input_name: x})
+
+
+@pytest.mark.parametrize('dtype', [np.int8, np.uint8])
+def test_quantize_per_channel(monkeypatch, dtype):
+    array = np.random.randn(5, 3, 4).astype(np.float32)
+    array[1] = 0
+    array[2] = np.abs(array[2])
+    expected = weight_quantization.quantize_per_channel(array, dtype)
+    # Channels are quantized independently of chunks
+    monkeypatch.setattr(weight_quantization, 'QUANTIZATION_CHUNK_SIZE', 100)
+    quantized, scale, zero_point, max_error = \
+        weight_quantization.quantize_per_channel(array, dtype)
+    np.testing.assert_array_equal(quantized, expected[0])
+    np.testing.assert_array_equal(scale, expected[1])
+    np.testing.assert_array_equal(zero_point, expected[2])
+    assert max_error == expected[3]
+
+    assert quantized.dtype == dtype and zero_point.dtype == dtype
+    dequantized = (quantized.astype(np.float32) -
+                   zero_point[:, None, None]) * scale[:, None, None]
+    assert np.abs(dequantized - array).max() == pytest.approx(max_error)
+    assert np.all(np.abs(dequantized - array) <=
+                  scale[:, None, None] / 2 + 1e-6)
+    np.testing.assert_array_equal(dequantized[1], 0)
+
+
+@pytest.mark.parametrize('dtype', ['int8', 'uint8'])
+@pytest.mark.parametrize('opset_version', [7, 9, 10, 13])
+def test_quantize_weights(dtype, opset_version):
+    model = chainer.Sequential(
+        L.Convolution2D(3, 16, 3), F.relu, L.Linear(16 * 6 * 6, 10))
+    x = input_generator.increasing(2, 3, 8, 8)
+    quantizer = WeightQuantizer(dtype)
+    # Opset version 13 is not tested by converters
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        fp32_model = export(model, x, opset_version=opset_version)
+        onnx_model = export(model, x, opset_version=opset_version,
+                            quantize_weights=quantizer)
+
+    initializers = {t.name: t for t in onnx_model.graph.initializer}
+    # Biases are small
+    assert 'param_0_b' in initializers and 'param_0_W' not in initializers
+    assert 'param_0_W_quantized' in initializers
+    op_types = [n.op_type for n in onnx_model.graph.node]
+    if opset_version >= 13:
+        assert op_types.count('DequantizeLinear') == 2
+    else:
+        assert op_types.count('Cast') == 2
+        assert 'DequantizeLinear' not in op_types
+    assert onnx_model.ByteSize() < fp32_model.ByteSize() * 0.35
+
+    assert [s['name'] for s in quantizer.stats] == ['param_0_W', 'param_1_W']
+    for s in quantizer.stats:
+        assert s['bytes_after'] < s['bytes_before'] * 0.5
+    out = io.StringIO()
+    quantizer.print_report(out)
+    lines = out.getvalue().splitlines()
+    assert len(lines) == 4
+    assert lines[0].split() == ['Parameter', 'Shape', 'Bytes', 'MaxError']
+    assert lines[1].split()[:2] == ['param_0_W', '16x3x3x3']
+
+    expected = model(x).array
+    np.testing.assert_allclose(
+        _run(onnx_model, x)[0], expected,
+        atol=np.abs(expected).max() * 0.02)
+
+
+def test_quantize_weights_invalid():
+    model = chainer.Sequential(L.Linear(5, 3))
+    x = input_generator.increasing(2, 5)
+    with pytest.raises(ValueError):
+        export(model, x, quantize_weights='int4')
+    with pytest.raises(ValueError):
+        export(model, x, quantize_weights='int8', precision='fp16')
@@ -0,0 +1,94 @@
+import chainer
+import chainer.functions as F
+import chainer.links as L
+import numpy as np
+import pytest
+
+from onnx_chainer import export
+from onnx_chainer import export_testcase
+from onnx_chainer import placeholder
+
+
+class Model(chainer.Chain):
+
+    def __init__(self):
+        super(Model, self).__init__()
+        with self.init_scope():
+            self.conv = L.Convolution2D(3, 8, 3, 1, 1)
+            self.bn = L.BatchNormalization(8)
+            self.dconv = L.Deconvolution2D(8, 4, 4, 2, 1)
+            self.conv_nd = L.ConvolutionND(2, 4, 4, 3, 2, 1)
+            self.linear = L.Linear(None, 10)
+            self.embed = L.EmbedID(5, 10)
+
+    def forward(self, x, t):
+        h = F.relu(self.bn(self.conv(x)))
+        h = F.max_pooling_2d(h, 2)
+        h = F.average_pooling_2d(self.dconv(h), 3, 1, 1)
+        h = F.concat((h, F.sigmoid(h)), axis=1)
+        h = F.pad(h[:, :4], ((0, 0), (0, 0), (1, 1), (2, 2)), 'constant')
+        h = self.conv_nd(F.tile(h, (1, 1, 2, 1)))
+        h = F.resize_images(h, (6, 6))
+        h = self.linear(F.dropout(h))
+        h = F.matmul(h, self.embed(t), transb=True) + F.sum(h, axis=1)
+        return F.softmax(F.cast(h, np.float64)), F.argmax(h, axis=1)
+
+
+@pytest.fixture(scope='function')
+def model():
+    model = Model()
+    # Initialize lazy parameters beforehand to replace them with placeholders
+    model.linear._initialize_params(4 * 6 * 6)
+    return model
+
+
+def test_abstract_trace(model):
+    x = np.random.rand(2, 3, 16, 16).astype(np.float32)
+    t = np.array([1, 3], dtype=np.int32)
+    # resize_images is warned on its conversion
+    with pytest.warns(UserWarning):
+        expected = export(model, (x, t))
+
+    x = placeholder(x.shape, np.float32)
+    t = placeholder(t.shape, np.int32)
+    with pytest.warns(UserWarning):
+        onnx_model, _, outputs = export(
+            model, (x, t), abstract_trace=True, return_named_inout=True)
+
+    assert onnx_model.graph == expected.graph
+    for name, var in outputs.items():
+        # Outputs are not computed but made from shapes
+        assert var.array.strides == (0,) * var.ndim
+
+
+def test_abstract_trace_without_params(model):
+    for p in model.params():
+        p.array = placeholder(p.shape, p.dtype)
+    model.bn.avg_mean = placeholder(model.bn.avg_mean.shape)
+    model.bn.avg_var = placeholder(model.bn.avg_var.shape)
+
+    x = placeholder((1, 3, 16, 16), np.float32)
+    t = placeholder((1,), np.int32)
+    with pytest.warns(UserWarning):
+        onnx_model = export(
+            model, (x, t), export_params=False, abstract_trace=True)
+
+    assert len(onnx_model.graph.initializer) == 0
+    out_shapes = [[d.dim_value for d in o.type.tensor_type.shape.dim]
+                  for o in onnx_model.graph.output]
+    assert sorted(out_shapes) == [[1], [1, 1]]
+
+
+def test_placeholder():
+    x = placeholder((1000, 1000), np.float16)
+    assert x.shape == (1000, 1000)
+    assert x.dtype == np.float16
+    assert x.strides == (0, 0)
+    assert x.base.nbytes == 2
+
+
+def test_export_testcase_abstract_trace(tmpdir, model):
+    x = placeholder((1, 3, 16, 16), np.float32)
+    t = placeholder((1,), np.int32)
+    with pytest.raises(ValueError):
+        export_testcase(model, (x, t), str(tmpdir), abstract_trace=True)
@@ -0,0 +1,47 @@
+import sys
+
+import chainer
+import chainer.functions as F
+import chainer.links as L
+import numpy as np
+import pytest
+
+from onnx_chainer.bench import precision
+
+
+def test_run(capsys):
+    model = chainer.Sequential(L.Linear(5, 64), F.relu, L.Linear(64, 3))
+    xs = precision.random_inputs([(2, 5)])
+    calibration = [precision.random_inputs([(2, 5)])]
+    with chainer.using_config('train', False):
+        results = precision.run(
+            model, xs, n_trials=1, calibration=calibration)
+
+    assert [name for name, _ in results] == [
+        'chainer', 'fp32', 'fp16', 'int8']
+    sizes = {name: r['size'] for name, r in results}
+    assert sizes['fp16'] < sizes['fp32']
+    if precision.ONNXRUNTIME_AVAILABLE:
+        errors = {name: r['max_error'] for name, r in results}
+        assert errors['fp32'] < 1e-5
+        assert errors['fp16'] < 1e-2
+        assert errors['int8'] < 1e-1
+
+    precision.print_results(results)
+    lines = capsys.readouterr().out.splitlines()
+    assert [line.split()[0] for line in lines] == [
+        'precision', 'chainer', 'fp32', 'fp16', 'int8']
+
+
+def test_main_help(monkeypatch, capsys):
+    monkeypatch.setattr(sys, 'argv', ['precision', '--help'])
+    with pytest.raises(SystemExit) as e:
+        precision.main()
+    assert e.value.code == 0
+    assert '--precisions' in capsys.readouterr().out
+
+
+def test_load_factory():
+    assert precision.load_factory('numpy:random.rand') is np.random.rand
+    with pytest.raises(ValueError):
+        precision.load_factory('numpy')
@@ -0,0 +1,115 @@
+import json
+import os
+
+import chainer
+import chainer.functions as F
+import chainer.links as L
+import numpy as np
+import pytest
+
+from onnx_chainer.calibration import ActivationRecorder
+from onnx_chainer.calibration import ActivationStatistics
+from onnx_chainer import export
+
+
+def _read_statistics(onnx_model, key='activation_statistics'):
+    props = {p.key: p.value for p in onnx_model.metadata_props}
+    return json.loads(props[key])
+
+
+def test_activation_statistics():
+    s = ActivationStatistics(bins=64)
+    xs = [np.linspace(0, 1, 1001, dtype=np.float32),
+          np.linspace(-3, 0, 3001, dtype=np.float32),
+          np.array([np.nan, np.inf, 5, 5], dtype=np.float32)]
+    for x in xs:
+        s.update(x)
+    values = np.concatenate([xs[0], xs[1], [5, 5]])
+
+    assert s.count == values.size
+    assert s.min == -3 and s.max == 5
+    assert s.mean == pytest.approx(values.mean())
+    assert s.counts.sum() == values.size
+    assert s.low <= -3 and s.low + s.width >= 5
+    for q in (1, 50, 99):
+        assert s.percentile(q) == pytest.approx(
+            np.percentile(values, q), abs=s.width / s.bins)
+    assert s.percentile(100) == 5
+
+    d = s.to_dict(percentiles=(50,))
+    assert set(d) == {'count', 'min', 'max', 'mean', 'percentiles',
+                      'histogram'}
+    assert list(d['percentiles']) == ['50']
+    assert len(d['histogram']['counts']) == 64
+
+
+def test_activation_statistics_without_histogram():
+    s = ActivationStatistics(bins=0)
+    s.update(np.array([1, 2, 6], dtype=np.float32))
+    assert (s.min, s.max, s.mean) == (1, 6, 3)
+    assert s.percentile(50) is None
+    assert 'histogram' not in s.to_dict()
+    with pytest.raises(ValueError):
+        ActivationStatistics(bins=3)
+
+
+def test_record_activations():
+    model = chainer.Sequential(L.Linear(5, 3), F.relu)
+    xs = [np.full((2, 5), v, dtype=np.float32) for v in (1, 3, -2)]
+    recorder = ActivationRecorder(percentiles=(50,))
+    onnx_model = export(model, xs[0], record_activations=recorder,
+                        calibration=xs[1:])
+
+    statistics = _read_statistics(onnx_model)
+    assert set(statistics) == {'Input_0', 'LinearFunction_0', 'ReLU_0'}
+    # Values of all the batches are merged
+    assert statistics['Input_0']['min'] == -2
+    assert statistics['Input_0']['max'] == 3
+    assert statistics['Input_0']['count'] == 30
+    assert statistics['ReLU_0']['min'] >= 0
+    assert list(statistics['ReLU_0']['percentiles']) == ['50']
+    assert recorder.statistics['Input_0'].mean == pytest.approx(2 / 3.)
+
+    expected = np.concatenate([model(x).array for x in xs])
+    assert statistics['ReLU_0']['max'] == pytest.approx(expected.max())
+
+
+def test_record_activations_file(tmpdir):
+    model = chainer.Sequential(L.Convolution2D(3, 4, 3), F.relu)
+    x = np.random.rand(2, 3, 6, 6).astype(np.float32)
+    path = os.path.join(str(tmpdir), 'activations.json')
+    onnx_model = export(
+        model, x, record_activations=ActivationRecorder(filename=path))
+
+    assert len(onnx_model.metadata_props) == 0
+    with open(path) as f:
+        statistics = json.load(f)
+    assert set(statistics) == {
+        'Input_0', 'Convolution2DFunction_0', 'ReLU_0'}
+
+
+@pytest.mark.parametrize('opset_version', [7, 10])
+def test_record_activations_fp32(opset_version):
+    model = chainer.Sequential(L.Linear(5, 3), F.relu)
+    x = np.random.rand(2, 5).astype(np.float32)
+    expected = export(model, x, opset_version=opset_version, optimize=1)
+    onnx_model = export(model, x, opset_version=opset_version, optimize=1,
+                        record_activations=True)
+
+    # Only statistics are added to the float32 model
+    op_types = [n.op_type for n in onnx_model.graph.node]
+    assert 'QuantizeLinear' not in op_types
+    assert 'DequantizeLinear' not in op_types
+    assert onnx_model.graph == expected.graph
+    assert 'ReLU_0' in _read_statistics(onnx_model)
+
+
+def test_record_activations_invalid():
+    model = chainer.Sequential(
+        lambda x: F.relu(x) if x.shape[0] > 1 else x, L.Linear(5, 3))
+    x = np.random.rand(2, 5).astype(np.float32)
+    with pytest.raises(ValueError):
+        export(model, x, record_activations=True, online_conversion=True)
+    with pytest.raises(ValueError):
+        # Calibration inputs are computed by other function nodes
+        export(model, x, record_activations=True, calibration=[x[:1]])
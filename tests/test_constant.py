@@ -0,0 +1,73 @@
+import os
+import time
+
+import chainer
+import numpy as np
+import onnx
+from onnx import numpy_helper
+import pytest
+
+from onnx_chainer.context import _tensor_from_array_for_constant
+from onnx_chainer.context import CONSTANT_RAW_DATA_THRESHOLD
+from onnx_chainer import export
+from onnx_chainer.external_data import get_external_data
+
+
+def _constant_tensors(onnx_model):
+    return [n.attribute[0].t for n in onnx_model.graph.node
+            if n.op_type == 'Constant']
+
+
+@pytest.mark.parametrize('size,raw', [(4, False), (1000, True)])
+def test_constant_raw_data(size, raw):
+    array = np.arange(size, dtype=np.int64)
+    tensor = _tensor_from_array_for_constant(array, 'c')
+    assert tensor.HasField('raw_data') == raw
+    assert (len(tensor.int64_data) == 0) == raw
+    np.testing.assert_array_equal(numpy_helper.to_array(tensor), array)
+
+
+def _getitem_model(indices):
+    return chainer.Sequential(lambda x: x[:, indices])
+
+
+def test_export_large_constant():
+    indices = np.random.randint(0, 10, size=1000).astype(np.int64)
+    x = np.random.rand(2, 10).astype(np.float32)
+    onnx_model = export(_getitem_model(indices), x)
+    tensor, = _constant_tensors(onnx_model)
+    assert tensor.HasField('raw_data')
+    np.testing.assert_array_equal(numpy_helper.to_array(tensor), indices)
+
+
+def test_export_large_constant_external_data(tmpdir):
+    indices = np.random.randint(0, 10, size=1000).astype(np.int64)
+    x = np.random.rand(2, 10).astype(np.float32)
+    filename = os.path.join(str(tmpdir), 'model.onnx')
+    onnx_model = export(_getitem_model(indices), x, filename=filename,
+                        external_data=True)
+    assert _constant_tensors(onnx_model) == []
+    tensor, = onnx_model.graph.initializer
+    assert get_external_data(tensor) is not None
+
+    loaded = onnx.load(filename)
+    np.testing.assert_array_equal(
+        numpy_helper.to_array(loaded.graph.initializer[0]), indices)
+
+
+@pytest.mark.slow
+def test_constant_encoding_benchmark():
+    array = np.arange(1000000, dtype=np.int64)
+
+    start = time.perf_counter()
+    _tensor_from_array_for_constant(
+        array, 'c', raw_data_threshold=array.nbytes + 1)
+    typed_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    tensor = _tensor_from_array_for_constant(array, 'c')
+    raw_time = time.perf_counter() - start
+
+    assert array.nbytes >= CONSTANT_RAW_DATA_THRESHOLD
+    assert len(tensor.raw_data) == array.nbytes
+    assert raw_time * 3 < typed_time
@@ -0,0 +1,105 @@
+import os
+
+import chainer
+import chainer.functions as F
+import chainer.links as L
+import numpy as np
+import onnx
+import pytest
+
+from onnx_chainer import export
+from onnx_chainer import export_testcase
+from onnx_chainer.external_data import get_external_data
+from onnx_chainer.onnx_helper import cleanse_param_name
+
+
+@pytest.fixture(scope='function')
+def model():
+    return chainer.Sequential(
+        L.Convolution2D(None, 16, 5, 1, 2),
+        F.relu,
+        L.Convolution2D(16, 8, 5, 1, 2),
+        F.relu,
+        L.Linear(None, 10),
+    )
+
+
+@pytest.fixture(scope='function')
+def x():
+    return np.random.rand(2, 3, 8, 8).astype(np.float32)
+
+
+@pytest.mark.parametrize('external_data,location', [
+    (True, 'model.onnx.data'), ('weights.bin', 'weights.bin')])
+def test_external_data(tmpdir, model, x, external_data, location):
+    path = str(tmpdir)
+    filename = os.path.join(path, 'model.onnx')
+    export(model, x, filename=filename, external_data=external_data)
+
+    assert os.path.isfile(os.path.join(path, location))
+    with open(filename, 'rb') as f:
+        onnx_model = onnx.load_model(f, load_external_data=False)
+    tensors = {t.name: t for t in onnx_model.graph.initializer}
+    params = {cleanse_param_name(name): chainer.cuda.to_cpu(p.array)
+              for name, p in model.namedparams()}
+    assert set(tensors) == set(params)
+    for name, tensor in tensors.items():
+        info = get_external_data(tensor)
+        if params[name].nbytes < 1024:
+            assert info is None
+            continue
+        assert info['location'] == location
+        assert info['length'] == params[name].nbytes
+        assert info['offset'] % 64 == 0
+        assert not tensor.HasField('raw_data')
+
+    # ONNX loader reads external data next to the model
+    onnx_model = onnx.load(filename)
+    for tensor in onnx_model.graph.initializer:
+        np.testing.assert_array_equal(
+            onnx.numpy_helper.to_array(tensor), params[tensor.name])
+
+
+def test_external_data_memmap(tmpdir, model, x):
+    path = str(tmpdir)
+    filename = os.path.join(path, 'model.onnx')
+    export(model, x, filename=filename, external_data=True)
+
+    onnx_model = onnx.load(filename, load_external_data=False)
+    weights = np.memmap(filename + '.data', dtype=np.uint8, mode='r')
+    for name, param in model.namedparams():
+        tensor = [t for t in onnx_model.graph.initializer
+                  if t.name == cleanse_param_name(name)][0]
+        info = get_external_data(tensor)
+        if info is None:
+            continue
+        begin, end = info['offset'], info['offset'] + info['length']
+        actual = weights[begin:end].view(np.float32).reshape(param.shape)
+        np.testing.assert_array_equal(actual, param.array)
+
+
+def test_external_data_without_params(tmpdir, model, x):
+    path = str(tmpdir)
+    filename = os.path.join(path, 'model.onnx')
+    onnx_model = export(
+        model, x, filename=filename, export_params=False, external_data=True)
+    assert len(onnx_model.graph.initializer) == 0
+    assert not os.path.exists(filename + '.data')
+
+
+@pytest.mark.parametrize('filename', [None, 'absolute'])
+def test_external_data_invalid_location(tmpdir, model, x, filename):
+    external_data = True
+    if filename == 'absolute':
+        filename = os.path.join(str(tmpdir), 'model.onnx')
+        external_data = os.path.join(str(tmpdir), 'model.data')
+    with pytest.raises(ValueError):
+        export(model, x, filename=filename, external_data=external_data)
+
+
+def test_export_testcase_external_data(
+        tmpdir, model, x, check_model_expect):
+    path = str(tmpdir)
+    export_testcase(model, (x,), path, external_data=True)
+    assert os.path.isfile(os.path.join(path, 'model.onnx.data'))
+    check_model_expect(path)
@@ -0,0 +1,121 @@
+import chainer
+import chainer.functions as F
+import chainer.links as L
+import numpy as np
+import onnx
+import pytest
+
+from onnx_chainer import export
+from onnx_chainer.testing import input_generator
+
+
+class Model(chainer.Chain):
+
+    def __init__(self):
+        super(Model, self).__init__()
+        with self.init_scope():
+            self.conv = L.Convolution2D(3, 4, 3, 1, 1)
+            self.bn = L.BatchNormalization(4)
+            self.linear = L.Linear(4 * 8 * 8, 10)
+
+    def forward(self, x):
+        return F.softmax(self.linear(F.relu(self.bn(self.conv(x)))))
+
+
+class SharedParamModel(chainer.Chain):
+
+    def __init__(self):
+        super(SharedParamModel, self).__init__()
+        with self.init_scope():
+            self.p = chainer.Parameter(
+                np.random.rand(5).astype(np.float32))
+
+    def forward(self, x):
+        return x * self.p + self.p
+
+
+def _run(onnx_model, x):
+    ort = pytest.importorskip('onnxruntime')
+    sess = ort.InferenceSession(onnx_model.SerializeToString())
+    initializers = {t.name for t in onnx_model.graph.initializer}
+    input_name = [i.name for i in onnx_model.graph.input
+                  if i.name not in initializers][0]
+    return sess.run(None, {input_name: x})
+
+
+def _initializer_types(onnx_model):
+    return {t.name: t.data_type for t in onnx_model.graph.initializer}
+
+
+def _expected(model, x):
+    with chainer.using_config('train', False):
+        return model(x).array
+
+
+@pytest.mark.parametrize('optimize', [0, 2])
+@pytest.mark.parametrize('online_conversion', [False, True])
+def test_float16(optimize, online_conversion):
+    model = Model()
+    x = input_generator.increasing(2, 3, 8, 8)
+    fp32_model = export(model, x, optimize=optimize)
+    onnx_model = export(model, x, optimize=optimize, precision='fp16',
+                        online_conversion=online_conversion)
+
+    # Inputs and outputs of the graph keep float32
+    for value_info in list(onnx_model.graph.output) + [
+            i for i in onnx_model.graph.input
+            if i.name not in _initializer_types(onnx_model)]:
+        assert value_info.type.tensor_type.elem_type ==\
+            onnx.TensorProto.FLOAT
+    types = _initializer_types(onnx_model)
+    assert types['param_linear_W'] == onnx.TensorProto.FLOAT16
+    if optimize == 0:
+        # Batch normalization is computed in float32
+        assert types['param_conv_W'] == onnx.TensorProto.FLOAT16
+        assert types['param_bn_avg_var'] == onnx.TensorProto.FLOAT
+    assert onnx_model.ByteSize() < fp32_model.ByteSize() * 0.6
+
+    np.testing.assert_allclose(
+        _run(onnx_model, x)[0], _expected(model, x), rtol=1e-2, atol=1e-2)
+
+
+def test_float16_keep_fp32():
+    model = Model()
+    x = input_generator.increasing(2, 3, 8, 8)
+    onnx_model = export(
+        model, x, precision='fp16', keep_fp32=[model.conv, 'ReLU'])
+
+    types = _initializer_types(onnx_model)
+    assert types['param_conv_W'] == onnx.TensorProto.FLOAT
+    assert types['param_linear_W'] == onnx.TensorProto.FLOAT16
+    # Only the boundary before Linear is casted
+    casts = [n for n in onnx_model.graph.node if n.op_type == 'Cast']
+    assert [onnx.helper.get_attribute_value(n.attribute[0])
+            for n in casts] == [onnx.TensorProto.FLOAT16,
+                                onnx.TensorProto.FLOAT]
+
+    np.testing.assert_allclose(
+        _run(onnx_model, x)[0], _expected(model, x), rtol=1e-2, atol=1e-2)
+
+
+def test_float16_shared_param():
+    model = SharedParamModel()
+    x = input_generator.increasing(2, 5)
+    onnx_model = export(model, x, precision='fp16', keep_fp32=['Add'])
+
+    types = _initializer_types(onnx_model)
+    assert types == {'param_p': onnx.TensorProto.FLOAT,
+                     'param_p_fp16': onnx.TensorProto.FLOAT16}
+    np.testing.assert_allclose(
+        _run(onnx_model, x)[0], _expected(model, x), rtol=1e-2, atol=1e-2)
+
+
+def test_invalid_precision():
+    model = Model()
+    x = input_generator.increasing(2, 3, 8, 8)
+    with pytest.raises(ValueError):
+        export(model, x, precision='fp8')
+    with pytest.raises(ValueError):
+        export(model, x, keep_fp32=[model.conv])
+    with pytest.raises(TypeError):
+        export(model, x, precision='fp16', keep_fp32=[1])
@@ -0,0 +1,55 @@
+import time
+
+import chainer
+import chainer.functions as F
+import numpy as np
+import pytest
+
+from onnx_chainer.context import Context
+from onnx_chainer.graph import Graph
+from onnx_chainer import mapping
+
+
+def _chain(n_functions):
+    x = chainer.Variable(np.zeros((1,), dtype=np.float32))
+    h = x
+    for i in range(n_functions):
+        # Fan-out to the same variable, duplicated candidates are visited
+        # once.
+        h = F.tanh(h) if i % 2 == 0 else h * h
+    return x, h
+
+
+def _convert_time(n_functions):
+    x, y = _chain(n_functions)
+    model = chainer.Chain()
+    context = Context(model)
+    network_outputs = {context.get_name(y): y}
+    start = time.perf_counter()
+    graph = Graph(context, mapping.converters, 11, {context.get_name(x)},
+                  network_outputs)
+    graph.to_onnx_graph()
+    elapsed = time.perf_counter() - start
+    assert len(graph.graph) == n_functions
+    return elapsed
+
+
+def test_build_computational_graph_order():
+    x, y = _chain(6)
+    context = Context(chainer.Chain())
+    graph = Graph(context, mapping.converters, 11, set(),
+                  {context.get_name(y): y})
+    names = [f.__class__.__name__ for f in graph.function_nodes]
+    assert names == ['Tanh', 'Mul', 'Tanh', 'Mul', 'Tanh', 'Mul']
+
+
+@pytest.mark.slow
+def test_graph_scaling():
+    _convert_time(1000)  # warm up
+    # The best of trials, to reduce noise of other processes
+    times = {n: min(_convert_time(n) for _ in range(3))
+             for n in (1000, 10000, 100000)}
+    per_function = {n: t / n for n, t in times.items()}
+    # Linear growth, allowing noise and overhead of large allocations
+    assert per_function[10000] < per_function[1000] * 3
+    assert per_function[100000] < per_function[10000] * 3
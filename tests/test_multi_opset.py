@@ -0,0 +1,76 @@
+import os
+
+import chainer
+import chainer.functions as F
+import chainer.links as L
+import numpy as np
+import onnx
+from onnx import numpy_helper
+import pytest
+
+from onnx_chainer import export
+from onnx_chainer import export_testcase
+
+
+@pytest.fixture(scope='function')
+def model():
+    return chainer.Sequential(
+        L.Convolution2D(None, 4, 3, 1, 1),
+        L.BatchNormalization(4),
+        F.relu,
+        L.Linear(None, 10, nobias=True),
+        F.softmax,
+    )
+
+
+@pytest.fixture(scope='function')
+def x():
+    return np.random.rand(2, 3, 8, 8).astype(np.float32)
+
+
+def test_multi_opset(tmpdir, model, x):
+    versions = [7, 8, 9, 10]
+    filenames = [os.path.join(str(tmpdir), 'model{}.onnx'.format(v))
+                 for v in versions]
+    onnx_models = export(model, x, filename=filenames, opset_version=versions)
+
+    assert len(onnx_models) == len(versions)
+    for v, filename, onnx_model in zip(versions, filenames, onnx_models):
+        expected = export(model, x, opset_version=v)
+        assert onnx.load(filename) == expected
+        # Payloads of the returned model are in the written file
+        onnx.load_external_data_for_model(onnx_model, str(tmpdir))
+        assert onnx_model.graph.node == expected.graph.node
+        actual = {t.name: numpy_helper.to_array(t)
+                  for t in onnx_model.graph.initializer}
+        assert len(actual) == len(expected.graph.initializer)
+        for tensor in expected.graph.initializer:
+            np.testing.assert_array_equal(
+                actual[tensor.name], numpy_helper.to_array(tensor))
+
+
+def test_multi_opset_named_inout(model, x, disable_experimental_warning):
+    onnx_models, inputs, outputs = export(
+        model, x, opset_version=[7, 10], return_named_inout=True)
+    for onnx_model in onnx_models:
+        assert [o.name for o in onnx_model.graph.output] == list(outputs)
+
+
+@pytest.mark.parametrize('filename,external_data', [
+    ('model.onnx', None), (['a.onnx'], None),
+    (['a.onnx', 'b.onnx'], 'weights.bin')])
+def test_multi_opset_invalid_filename(model, x, filename, external_data):
+    with pytest.raises(ValueError):
+        export(model, x, filename=filename, opset_version=[7, 10],
+               external_data=external_data)
+
+
+def test_export_testcase_multi_opset(tmpdir, model, x):
+    out_dirs = [os.path.join(str(tmpdir), d) for d in ('a', 'b')]
+    export_testcase(model, x, out_dirs, output_grad=True,
+                    opset_version=[7, 10])
+    for out_dir in out_dirs:
+        assert os.path.isfile(os.path.join(out_dir, 'model.onnx'))
+        for pb in ('input_0.pb', 'output_0.pb', 'gradient_0.pb'):
+            assert os.path.isfile(
+                os.path.join(out_dir, 'test_data_set_0', pb))
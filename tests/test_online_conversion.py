@@ -0,0 +1,101 @@
+import tracemalloc
+
+import chainer
+import chainer.functions as F
+import chainer.links as L
+import numpy as np
+import onnx
+import pytest
+
+from onnx_chainer import export
+from onnx_chainer import export_testcase
+from onnx_chainer.testing import input_generator
+
+
+class Model(chainer.Chain):
+
+    def __init__(self):
+        super(Model, self).__init__()
+        with self.init_scope():
+            self.conv = L.Convolution2D(None, 4, 3, 1, 1)
+            self.bn = L.BatchNormalization(4)
+            self.linear = L.Linear(None, 10)
+
+    def forward(self, x):
+        h = F.relu(self.bn(self.conv(x)))
+        F.sigmoid(h)  # not connected to outputs
+        return F.softmax(self.linear(h)), F.tanh(h)
+
+
+def _run(onnx_model, x):
+    ort = pytest.importorskip('onnxruntime')
+    sess = ort.InferenceSession(onnx_model.SerializeToString())
+    initializers = {t.name for t in onnx_model.graph.initializer}
+    input_name = [i.name for i in onnx_model.graph.input
+                  if i.name not in initializers][0]
+    return sess.run(None, {input_name: x})
+
+
+@pytest.mark.parametrize('output_names', [None, ['prob', 'feature']])
+def test_online_conversion(output_names):
+    model = Model()
+    x = input_generator.increasing(2, 3, 8, 8)
+    expected = export(model, x, output_names=output_names)
+    actual = export(model, x, output_names=output_names,
+                    online_conversion=True)
+
+    assert sorted(n.op_type for n in actual.graph.node) ==\
+        sorted(n.op_type for n in expected.graph.node)
+    assert sorted(o.name for o in actual.graph.output) ==\
+        sorted(o.name for o in expected.graph.output)
+    assert sorted(i.name for i in actual.graph.input) ==\
+        sorted(i.name for i in expected.graph.input)
+    assert sorted(t.name for t in actual.graph.initializer) ==\
+        sorted(t.name for t in expected.graph.initializer)
+    actual_outputs = dict(zip(
+        [o.name for o in actual.graph.output], _run(actual, x)))
+    expected_outputs = dict(zip(
+        [o.name for o in expected.graph.output], _run(expected, x)))
+    for name, e in expected_outputs.items():
+        np.testing.assert_allclose(
+            actual_outputs[name], e, rtol=1e-5, atol=1e-5)
+
+
+def test_online_conversion_uninitialized_params():
+    model = chainer.Sequential(L.Linear(None, 10), F.relu)
+    x = input_generator.increasing(2, 5)
+    onnx_model = export(model, x, online_conversion=True)
+    onnx.checker.check_model(onnx_model)
+    assert {t.name for t in onnx_model.graph.initializer} ==\
+        {'param_0_W', 'param_0_b'}
+
+
+def _peak_memory(model, x, **kwargs):
+    tracemalloc.start()
+    try:
+        export(model, x, **kwargs)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_online_conversion_peak_memory():
+    depth = 30
+    model = chainer.Sequential(*([F.tanh] * depth))
+    x = np.zeros((256, 1024), dtype=np.float32)
+
+    offline_peak = _peak_memory(model, x)
+    online_peak = _peak_memory(model, x, online_conversion=True)
+    # Offline retains all the activations until the end of the forward
+    assert offline_peak > depth * x.nbytes
+    assert online_peak < 5 * x.nbytes
+
+
+def test_online_conversion_invalid():
+    model = Model()
+    x = input_generator.increasing(2, 3, 8, 8)
+    with pytest.raises(ValueError):
+        export(model, x, opset_version=[7, 10], online_conversion=True)
+    with pytest.raises(ValueError):
+        export_testcase(model, x, 'out', output_grad=True,
+                        online_conversion=True)
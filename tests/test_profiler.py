@@ -0,0 +1,86 @@
+import io
+import json
+import os
+
+import chainer
+import chainer.functions as F
+import chainer.links as L
+import numpy as np
+import pytest
+
+from onnx_chainer import export
+from onnx_chainer import export_testcase
+from onnx_chainer import Profiler
+
+
+@pytest.fixture(scope='function')
+def model():
+    return chainer.Sequential(
+        L.Convolution2D(None, 4, 3, 1, 1),
+        F.relu,
+        L.Linear(None, 10),
+    )
+
+
+@pytest.fixture(scope='function')
+def x():
+    return np.random.rand(2, 3, 8, 8).astype(np.float32)
+
+
+def test_profile(tmpdir, model, x):
+    profiler = Profiler()
+    export(model, x, filename=os.path.join(str(tmpdir), 'model.onnx'),
+           input_shapes=[('N', 3, 8, 8)], profile=profiler)
+
+    summary = profiler.summary()
+    for phase in ('export', 'forward', 'build_computational_graph',
+                  'convert', 'convert_parameter', 'check_model',
+                  'infer_shapes', 'serialize'):
+        assert ('phase', phase) in summary
+    assert summary['phase', 'check_model']['occurrence'] == 2
+    assert summary['converter', 'Convolution2DFunction']['occurrence'] == 1
+    assert summary['converter', 'ReLU']['occurrence'] == 1
+    assert summary['converter', 'LinearFunction']['occurrence'] == 1
+    # Forward allocates the output at least
+    assert summary['phase', 'forward']['alloc_bytes'] >= 2 * 10 * 4
+
+    f = io.StringIO()
+    profiler.print_report(file=f)
+    lines = f.getvalue().splitlines()
+    assert lines[0].split() == [
+        'Category', 'Name', 'ElapsedTime', 'AllocBytes', 'Occurrence']
+    assert len(lines) == len(summary) + 1
+
+    trace_path = os.path.join(str(tmpdir), 'trace.json')
+    profiler.dump_chrome_trace(trace_path)
+    with open(trace_path) as f:
+        trace = json.load(f)
+    events = trace['traceEvents']
+    assert len(events) == len(profiler.events)
+    export_event = [e for e in events if e['name'] == 'export'][0]
+    for e in events:
+        assert e['ph'] == 'X'
+        assert export_event['ts'] <= e['ts']
+        assert e['ts'] + e['dur'] <= export_event['ts'] + export_event['dur']
+
+
+def test_profile_print(model, x, capsys):
+    export(model, x, profile=True)
+    out, _ = capsys.readouterr()
+    assert 'forward' in out
+    assert 'LinearFunction' in out
+
+
+def test_profile_disabled(model, x):
+    profiler = Profiler(enabled=False)
+    export(model, x, profile=profiler)
+    assert profiler.events == []
+
+
+def test_profile_export_testcase(tmpdir, model, x):
+    profiler = Profiler()
+    export_testcase(model, x, str(tmpdir), output_grad=True,
+                    profile=profiler)
+    summary = profiler.summary()
+    for phase in ('export_testcase', 'export', 'write_testcase', 'backward'):
+        assert ('phase', phase) in summary
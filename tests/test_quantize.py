@@ -0,0 +1,111 @@
+import chainer
+import chainer.functions as F
+import chainer.links as L
+import numpy as np
+import onnx
+from onnx import numpy_helper
+import pytest
+
+from onnx_chainer import export
+from onnx_chainer.quantize import export_quantized
+
+
+class Model(chainer.Chain):
+
+    def __init__(self):
+        super(Model, self).__init__()
+        with self.init_scope():
+            self.conv = L.Convolution2D(3, 16, 3, 1, 1)
+            self.linear = L.Linear(16 * 8 * 8, 10)
+
+    def forward(self, x):
+        return self.linear(F.relu(self.conv(x)))
+
+
+class BranchModel(chainer.Chain):
+
+    def __init__(self):
+        super(BranchModel, self).__init__()
+        with self.init_scope():
+            self.linear = L.Linear(5, 3)
+
+    def forward(self, x):
+        if x.shape[0] > 1:
+            x = F.relu(x)
+        return self.linear(x)
+
+
+def _run(onnx_model, x):
+    ort = pytest.importorskip('onnxruntime')
+    sess = ort.InferenceSession(onnx_model.SerializeToString())
+    initializers = {t.name for t in onnx_model.graph.initializer}
+    input_name = [i.name for i in onnx_model.graph.input
+                  if i.name not in initializers][0]
+    return sess.run(None, {input_name: x})
+
+
+def _initializers(onnx_model):
+    return {t.name: numpy_helper.to_array(t)
+            for t in onnx_model.graph.initializer}
+
+
+@pytest.mark.parametrize('optimize', [0, 2])
+def test_export_quantized(optimize):
+    model = Model()
+    xs = [np.random.rand(2, 3, 8, 8).astype(np.float32) for _ in range(3)]
+    fp32_model = export(model, xs[0], optimize=optimize)
+    onnx_model = export_quantized(model, xs, optimize=optimize)
+
+    op_types = [n.op_type for n in onnx_model.graph.node]
+    assert op_types.count('QuantizeLinear') == 2
+    assert op_types.count('DequantizeLinear') == 6
+    initializers = _initializers(onnx_model)
+    assert initializers['param_conv_W_quantized'].dtype == np.int8
+    assert initializers['param_conv_b_quantized'].dtype == np.int32
+    assert 'param_conv_W' not in initializers
+    assert onnx_model.ByteSize() < fp32_model.ByteSize() * 0.35
+
+    with chainer.using_config('train', False):
+        expected = model(xs[0]).array
+    np.testing.assert_allclose(
+        _run(onnx_model, xs[0])[0], expected,
+        atol=np.abs(expected).max() * 0.05)
+
+
+def test_export_quantized_calibration_range():
+    model = chainer.Sequential(L.Linear(5, 3))
+    xs = [np.full((2, 5), v, dtype=np.float32) for v in (1, 3, -2)]
+    onnx_model = export_quantized(model, iter(xs))
+
+    initializers = _initializers(onnx_model)
+    scale = initializers['Input_0_scale']
+    zero_point = initializers['Input_0_zero_point']
+    np.testing.assert_allclose(scale, 5 / 255.)
+    assert zero_point.dtype == np.uint8
+    assert zero_point == 102
+    onnx.checker.check_model(onnx_model)
+
+
+def test_export_quantized_converter():
+    model = chainer.Sequential(L.Linear(5, 3))
+    dataset = [(np.random.rand(5).astype(np.float32), 0) for _ in range(8)]
+    it = chainer.iterators.SerialIterator(dataset, 2)
+    onnx_model = export_quantized(
+        model, it, max_batches=3,
+        converter=lambda batch: chainer.dataset.concat_examples(batch)[0])
+    assert 'QuantizeLinear' in [n.op_type for n in onnx_model.graph.node]
+
+
+def test_export_quantized_invalid():
+    x = np.random.rand(2, 5).astype(np.float32)
+    with pytest.raises(ValueError):
+        # Calibration inputs are computed by other function nodes
+        export_quantized(BranchModel(), [x, x[:1]])
+    with pytest.raises(ValueError):
+        export_quantized(BranchModel(), [])
+    with pytest.raises(ValueError):
+        export_quantized(BranchModel(), [x], opset_version=9)
+    with pytest.raises(ValueError):
+        export_quantized(BranchModel(), [x], online_conversion=True)
+    with pytest.raises(ValueError):
+        export(BranchModel(), x, calibration=[x])
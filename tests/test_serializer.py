@@ -0,0 +1,142 @@
+import io
+import os
+import subprocess
+import sys
+
+import chainer
+import chainer.functions as F
+import chainer.links as L
+from google.protobuf import text_format
+import numpy as np
+import onnx
+import pytest
+
+from onnx_chainer import export
+from onnx_chainer.external_data import get_external_data
+from onnx_chainer.serializer import write_model
+from onnx_chainer.serializer import write_model_text
+
+
+@pytest.fixture(scope='function')
+def onnx_model():
+    model = chainer.Sequential(
+        L.Convolution2D(None, 4, 3, 1, 1),
+        L.BatchNormalization(4),
+        F.relu,
+        L.Linear(None, 3),
+    )
+    x = np.random.rand(1, 3, 5, 5).astype(np.float32)
+    return export(model, x)
+
+
+def test_write_model(onnx_model):
+    f = io.BytesIO()
+    write_model(onnx_model, f)
+    actual = onnx.ModelProto()
+    actual.ParseFromString(f.getvalue())
+    assert actual == onnx_model
+    assert len(f.getvalue()) == onnx_model.ByteSize()
+
+
+@pytest.mark.parametrize('array', [
+    np.array(3, dtype=np.float32),
+    np.arange(12, dtype=np.int64).reshape(3, 4),
+    np.arange(12, dtype=np.float16).reshape(4, 3).T,
+    np.ones((2, 3), dtype=np.bool_),
+])
+def test_write_model_with_array_initializers(onnx_model, array):
+    f = io.BytesIO()
+    payloads = write_model(onnx_model, f, initializers=[('extra', array)])
+    actual = onnx.ModelProto()
+    actual.ParseFromString(f.getvalue())
+
+    expected_names = [t.name for t in onnx_model.graph.initializer]
+    actual_names = [t.name for t in actual.graph.initializer]
+    assert actual_names == expected_names + ['extra']
+    tensor = actual.graph.initializer[-1]
+    assert tuple(tensor.dims) == array.shape
+    np.testing.assert_array_equal(onnx.numpy_helper.to_array(tensor), array)
+    # Offsets of payloads are returned
+    offset, length = payloads['extra']
+    assert f.getvalue()[offset:offset + length] == tensor.raw_data
+
+
+def test_write_model_text(onnx_model):
+    f = io.StringIO()
+    write_model_text(onnx_model, f)
+    expected = text_format.MessageToString(onnx_model) + '\n'
+    assert f.getvalue() == expected
+
+
+@pytest.mark.parametrize('n_embedded', [0, 2])
+def test_write_model_text_with_array_initializers(onnx_model, n_embedded):
+    tensors = list(onnx_model.graph.initializer)
+    del onnx_model.graph.initializer[n_embedded:]
+    f = io.StringIO()
+    write_model_text(onnx_model, f, initializers=[
+        (t.name, onnx.numpy_helper.to_array(t))
+        for t in tensors[n_embedded:]])
+
+    del onnx_model.graph.initializer[:]
+    onnx_model.graph.initializer.extend(tensors)
+    expected = text_format.MessageToString(onnx_model) + '\n'
+    assert f.getvalue() == expected
+
+
+_PEAK_RSS_SCRIPT = """
+import resource
+import sys
+
+import chainer
+import chainer.links as L
+import numpy as np
+
+from onnx_chainer import export
+from onnx_chainer.external_data import get_external_data
+
+# Weights are filled, so that all the pages are resident from the beginning
+model = chainer.Sequential(
+    *[L.Linear(2048, 2048, initialW=1.0) for _ in range(8)])
+x = np.ones((1, 2048), dtype=np.float32)
+export(chainer.Sequential(L.Linear(2, 2)), x[:, :2])
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+onnx_model = export(model, x, sys.argv[1])
+after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print((after - before) * 1024)
+"""
+
+
+def test_export_peak_rss(tmpdir):
+    pytest.importorskip('resource')
+    if not sys.platform.startswith('linux'):
+        pytest.skip('ru_maxrss is in kilobytes only on Linux')
+    path = os.path.join(str(tmpdir), 'model.onnx')
+    output = subprocess.check_output(
+        [sys.executable, '-c', _PEAK_RSS_SCRIPT, path])
+    increase = int(output.decode().split()[-1])
+    # Initializers are written from parameters one by one and not held by
+    # the returned model, the total size of them is 128MB
+    largest = 2048 * 2048 * 4
+    assert increase < largest * 3
+
+
+def test_export_lazy_initializers(tmpdir):
+    model = chainer.Sequential(L.Linear(512, 128), L.Linear(128, 2))
+    x = np.zeros((1, 512), dtype=np.float32)
+    path = os.path.join(str(tmpdir), 'model.onnx')
+    onnx_model = export(model, x, path)
+    expected = export(model, x)
+
+    # Large payloads are referred in the written file
+    external = [t.name for t in onnx_model.graph.initializer
+                if get_external_data(t) is not None]
+    assert sorted(external) == ['param_0_W', 'param_1_W']
+    onnx.load_external_data_for_model(onnx_model, str(tmpdir))
+    actual = {t.name: onnx.numpy_helper.to_array(t)
+              for t in onnx_model.graph.initializer}
+    loaded = onnx.load(path)
+    assert len(actual) == len(loaded.graph.initializer) == 4
+    for tensor in loaded.graph.initializer:
+        np.testing.assert_array_equal(
+            actual[tensor.name], onnx.numpy_helper.to_array(tensor))
+    assert loaded == expected
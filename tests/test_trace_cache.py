@@ -0,0 +1,187 @@
+import os
+
+import chainer
+import chainer.functions as F
+import chainer.links as L
+import numpy as np
+import onnx
+import pytest
+
+from onnx_chainer import export
+from onnx_chainer import placeholder
+from onnx_chainer.trace_cache import TraceCache
+
+
+class Model(chainer.Chain):
+
+    def __init__(self):
+        super(Model, self).__init__()
+        with self.init_scope():
+            self.conv = L.Convolution2D(3, 4, 3, 1, 1)
+            self.bn = L.BatchNormalization(4)
+            self.linear = L.Linear(4 * 8 * 8, 5, nobias=True)
+
+    def forward(self, x):
+        return self.linear(F.relu(self.bn(self.conv(x))))
+
+
+def _randomize(model):
+    for param in model.params():
+        param.array[...] = np.random.rand(*param.shape)
+    model.bn.avg_mean[...] = np.random.rand(*model.bn.avg_mean.shape)
+    model.bn.avg_var[...] = np.random.rand(*model.bn.avg_var.shape) + 1
+
+
+@pytest.fixture(scope='function')
+def x():
+    return np.random.rand(2, 3, 8, 8).astype(np.float32)
+
+
+def test_trace_cache(x):
+    cache = TraceCache()
+    model = Model()
+    export(model, x, trace_cache=cache)
+    assert cache.misses == 1
+    assert len(cache) == 1
+
+    # Same architecture with other weights hits the cache
+    model = Model()
+    _randomize(model)
+    onnx_model = export(model, x, trace_cache=cache)
+    assert cache.hits == 1
+    assert len(cache) == 1
+
+    expected = export(model, x)
+    assert onnx_model == expected
+
+
+def test_trace_cache_replaced_arrays(x):
+    cache = TraceCache()
+    model = Model()
+    export(model, x, trace_cache=cache)
+
+    # Arrays assigned to parameters and persistent values are read again
+    model.conv.W.array = np.random.rand(*model.conv.W.shape).astype(
+        np.float32)
+    model.bn.avg_mean = np.random.rand(4).astype(np.float32)
+    onnx_model = export(model, x, trace_cache=cache)
+    assert cache.hits == 1
+    assert onnx_model == export(model, x)
+
+
+@pytest.mark.parametrize('change', [
+    'shape', 'dtype', 'opset_version', 'input_names', 'train', 'structure'])
+def test_trace_cache_miss(x, change):
+    cache = TraceCache()
+    model = Model()
+    export(model, x, trace_cache=cache)
+
+    kwargs = {}
+    if change == 'shape':
+        x = x[:1]
+    elif change == 'dtype':
+        with chainer.using_config('dtype', np.float64):
+            model = Model()
+        x = x.astype(np.float64)
+    elif change == 'opset_version':
+        kwargs['opset_version'] = 7
+    elif change == 'input_names':
+        kwargs['input_names'] = 'x'
+    elif change == 'train':
+        kwargs['train'] = True
+    elif change == 'structure':
+        model.add_link('extra', L.Linear(2, 2))
+    export(model, x, trace_cache=cache, **kwargs)
+    assert cache.hits == 0
+
+
+def test_trace_cache_max_size():
+    cache = TraceCache(max_size=2)
+    model = Model()
+    xs = [np.random.rand(n, 3, 8, 8).astype(np.float32) for n in (1, 2, 3)]
+    for x in xs:
+        export(model, x, trace_cache=cache)
+    assert len(cache) == 2
+    export(model, xs[0], trace_cache=cache)
+    assert cache.hits == 0
+    export(model, xs[2], trace_cache=cache)
+    assert cache.hits == 1
+
+
+class ComputedConstantModel(chainer.Chain):
+
+    def __init__(self):
+        super(ComputedConstantModel, self).__init__()
+        with self.init_scope():
+            self.linear = L.Linear(4, 3)
+
+    def forward(self, x):
+        # The constant is computed on forward, its array is a placeholder on
+        # the abstract trace
+        c = F.exp(self.xp.arange(3, dtype=np.float32))
+        return self.linear(x) + chainer.Variable(c.array)
+
+
+def test_trace_cache_abstract_trace():
+    cache = TraceCache()
+    model = ComputedConstantModel()
+    x = np.random.rand(2, 4).astype(np.float32)
+    export(model, placeholder(x.shape, np.float32), abstract_trace=True,
+           trace_cache=cache)
+    onnx_model = export(model, x, trace_cache=cache)
+    assert cache.hits == 0
+
+    expected = export(model, x)
+    assert onnx_model == expected
+    params = {t.name: onnx.numpy_helper.to_array(t)
+              for t in onnx_model.graph.initializer}
+    np.testing.assert_allclose(
+        params[onnx_model.graph.node[-1].input[1]],
+        np.exp(np.arange(3)), rtol=1e-6)
+
+
+def test_trace_cache_external_data(tmpdir, x):
+    path = str(tmpdir)
+    filename = os.path.join(path, 'model.onnx')
+    cache = TraceCache()
+    export(Model(), x, filename=filename, external_data=True,
+           trace_cache=cache)
+
+    model = Model()
+    _randomize(model)
+    export(model, x, filename=filename, external_data=True,
+           trace_cache=cache)
+    assert cache.hits == 1
+
+    onnx_model = onnx.load(filename)
+    params = {t.name: onnx.numpy_helper.to_array(t)
+              for t in onnx_model.graph.initializer}
+    np.testing.assert_array_equal(params['param_conv_W'], model.conv.W.array)
+    np.testing.assert_array_equal(params['param_bn_avg_var'], model.bn.avg_var)
+
+
+class WeightDependentModel(chainer.Chain):
+
+    def __init__(self):
+        super(WeightDependentModel, self).__init__()
+        with self.init_scope():
+            self.linear = L.Linear(4, 3)
+
+    def forward(self, x):
+        # The input of the function is computed from the weight outside of
+        # the graph
+        w = chainer.Variable(self.linear.W.array * 2)
+        return self.linear(x) + F.sum(w)
+
+
+def test_trace_cache_computed_inputs():
+    cache = TraceCache()
+    model = WeightDependentModel()
+    x = np.random.rand(2, 4).astype(np.float32)
+    export(model, x, trace_cache=cache)
+
+    model.linear.W.array[...] = np.random.rand(3, 4)
+    onnx_model = export(model, x, trace_cache=cache)
+    assert cache.hits == 0
+    assert len(cache) == 0
+    assert onnx_model == export(model, x)
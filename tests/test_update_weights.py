@@ -0,0 +1,105 @@
+import os
+
+import chainer
+import chainer.functions as F
+import chainer.links as L
+import numpy as np
+import onnx
+import pytest
+
+from onnx_chainer import export
+from onnx_chainer import update_weights
+
+
+class Model(chainer.Chain):
+
+    def __init__(self):
+        super(Model, self).__init__()
+        with self.init_scope():
+            self.conv = L.Convolution2D(3, 16, 3, 1, 1)
+            self.bn = L.BatchNormalization(16)
+            self.linear = L.Linear(16 * 8 * 8, 10)
+
+    def forward(self, x):
+        return self.linear(F.relu(self.bn(self.conv(x))))
+
+
+def _new_weights_model():
+    model = Model()
+    for param in model.params():
+        param.array[...] = np.random.rand(*param.shape)
+    model.bn.avg_mean[...] = np.random.rand(16)
+    model.bn.avg_var[...] = np.random.rand(16) + 1
+    return model
+
+
+@pytest.mark.parametrize('external_data', [False, True])
+def test_update_weights(tmpdir, external_data):
+    filename = os.path.join(str(tmpdir), 'model.onnx')
+    x = np.random.rand(2, 3, 8, 8).astype(np.float32)
+    export(Model(), x, filename=filename, external_data=external_data)
+    data_filename = filename + '.data'
+    if external_data:
+        data_size = os.path.getsize(data_filename)
+
+    model = _new_weights_model()
+    updated = update_weights(filename, model)
+
+    expected = export(model, x)
+    onnx_model = onnx.load(filename)
+    actual = {t.name: onnx.numpy_helper.to_array(t)
+              for t in onnx_model.graph.initializer}
+    assert set(updated) == set(actual)
+    assert set(actual) == {t.name for t in expected.graph.initializer}
+    for tensor in expected.graph.initializer:
+        np.testing.assert_array_equal(
+            actual[tensor.name], onnx.numpy_helper.to_array(tensor))
+    if external_data:
+        assert os.path.getsize(data_filename) == data_size
+
+
+def test_update_weights_mismatch(tmpdir):
+    filename = os.path.join(str(tmpdir), 'model.onnx')
+    x = np.random.rand(2, 3, 8, 8).astype(np.float32)
+    export(Model(), x, filename=filename)
+    with open(filename, 'rb') as f:
+        org = f.read()
+
+    model = _new_weights_model()
+    model.linear.W.array = model.linear.W.array[:5]
+    with pytest.raises(ValueError):
+        update_weights(filename, model)
+    with open(filename, 'rb') as f:
+        assert f.read() == org
+
+
+@pytest.mark.parametrize('options', [
+    {'optimize': 2}, {'precision': 'fp16'}, {'quantize_weights': 'int8'}])
+def test_update_weights_rewritten(tmpdir, options):
+    filename = os.path.join(str(tmpdir), 'model.onnx')
+    x = np.random.rand(2, 3, 8, 8).astype(np.float32)
+    with chainer.using_config('train', False):
+        onnx_model = export(Model(), x, filename=filename, **options)
+    assert 'rewritten_initializers' in {
+        p.key for p in onnx_model.metadata_props}
+    with open(filename, 'rb') as f:
+        org = f.read()
+
+    # Folded and deduplicated initializers must not be overwritten by
+    # parameters of the same names
+    with pytest.raises(ValueError):
+        update_weights(filename, _new_weights_model())
+    with open(filename, 'rb') as f:
+        assert f.read() == org
+
+
+def test_update_weights_missing(tmpdir):
+    filename = os.path.join(str(tmpdir), 'model.onnx')
+    x = np.random.rand(2, 3, 8, 8).astype(np.float32)
+    export(Model(), x, filename=filename)
+
+    model = _new_weights_model()
+    with model.init_scope():
+        model.extra = L.Linear(3, 3)
+    with pytest.raises(ValueError):
+        update_weights(filename, model)